@@ -2,10 +2,20 @@
 # Desarrollado por Héctor F. Rivera Santiago
 # copyright (c) 2024
 
-from smbus2 import SMBus
+import struct
 import time
 import logging
 
+try:
+    from smbus2 import SMBus
+except ImportError:
+    SMBus = None    # Permite usar un bus emulado (lib/i2c_emulator.py) sin smbus2 instalado
+
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    GPIO = None     # Sin GPIO solo están disponibles los modos de polling
+
 # Configurar logging para el módulo
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
@@ -26,21 +36,64 @@ class SENSOR_AS7265x:
     TX_VALID = 0x02             # Buffer de escritura ocupado
     RX_VALID = 0x01             # Datos disponibles para leer
     POLLING_DELAY = 0.05        # Retardo de espera para el buffer de escritura
-    
+    MIN_POLLING_DELAY = 0.0002  # Primer retardo del polling adaptativo
+    STATUS_TIMEOUT = 1.0        # Tiempo máximo de espera por TX_VALID/RX_VALID en segundos
+    STATUS_POLL_MARGIN = 0.002  # Margen antes del fin de la integración para comenzar a consultar DATA_RDY
+
+    ACQUISITION_MODES = ("fixed", "adaptive", "interrupt")
 
     READY = 0x08     # El sensor está listo (bit específico para "READY")
     BUSY = 0x08      # El sensor está ocupado (bit específico para "BUSY")
 
     DEVICES = {"AS72651": 0b00, "AS72652": 0b01, "AS72653": 0b10}  # Selección de dispositivos internos
 
-    def __init__(self, i2c_bus=1, address=0x49):
+    REG_CONFIG = 0x04           # Registro virtual de configuración (ganancia, modo y DATA_RDY)
+    DATA_RDY = 0x02             # Bit DATA_RDY del registro de configuración
+    INT_ENABLE = 0x40           # Bit INT del registro de configuración (activa el pin de interrupción)
+    MODE_ONE_SHOT = 0x03        # Modo 3: medición única de los 6 canales de cada dispositivo
+    INTEGRATION_STEP = 0.0028   # Cada unidad del tiempo de integración equivale a 2.8 ms
+    REG_CAL_START = 0x14        # Primer registro calibrado (0x14-0x2B: 6 floats IEEE754 big-endian)
+    CAL_BYTES = 24              # Bytes calibrados por dispositivo
+    WAVELENGTHS_NM = [
+        410, 435, 460, 485, 510, 535, 560, 585, 610,
+        645, 680, 705, 730, 760, 810, 860, 900, 940
+    ]
+    LOG_SAMPLE_RATE = 100       # Registros DEBUG por registro I2C: 1 de cada N (1 = detalle completo)
+
+    def __init__(self, i2c_bus=1, address=0x49, acquisition_mode="adaptive", interrupt_pin=None):
         """
         Inicializa el sensor en el bus I²C.
-        :param i2c_bus: Número del bus I²C.
+        :param i2c_bus: Número del bus I²C o un objeto compatible con SMBus (p. ej. un bus emulado).
         :param address: Dirección I²C del sensor.
-        """
-        self.i2c = SMBus(i2c_bus)
+        :param acquisition_mode: Estrategia de espera del sensor:
+                                 "fixed" (polling cada POLLING_DELAY, comportamiento original),
+                                 "adaptive" (polling con retroceso exponencial ajustado a la integración) o
+                                 "interrupt" (espera por flanco en el pin INT del sensor vía GPIO).
+        :param interrupt_pin: Pin GPIO (numeración BCM) conectado al pin INT del sensor.
+        """
+        if acquisition_mode not in self.ACQUISITION_MODES:
+            raise ValueError(f"[CONTROLLER] [SENSOR] Modo de adquisición no válido: {acquisition_mode}.")
+        if acquisition_mode == "interrupt" and (GPIO is None or interrupt_pin is None):
+            logging.warning("[CONTROLLER] [SENSOR] Modo 'interrupt' no disponible (sin RPi.GPIO o sin pin). Usando 'adaptive'.")
+            acquisition_mode = "adaptive"
+
+        if isinstance(i2c_bus, int):
+            if SMBus is None:
+                raise ImportError("[CONTROLLER] [SENSOR] smbus2 no está instalado. Proporcione un bus compatible con SMBus.")
+            self.i2c = SMBus(i2c_bus)
+        else:
+            self.i2c = i2c_bus
         self.address = address
+        self.integration_time = 100
+        self.last_read_timing = {}
+        self.acquisition_mode = acquisition_mode
+        self.interrupt_pin = interrupt_pin
+        self.log_sample_rate = self.LOG_SAMPLE_RATE
+        self._log_counters = {}     # Punto de registro -> llamadas vistas
+        self._measurement_started = None    # Instante monotónico del último start_measurement
+        if self.acquisition_mode == "interrupt":
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self.interrupt_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # INT es activo en bajo
         logging.info(f"[CONTROLLER] [SENSOR] AS7265x inicializado en dirección {hex(self.address)} en el bus I2C {i2c_bus}.")
         self.verify_connection()
         
@@ -64,8 +117,8 @@ class SENSOR_AS7265x:
                 rx_valid = reg_status & self.RX_VALID
                 ready = (reg_status & self.READY) >> 3  # Extrae el bit READY
 
-                logging.debug(f"[CONTROLLER] [SENSOR] Intento {attempt + 1}/{retries}: REG_STATUS={bin(reg_status)}")
-                logging.debug(f"[CONTROLLER] [SENSOR] TX_VALID={tx_valid}, RX_VALID={rx_valid}, READY={ready}")
+                logging.debug("[CONTROLLER] [SENSOR] Intento %d/%d: REG_STATUS=0b%s", attempt + 1, retries, format(reg_status, "b"))
+                logging.debug("[CONTROLLER] [SENSOR] TX_VALID=%s, RX_VALID=%s, READY=%s", tx_valid, rx_valid, ready)
 
                 if ready:
                     logging.info(f"[CONTROLLER] [SENSOR] Sensor listo después de {attempt + 1} intentos.")
@@ -89,6 +142,47 @@ class SENSOR_AS7265x:
             logging.error(f"[CONTROLLER] [SENSOR] Error de comunicación I2C: {e}")
             return False
 
+    def _wait_status(self, mask, expect_set, timeout=None):
+        """
+        Espera a que los bits `mask` del registro de estado estén en el valor deseado.
+
+        En modo "fixed" espera siempre POLLING_DELAY entre lecturas. En los demás modos el
+        retardo comienza en MIN_POLLING_DELAY y se duplica hasta POLLING_DELAY, de modo que
+        las transacciones rápidas no pagan 50 ms por cada consulta.
+        :param mask: Máscara de bits (TX_VALID o RX_VALID).
+        :param expect_set: True para esperar que el bit esté en 1, False para esperar 0.
+        :param timeout: Tiempo máximo de espera en segundos (por defecto STATUS_TIMEOUT).
+        :return: Último valor leído del registro de estado.
+        """
+        deadline = time.monotonic() + (timeout if timeout is not None else self.STATUS_TIMEOUT)
+        delay = self.POLLING_DELAY if self.acquisition_mode == "fixed" else self.MIN_POLLING_DELAY
+        while True:
+            status = self.i2c.read_byte_data(self.I2C_ADDR, self.REG_STATUS)
+            if bool(status & mask) == expect_set:
+                return status
+            if time.monotonic() > deadline:
+                raise OSError(f"[CONTROLLER] [SENSOR] Timeout esperando REG_STATUS (máscara 0x{mask:02X}, último 0x{status:02X}).")
+            time.sleep(delay)
+            delay = min(delay * 2, self.POLLING_DELAY)
+
+    def _sampled_debug(self, site, msg, *args):
+        """
+        Registra un mensaje DEBUG de una ruta crítica (acceso a registros) con muestreo por punto.
+        El mensaje se formatea solo si se emite; con `log_sample_rate = 1` se registra todo.
+        :param site: Identificador del punto de registro.
+        :param msg: Mensaje con formato %.
+        """
+        if not logging.getLogger().isEnabledFor(logging.DEBUG):
+            return
+        count = self._log_counters.get(site, 0)
+        self._log_counters[site] = count + 1
+        if self.log_sample_rate > 1:
+            if count % self.log_sample_rate:
+                return
+            msg += " [muestreo 1/%d]"
+            args += (self.log_sample_rate,)
+        logging.debug(msg, *args)
+
     def _write_register(self, reg, value):
         """
         Escribe un valor en un registro del sensor utilizando reintentos.
@@ -96,22 +190,11 @@ class SENSOR_AS7265x:
         :param value: Valor a escribir.
         """
         def action():
-            # Lógica de escritura
-            while True:
-                status = self.i2c.read_byte_data(self.I2C_ADDR, self.REG_STATUS)
-                if not (status & self.TX_VALID):
-                    break
-                time.sleep(self.POLLING_DELAY)
-
+            self._wait_status(self.TX_VALID, False)
             self.i2c.write_byte_data(self.I2C_ADDR, self.REG_WRITE, reg | 0x80)
-            while True:
-                status = self.i2c.read_byte_data(self.I2C_ADDR, self.REG_STATUS)
-                if not (status & self.TX_VALID):
-                    break
-                time.sleep(self.POLLING_DELAY)
-
+            self._wait_status(self.TX_VALID, False)
             self.i2c.write_byte_data(self.I2C_ADDR, self.REG_WRITE, value)
-        logging.debug(f"[CONTROLLER] [SENSOR] Intentando escribir en el registro 0x{reg:02X} con valor 0x{value:02X}.")
+        self._sampled_debug("write", "[CONTROLLER] [SENSOR] Intentando escribir en el registro 0x%02X con valor 0x%02X.", reg, value)
         # Usa _attempt_action para ejecutar el proceso con reintentos
         self._attempt_action(action)
 
@@ -124,47 +207,26 @@ class SENSOR_AS7265x:
         """
         def action():
             try:
-                logging.debug(f"[CONTROLLER] [SENSOR] Iniciando lectura del registro 0x{reg:02X}.")
-                # Verifica el estado inicial del sensor
+                self._sampled_debug("read", "[CONTROLLER] [SENSOR] Iniciando lectura del registro 0x%02X.", reg)
+                # Descarta un dato pendiente de una lectura anterior
                 status = self.i2c.read_byte_data(self.I2C_ADDR, self.REG_STATUS)
-                logging.debug(f"[CONTROLLER] [STATUS] REG_STATUS inicial: 0x{status:02X}")
-                # Validar si está listo para recibir datos
-                if status & self.BUSY:
-                    logging.debug("[CONTROLLER] [SENSOR] Sensor ocupado, esperando...")
-                    time.sleep(self.POLLING_DELAY)
-
-                # Si está listo, verifica RX_VALID
                 if status & self.RX_VALID:
                     read_val = self.i2c.read_byte_data(self.I2C_ADDR, self.REG_READ)
-                    logging.debug(f"[CONTROLLER] [SENSOR] REG_READ valor: 0x{read_val:02X}")
-
-                
+                    logging.debug("[CONTROLLER] [SENSOR] REG_READ descartado: 0x%02X", read_val)
 
-                # Espera a que el buffer de escritura esté listo
-                while True:
-                    status = self.i2c.read_byte_data(self.I2C_ADDR, self.REG_STATUS)
-                    logging.debug(f"[CONTROLLER] [SENSOR] REG_STATUS durante TX_VALID: 0x{status:02X}")
-                    if not (status & self.TX_VALID):
-                        break
-                    time.sleep(self.POLLING_DELAY)
-
-                # Solicita lectura del registro
+                # Espera a que el buffer de escritura esté listo y solicita la lectura
+                self._wait_status(self.TX_VALID, False)
                 self.i2c.write_byte_data(self.I2C_ADDR, self.REG_WRITE, reg)
-                logging.debug(f"[CONTROLLER] REG_WRITE enviado: 0x{reg:02X}")
-                while True:
-                    status = self.i2c.read_byte_data(self.I2C_ADDR, self.REG_STATUS)
-                    logging.debug(f"[CONTROLLER] [SENSOR] REG_STATUS durante RX_VALID: 0x{status:02X}")
-                    if status & self.RX_VALID:
-                        break
-                    time.sleep(self.POLLING_DELAY)
+                self._sampled_debug("read_request", "[CONTROLLER] REG_WRITE enviado: 0x%02X", reg)
+                self._wait_status(self.RX_VALID, True)
 
                 # Devuelve el valor leído
                 read_val = self.i2c.read_byte_data(self.I2C_ADDR, self.REG_READ)
-                logging.debug(f"[CONTROLLER] [SENSOR] REG_READ final: 0x{read_val:02X}")
+                self._sampled_debug("read_value", "[CONTROLLER] [SENSOR] REG_READ final: 0x%02X", read_val)
                 return read_val
             except OSError as e:
-                logging.error(f"[CONTROLLER] [SENSOR] Error durante la lectura del registro 0x{reg:02X}: {e}")
-            raise
+                logging.error("[CONTROLLER] [SENSOR] Error durante la lectura del registro 0x%02X: %s", reg, e)
+                raise
 
         # Usa _attempt_action para ejecutar el proceso con reintentos
         return self._attempt_action(action)
@@ -181,10 +243,10 @@ class SENSOR_AS7265x:
             time.sleep(self.POLLING_DELAY)
         else:
             raise RuntimeError("[CONTROLLER] [SENSOR] Timeout al esperar TX_VALID o READY.")
-        
-        self._write_register(self.REG_WRITE, reg | 0x80)  # Escribir dirección del registro
-        self._write_register(self.REG_WRITE, value)       # Escribir valor
-        logging.debug(f"[CONTROLLER] [SENSOR] Intentando escribir {value} en el registro virtual {hex(reg)}.")
+
+        # _write_register ya implementa el protocolo de registros virtuales (dirección | 0x80 y valor)
+        self._write_register(reg, value)
+        self._sampled_debug("virtual_write", "[CONTROLLER] [SENSOR] Intentando escribir %s en el registro virtual 0x%02X.", value, reg)
 
 
     def _read_virtual_register(self, reg):
@@ -193,26 +255,9 @@ class SENSOR_AS7265x:
         :param reg: Dirección del registro virtual.
         :return: Valor leído del registro.
         """
-        for _ in range(5):  # Intentar un máximo de 5 veces
-            tx_valid, _, _ = self._read_status()  # Verifica TX_VALID
-            if not tx_valid:
-                break
-            time.sleep(self.POLLING_DELAY)
-        else:
-            raise RuntimeError("[CONTROLLER] [SENSOR] Timeout al esperar TX_VALID.")
-        
-        self._write_register(self.REG_WRITE, reg)         # Escribir dirección para leer
-        
-        for _ in range(5):  # Intentar un máximo de 5 veces
-            _, rx_valid, _ = self._read_status()  # Verifica RX_VALID
-            if rx_valid:
-                break
-            time.sleep(self.POLLING_DELAY)
-        else:
-            raise RuntimeError("[CONTROLLER] [SENSOR] Timeout al esperar RX_VALID.")
-        
-        value = self._read_register(self.REG_READ)        # Leer valor
-        logging.debug(f"[CONTROLLER] [SENSOR] Registro virtual {hex(reg)} leído con valor {value}.")
+        # _read_register ya espera TX_VALID, solicita la dirección y espera RX_VALID
+        value = self._read_register(reg)
+        self._sampled_debug("virtual_read", "[CONTROLLER] [SENSOR] Registro virtual 0x%02X leído con valor %s.", reg, value)
         return value
 
 
@@ -225,11 +270,11 @@ class SENSOR_AS7265x:
             tx_valid = (reg_status & self.TX_VALID) >> 1
             rx_valid = reg_status & self.RX_VALID
             ready = (reg_status & self.READY) >> 3
-            logging.debug(f"[CONTROLLER] [SENSOR] REG_STATUS leído: {bin(reg_status)} "
-                        f"(TX_VALID={tx_valid}, RX_VALID={rx_valid}, READY={ready})")
+            self._sampled_debug("status", "[CONTROLLER] [SENSOR] REG_STATUS leído: 0b%s (TX_VALID=%s, RX_VALID=%s, READY=%s)",
+                               format(reg_status, "b"), tx_valid, rx_valid, ready)
             return tx_valid, rx_valid, ready  # CORRECCIÓN: Retorna una tupla con los valores
         except OSError as e:
-            logging.error(f"[CONTROLLER] [SENSOR] Error al leer REG_STATUS: {e}")
+            logging.error("[CONTROLLER] [SENSOR] Error al leer REG_STATUS: %s", e)
             raise
 
 
@@ -240,7 +285,8 @@ class SENSOR_AS7265x:
         logging.debug("[CONTROLLER] [SENSOR] Verificando si el sensor está listo.")
         status = self.verify_ready_state()
         ready = not (status & self.TX_VALID) and (status & self.RX_VALID)
-        logging.debug(f"[CONTROLLER] [SENSOR] Estado del sensor: READY={ready}, TX_VALID={(status & self.TX_VALID) != 0}, RX_VALID={(status & self.RX_VALID) != 0}")
+        logging.debug("[CONTROLLER] [SENSOR] Estado del sensor: READY=%s, TX_VALID=%s, RX_VALID=%s",
+                      ready, (status & self.TX_VALID) != 0, (status & self.RX_VALID) != 0)
         return ready
 
 
@@ -259,7 +305,7 @@ class SENSOR_AS7265x:
                 return result
             except OSError as e:
                 logging.warning(f"Intento {attempt}/{max_attempts} fallido: {e}")
-                time.sleep(POLLING_DELAY)
+                time.sleep(delay)
         raise OSError(f"No se pudo completar la acción después de {max_attempts} intentos.")
 
     def configure(self, integration_time, gain, mode):
@@ -285,6 +331,7 @@ class SENSOR_AS7265x:
             raise ValueError("[CONTROLLER] [SENSOR] Modo no válido.")
         try:
             self._write_virtual_register(0x05, integration_time) # Configurar tiempo de integración
+            self.integration_time = integration_time
             config = self._read_virtual_register(0x04)           # Leer configuración actual
             logging.info(f"[CONTROLLER] [SENSOR] Configuración actual: {bin(config)}")
             config = (config & 0b11001111) | (gain << 4)         # Ajustar ganancia
@@ -295,7 +342,7 @@ class SENSOR_AS7265x:
             logging.info("[CONTROLLER] [SENSOR] Configuración completada exitosamente.")
         except Exception as e:
             logging.error(f"[CONTROLLER] [SENSOR] Error durante la configuración: {e}")
-        raise
+            raise
 
     def set_devsel(self, device):
         """
@@ -324,7 +371,7 @@ class SENSOR_AS7265x:
         for reg_quad in cal_registers:
             cal = [self._read_register(r) for r in reg_quad]
             cal_values.append(self.ieee754_to_float(cal))
-        return self.reorder_data(cal_values)
+        return cal_values
 
     def read_calibrated_spectrum(self):
         """
@@ -339,11 +386,161 @@ class SENSOR_AS7265x:
         all_cal_values = []
         for device in devices:
             all_cal_values.extend(self._read_calibrated_values(device))
-        
-        spectrum = {"wavelengths": wavelengths_nm, "calibrated_values": all_cal_values}
+
+        # reorder_data trabaja sobre los 18 canales de los tres dispositivos
+        spectrum = {"wavelengths": wavelengths_nm, "calibrated_values": self.reorder_data(all_cal_values)}
         logging.info(f"[CONTROLLER] [SENSOR] Espectro calibrado leído: {spectrum}")
         return spectrum
 
+    def _select_device_unverified(self, device):
+        """
+        Escribe DEVSEL sin la lectura de verificación de set_devsel (ruta de lectura rápida).
+        Un fallo de escritura se propaga como OSError y lo reintenta el llamador.
+        :param device: Dispositivo a seleccionar (clave de DEVICES).
+        """
+        write_byte_data = self.i2c.write_byte_data
+        self._wait_status(self.TX_VALID, False)
+        write_byte_data(self.I2C_ADDR, self.REG_WRITE, 0x4F | 0x80)
+        self._wait_status(self.TX_VALID, False)
+        write_byte_data(self.I2C_ADDR, self.REG_WRITE, self.DEVICES[device])
+
+    def _read_register_block(self, start, count):
+        """
+        Lee `count` registros virtuales consecutivos en un solo ciclo sin reintentos por byte.
+        El dispositivo seleccionado (DEVSEL) no cambia durante la lectura.
+
+        El protocolo de registros virtuales no tiene autoincremento: cada byte sigue costando
+        una escritura de dirección y una lectura de REG_READ. Lo que se evita es la consulta de
+        TX_VALID antes de cada byte (RX_VALID implica que el sensor ya consumió la escritura) y
+        el retardo exponencial de _wait_status: RX_VALID se consulta cada MIN_POLLING_DELAY.
+        :param start: Primer registro virtual.
+        :param count: Número de registros a leer.
+        :return: bytes con los valores leídos.
+        """
+        read_byte_data = self.i2c.read_byte_data
+        write_byte_data = self.i2c.write_byte_data
+        address = self.I2C_ADDR
+        data = bytearray(count)
+
+        # Descarta un dato pendiente de una lectura anterior
+        if read_byte_data(address, self.REG_STATUS) & self.RX_VALID:
+            read_byte_data(address, self.REG_READ)
+
+        self._wait_status(self.TX_VALID, False)
+        for offset in range(count):
+            write_byte_data(address, self.REG_WRITE, start + offset)
+            deadline = time.monotonic() + self.STATUS_TIMEOUT
+            while not read_byte_data(address, self.REG_STATUS) & self.RX_VALID:
+                if time.monotonic() > deadline:
+                    raise OSError(f"[CONTROLLER] [SENSOR] Timeout esperando RX_VALID del registro 0x{start + offset:02X}.")
+                time.sleep(self.MIN_POLLING_DELAY)
+            data[offset] = read_byte_data(address, self.REG_READ)
+        return bytes(data)
+
+    def read_calibrated_spectrum_fast(self):
+        """
+        Lee el espectro calibrado con una sola selección de dispositivo y una lectura en bloque
+        de los 24 bytes calibrados por dispositivo, decodificados con struct.
+
+        DEVSEL se escribe sin leerlo de vuelta y los reintentos se aplican por dispositivo (no por
+        byte) mediante _attempt_action. El límite lo impone el protocolo: 72 pares escritura/lectura
+        por espectro, cada uno con el tiempo de respuesta del sensor, por lo que la mejora frente a
+        read_calibrated_spectrum es de ~1.5x (scripts/benchmark_as7265x.py), no de un orden de magnitud.
+        :return: Diccionario con `wavelengths`, `calibrated_values` y `timing_ms`
+                 (tiempo total y por dispositivo en milisegundos).
+        """
+        start = time.perf_counter()
+        timing_ms = {}
+        all_cal_values = []
+
+        for device in self.DEVICES:
+            device_start = time.perf_counter()
+
+            def action():
+                self._select_device_unverified(device)
+                return self._read_register_block(self.REG_CAL_START, self.CAL_BYTES)
+
+            all_cal_values.extend(struct.unpack(">6f", self._attempt_action(action)))
+            timing_ms[device] = round((time.perf_counter() - device_start) * 1000, 3)
+
+        timing_ms["total"] = round((time.perf_counter() - start) * 1000, 3)
+        self.last_read_timing = timing_ms
+        logging.debug("[CONTROLLER] [SENSOR] Espectro calibrado (rápido) leído en %s ms.", timing_ms["total"])
+        return {
+            "wavelengths": self.WAVELENGTHS_NM,
+            "calibrated_values": self.reorder_data(all_cal_values),
+            "timing_ms": timing_ms,
+        }
+
+    @property
+    def integration_seconds(self):
+        """
+        Duración en segundos de una medición en modo 3 (el sensor integra dos veces).
+        """
+        return self.integration_time * self.INTEGRATION_STEP * 2
+
+    def start_measurement(self):
+        """
+        Inicia una medición única (modo 3) sin esperar a que termine la integración.
+        Permite que otro canal del MUX sea atendido mientras este sensor integra.
+        """
+        config = self._read_register(self.REG_CONFIG)
+        config = (config & 0b10110001) | (self.MODE_ONE_SHOT << 2)   # Modo 3 y DATA_RDY en 0
+        if self.acquisition_mode == "interrupt":
+            config |= self.INT_ENABLE                                # El sensor baja INT al terminar
+        self._write_register(self.REG_CONFIG, config)
+        self._measurement_started = time.monotonic()
+        logging.debug("[CONTROLLER] [SENSOR] Medición única iniciada.")
+
+    def is_data_ready(self):
+        """
+        Verifica el bit DATA_RDY del registro de configuración.
+        """
+        return bool(self._read_register(self.REG_CONFIG) & self.DATA_RDY)
+
+    def wait_for_data_ready(self, timeout=None):
+        """
+        Espera a que termine la medición iniciada con `start_measurement`.
+
+        En modo "interrupt" bloquea sobre el flanco de bajada del pin INT (sin tráfico I2C).
+        En modo "adaptive" duerme solo lo que falta de la integración desde `start_measurement`
+        (nada si quien llama ya esperó, p. ej. AcquisitionScheduler) y luego consulta DATA_RDY
+        con retroceso exponencial. En modo "fixed" consulta DATA_RDY cada POLLING_DELAY.
+        :param timeout: Tiempo máximo de espera en segundos (por defecto dos veces la integración).
+        """
+        timeout = timeout if timeout is not None else 2 * self.integration_seconds
+        deadline = time.monotonic() + timeout
+
+        if self.acquisition_mode == "interrupt":
+            if GPIO.input(self.interrupt_pin) == GPIO.HIGH:
+                channel = GPIO.wait_for_edge(self.interrupt_pin, GPIO.FALLING, timeout=max(1, int(timeout * 1000)))
+                if channel is None:
+                    raise TimeoutError("[CONTROLLER] [SENSOR] Timeout esperando el pin de interrupción.")
+            return
+
+        if self.acquisition_mode == "adaptive":
+            delay = self.MIN_POLLING_DELAY
+            started = self._measurement_started if self._measurement_started is not None else time.monotonic()
+            remaining = started + self.integration_seconds - self.STATUS_POLL_MARGIN - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+        else:
+            delay = self.POLLING_DELAY
+        while not self.is_data_ready():
+            if time.monotonic() > deadline:
+                raise TimeoutError("[CONTROLLER] [SENSOR] Timeout esperando DATA_RDY.")
+            time.sleep(delay)
+            if self.acquisition_mode == "adaptive":
+                delay = min(delay * 2, self.POLLING_DELAY)
+
+    def collect_measurement(self, timeout=None):
+        """
+        Espera el fin de la medición iniciada con `start_measurement` y lee el espectro calibrado.
+        :param timeout: Tiempo máximo de espera en segundos (por defecto dos veces la integración).
+        :return: Espectro calibrado.
+        """
+        self.wait_for_data_ready(timeout)
+        return self.read_calibrated_spectrum_fast()
 
     # def read_raw_spectrum(self):
     #     """
@@ -2,12 +2,15 @@
 # Desarrollado por Héctor F. Rivera Santiago
 # copyright (c) 2024
 
-import qwiic_tca9548a
-from smbus2 import SMBus
 import time
 import logging
 import sys
 
+try:
+    from smbus2 import SMBus
+except ImportError:
+    SMBus = None    # Permite usar un bus emulado (lib/i2c_emulator.py) sin smbus2 instalado
+
 # Configuración de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
@@ -20,10 +23,15 @@ class MUX_TCA9548A:
         """
         Inicializa el MUX TCA9548A.
         :param address: Dirección I2C del MUX.
-        :param i2c_bus: Número del bus I2C (por defecto: 1).
+        :param i2c_bus: Número del bus I2C (por defecto: 1) o un objeto compatible con SMBus.
         """
         self.address = address
-        self.bus = SMBus(i2c_bus)
+        if isinstance(i2c_bus, int):
+            if SMBus is None:
+                raise ImportError("[CONTROLLER] [MUX] smbus2 no está instalado. Proporcione un bus compatible con SMBus.")
+            self.bus = SMBus(i2c_bus)
+        else:
+            self.bus = i2c_bus
 
         try:
             logging.debug(f"[CONTROLLER] [MUX] Intentando conectar a la dirección {hex(self.address)} en el bus {i2c_bus}.")
@@ -81,7 +89,7 @@ class MUX_TCA9548A:
             logging.error(f"[CONTROLLER] [MUX] Canal inválido: {channel}.")
             raise ValueError("El canal debe estar entre 0 y 7.")
         try:
-            self.i2c_bus.write_byte(self.address, 1 << channel)
+            self.bus.write_byte(self.address, 1 << channel)
             logging.info(f"[CONTROLLER] [MUX] Canal {channel} seleccionado correctamente.")
         except Exception as e:
             logging.error(f"[CONTROLLER] [MUX] Error al seleccionar canal {channel}: {e}")
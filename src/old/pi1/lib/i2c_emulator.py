@@ -0,0 +1,308 @@
+# i2c_emulator.py - Emulador a nivel de registros del AS7265x y del MUX TCA9548A para pruebas sin hardware.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+
+import logging
+import random
+import struct
+import threading
+import time
+
+
+class EmulatedAS7265x:
+    """
+    Emula el protocolo de registros virtuales del AS7265x (STATUS/WRITE/READ).
+
+    Cada transacción virtual deja TX_VALID o RX_VALID pendientes durante `response_time`
+    segundos para imitar el tiempo de respuesta del microcontrolador interno del sensor.
+    """
+
+    I2C_ADDR = 0x49
+    REG_STATUS = 0x00
+    REG_WRITE = 0x01
+    REG_READ = 0x02
+
+    TX_VALID = 0x02
+    RX_VALID = 0x01
+    READY = 0x08                # Bit que el controlador espera en REG_STATUS
+
+    VREG_CONFIG = 0x04
+    VREG_INTEGRATION = 0x05
+    VREG_DEVSEL = 0x4F
+    CAL_START = 0x14            # Registros calibrados 0x14-0x2B (6 floats por dispositivo)
+    RAW_START = 0x08            # Registros crudos 0x08-0x13 (6 enteros de 16 bits por dispositivo)
+    DATA_RDY = 0x02
+    INTEGRATION_STEP = 0.0028
+
+    def __init__(self, response_time=0.0005, spectrum=None, report_ready=True):
+        """
+        Inicializa el sensor emulado.
+
+        :param response_time: Tiempo en segundos que tarda el sensor en procesar una transacción virtual.
+        :param spectrum: Lista opcional de 18 valores calibrados (orden interno: AS72651, AS72652, AS72653).
+        :param report_ready: Si es True, REG_STATUS reporta el bit READY.
+        """
+        self.response_time = response_time
+        self.report_ready = report_ready
+        self.virtual = [bytearray(0x60) for _ in range(3)]     # Un banco de registros por dispositivo
+        self.devsel = 0
+        self.virtual[0][self.VREG_INTEGRATION] = 100
+        self.spectrum = list(spectrum) if spectrum is not None else [100.0 + 10 * i for i in range(18)]
+        self._load_spectrum()
+
+        self._pending_address = None    # Dirección virtual a escribir tras recibir (reg | 0x80)
+        self._tx_busy_until = 0.0
+        self._rx_value = None
+        self._rx_ready_at = 0.0
+        self._data_ready_at = None
+
+    def _load_spectrum(self):
+        """
+        Carga los valores calibrados y crudos en los registros de cada dispositivo.
+        """
+        for device in range(3):
+            values = self.spectrum[device * 6:(device + 1) * 6]
+            registers = self.virtual[device]
+            registers[self.CAL_START:self.CAL_START + 24] = struct.pack(">6f", *values)
+            raw = [max(0, min(0xFFFF, int(value))) for value in values]
+            registers[self.RAW_START:self.RAW_START + 12] = struct.pack(">6H", *raw)
+
+    def set_spectrum(self, spectrum):
+        """
+        Reemplaza el espectro que devolverá el sensor emulado.
+        """
+        self.spectrum = list(spectrum)
+        self._load_spectrum()
+
+    def _read_virtual(self, address):
+        """
+        Devuelve el valor de un registro virtual según el dispositivo seleccionado.
+        """
+        if address == self.VREG_DEVSEL:
+            return self.devsel
+        if address == self.VREG_CONFIG:
+            value = self.virtual[0][self.VREG_CONFIG] & ~self.DATA_RDY
+            if self._data_ready_at is not None and time.monotonic() >= self._data_ready_at:
+                value |= self.DATA_RDY
+            return value
+        return self.virtual[self.devsel][address]
+
+    def _write_virtual(self, address, value):
+        """
+        Escribe un registro virtual y aplica sus efectos secundarios.
+        """
+        if address == self.VREG_DEVSEL:
+            self.devsel = value & 0x03 if (value & 0x03) < 3 else 0
+            return
+        if address == self.VREG_CONFIG:
+            self.virtual[0][self.VREG_CONFIG] = value & ~self.DATA_RDY
+            if ((value >> 2) & 0x03) in (2, 3):   # Modos 2 y 3 integran dos veces
+                integration = self.virtual[0][self.VREG_INTEGRATION] * self.INTEGRATION_STEP * 2
+                self._data_ready_at = time.monotonic() + integration
+            return
+        if address == self.VREG_INTEGRATION:
+            self.virtual[0][self.VREG_INTEGRATION] = value
+            return
+        self.virtual[self.devsel][address] = value
+
+    def read_byte(self):
+        """
+        Lectura simple usada para verificar la presencia del dispositivo.
+        """
+        return 0
+
+    def read_byte_data(self, register):
+        """
+        Lee un registro físico (STATUS o READ).
+        """
+        now = time.monotonic()
+        if register == self.REG_STATUS:
+            status = self.READY if self.report_ready else 0
+            if now < self._tx_busy_until:
+                status |= self.TX_VALID
+            if self._rx_value is not None and now >= self._rx_ready_at:
+                status |= self.RX_VALID
+            return status
+        if register == self.REG_READ:
+            value = self._rx_value if self._rx_value is not None else 0
+            self._rx_value = None
+            return value
+        raise OSError(f"[EMULATOR] Registro físico inválido: 0x{register:02X}")
+
+    def write_byte_data(self, register, value):
+        """
+        Escribe en el registro físico WRITE siguiendo el protocolo de registros virtuales.
+        """
+        if register != self.REG_WRITE:
+            raise OSError(f"[EMULATOR] Escritura en registro físico inválido: 0x{register:02X}")
+        now = time.monotonic()
+        if now < self._tx_busy_until:
+            raise OSError("[EMULATOR] Escritura con TX_VALID activo.")
+
+        if self._pending_address is not None:
+            self._write_virtual(self._pending_address, value)
+            self._pending_address = None
+        elif value & 0x80:
+            self._pending_address = value & 0x7F
+        else:
+            self._rx_value = self._read_virtual(value)
+            self._rx_ready_at = now + self.response_time
+        self._tx_busy_until = now + self.response_time
+
+
+class EmulatedTCA9548A:
+    """
+    Emula el MUX TCA9548A: un registro de control cuyo byte es la máscara de canales habilitados.
+    """
+
+    I2C_ADDR = 0x70
+
+    def __init__(self):
+        self.control = 0x00
+        self.switches = 0       # Número de escrituras al registro de control
+
+    def read_byte(self):
+        return self.control
+
+    def write_byte(self, value):
+        self.control = value & 0xFF
+        self.switches += 1
+
+    def enabled_channels(self):
+        """
+        Devuelve la lista de canales habilitados.
+        """
+        return [channel for channel in range(8) if self.control & (1 << channel)]
+
+
+class EmulatedSMBus:
+    """
+    Bus I2C emulado compatible con la interfaz de smbus2.SMBus usada por los controladores.
+
+    Los dispositivos pueden conectarse directamente al bus o detrás de un canal del MUX
+    emulado; en ese caso solo responden cuando su canal está habilitado. Cada transacción
+    puede tener una latencia fija y una probabilidad de error (OSError) reproducible.
+    """
+
+    def __init__(self, devices=None, mux=None, latency=0.0, error_rate=0.0, seed=0):
+        """
+        :param devices: Diccionario {dirección: dispositivo emulado} conectado directamente al bus.
+        :param mux: Instancia opcional de EmulatedTCA9548A.
+        :param latency: Latencia en segundos agregada a cada transacción.
+        :param error_rate: Probabilidad (0-1) de que una transacción falle con OSError.
+        :param seed: Semilla para que la inyección de errores sea determinista.
+        """
+        self.devices = dict(devices or {})
+        self.mux = mux
+        self.channel_devices = {}       # {canal: {dirección: dispositivo}}
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._forced_errors = 0
+        self.transactions = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        if mux is not None:
+            self.devices[mux.I2C_ADDR] = mux
+
+    def add_device(self, address, device, channel=None):
+        """
+        Conecta un dispositivo emulado en una dirección del bus.
+
+        :param channel: Canal del MUX detrás del cual está el dispositivo. None lo conecta directamente.
+        """
+        if channel is None:
+            self.devices[address] = device
+        else:
+            if self.mux is None:
+                raise ValueError("[EMULATOR] No hay MUX emulado en el bus.")
+            self.channel_devices.setdefault(channel, {})[address] = device
+
+    def fail_next(self, count=1):
+        """
+        Fuerza que las próximas `count` transacciones fallen con OSError.
+        """
+        self._forced_errors += count
+
+    def _device(self, address):
+        device = self.devices.get(address)
+        if device is not None:
+            return device
+
+        if self.mux is not None:
+            found = [self.channel_devices[channel][address]
+                     for channel in self.mux.enabled_channels()
+                     if address in self.channel_devices.get(channel, {})]
+            if len(found) == 1:
+                return found[0]
+            if len(found) > 1:
+                raise OSError(f"[Errno 5] Input/output error (colisión en dirección {hex(address)})")
+        raise OSError(f"[Errno 121] Remote I/O error (dirección {hex(address)})")
+
+    def _transaction(self, address):
+        """
+        Aplica latencia e inyección de errores y devuelve el dispositivo destino.
+        """
+        self.transactions += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self._forced_errors or (self.error_rate and self._random.random() < self.error_rate):
+            self._forced_errors = max(0, self._forced_errors - 1)
+            self.errors += 1
+            raise OSError(f"[Errno 121] Remote I/O error (error inyectado en {hex(address)})")
+        return self._device(address)
+
+    def read_byte(self, address):
+        with self.lock:
+            return self._transaction(address).read_byte()
+
+    def write_byte(self, address, value):
+        with self.lock:
+            self._transaction(address).write_byte(value)
+
+    def read_byte_data(self, address, register):
+        with self.lock:
+            return self._transaction(address).read_byte_data(register)
+
+    def write_byte_data(self, address, register, value):
+        with self.lock:
+            self._transaction(address).write_byte_data(register, value)
+
+    def get_stats(self):
+        """
+        Devuelve contadores de transacciones, errores inyectados y cambios de canal del MUX.
+        """
+        return {
+            "transactions": self.transactions,
+            "errors": self.errors,
+            "mux_switches": self.mux.switches if self.mux else 0,
+        }
+
+    def close(self):
+        logging.debug(f"[EMULATOR] Bus cerrado: {self.get_stats()}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def build_emulated_system(channels=(0, 4, 7), response_time=0.0005, latency=0.0, error_rate=0.0, seed=0):
+    """
+    Crea un bus emulado con un TCA9548A y un AS7265x en cada canal indicado.
+
+    :param channels: Canales del MUX con un sensor conectado.
+    :param response_time: Tiempo de respuesta por transacción virtual de cada AS7265x.
+    :param latency: Latencia por transacción I2C en segundos.
+    :param error_rate: Probabilidad de error por transacción.
+    :param seed: Semilla de la inyección de errores.
+    :return: Tupla (bus, mux, {canal: sensor emulado}).
+    """
+    mux = EmulatedTCA9548A()
+    bus = EmulatedSMBus(mux=mux, latency=latency, error_rate=error_rate, seed=seed)
+    sensors = {}
+    for channel in channels:
+        sensors[channel] = EmulatedAS7265x(response_time=response_time)
+        bus.add_device(EmulatedAS7265x.I2C_ADDR, sensors[channel], channel=channel)
+    return bus, mux, sensors
@@ -1,7 +1,11 @@
 # sensor_diagnostics.py - Módulo con funciones para ejecutar diagnósticos en los sensores conectados.
 import logging
 import time
+
+import numpy as np
+
 from utils.alert_manager import AlertManager
+from utils.spectral_ring import DEFAULT_PATH, SpectralRingReader
 
 def run_sensor_diagnostics(sensors, alert_manager=None):
     """
@@ -36,4 +40,37 @@ def run_sensor_diagnostics(sensors, alert_manager=None):
     return diagnostics
 
 
+def summarize_recent_spectra(ring_path=DEFAULT_PATH, count=1000):
+    """
+    Resume las lecturas recientes del búfer circular compartido sin detener la adquisición.
+    :param ring_path: Ruta del búfer creado por SensorManager.
+    :param count: Número de lecturas recientes a considerar.
+    :return: Diccionario por canal con lecturas, tasa, valores medios y canales saturados o vacíos.
+    """
+    try:
+        reader = SpectralRingReader(ring_path)
+    except (OSError, ValueError) as e:
+        logging.warning(f"[DIAGNOSTICS] Búfer de espectros no disponible: {e}")
+        return {}
+
+    try:
+        records = reader.latest(count)
+    finally:
+        reader.close()
 
+    summary = {}
+    for channel in np.unique(records["channel"]):
+        selected = records[records["channel"] == channel]
+        values = selected["values"]
+        span = selected["timestamp"][-1] - selected["timestamp"][0]
+        summary[int(channel)] = {
+            "readings": len(selected),
+            "readings_per_second": round(float((len(selected) - 1) / span), 2) if span > 0 else 0.0,
+            "last_timestamp": float(selected["timestamp"][-1]),
+            "mean": np.nanmean(values, axis=0).round(2).tolist(),
+            "zero_bands": int(np.sum(np.all(values == 0, axis=0))),
+            "invalid": int(np.sum(selected["status"] != 0)),
+        }
+        logging.info(f"[DIAGNOSTICS] Canal {int(channel)}: {summary[int(channel)]['readings']} lecturas recientes, "
+                     f"{summary[int(channel)]['readings_per_second']} lecturas/s.")
+    return summary
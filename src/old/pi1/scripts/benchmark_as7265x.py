@@ -0,0 +1,86 @@
+# benchmark_as7265x.py - Mide espectros/segundo del controlador AS7265x contra un sensor emulado.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Agregar la ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from classes.AS7265x_Controller import SENSOR_AS7265x
+from lib.i2c_emulator import EmulatedAS7265x, EmulatedSMBus
+
+
+def run_benchmark(mode, spectra, response_time, integration_time):
+    """
+    Lee `spectra` espectros calibrados completos (medición + lectura) en el modo indicado.
+
+    :param mode: Modo de adquisición del controlador ("fixed" o "adaptive").
+    :param spectra: Número de espectros a leer.
+    :param response_time: Tiempo de respuesta por transacción del sensor emulado en segundos.
+    :param integration_time: Tiempo de integración (1-255, unidades de 2.8 ms).
+    :return: Espectros por segundo.
+    """
+    bus = EmulatedSMBus({EmulatedAS7265x.I2C_ADDR: EmulatedAS7265x(response_time=response_time)})
+    sensor = SENSOR_AS7265x(i2c_bus=bus, acquisition_mode=mode)
+    sensor.configure(integration_time=integration_time, gain=1, mode=0)
+
+    start = time.perf_counter()
+    for _ in range(spectra):
+        sensor.start_measurement()
+        sensor.collect_measurement()
+    elapsed = time.perf_counter() - start
+    return spectra / elapsed, bus.transactions
+
+
+def run_read_benchmark(spectra, response_time):
+    """
+    Compara la lectura calibrada byte a byte contra la lectura en bloque (sin integración).
+
+    :param spectra: Número de espectros a leer por método.
+    :param response_time: Tiempo de respuesta por transacción del sensor emulado en segundos.
+    :return: Diccionario {método: milisegundos promedio por espectro}.
+    """
+    bus = EmulatedSMBus({EmulatedAS7265x.I2C_ADDR: EmulatedAS7265x(response_time=response_time)})
+    sensor = SENSOR_AS7265x(i2c_bus=bus, acquisition_mode="adaptive")
+
+    results = {}
+    for name, read in (("per-byte", sensor.read_calibrated_spectrum), ("fast", sensor.read_calibrated_spectrum_fast)):
+        start = time.perf_counter()
+        for _ in range(spectra):
+            read()
+        results[name] = (time.perf_counter() - start) * 1000 / spectra
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del controlador AS7265x con un sensor emulado.")
+    parser.add_argument("--spectra", type=int, default=3, help="Espectros a leer por modo.")
+    parser.add_argument("--response-time", type=float, default=0.0005, help="Tiempo de respuesta del sensor emulado (s).")
+    parser.add_argument("--integration-time", type=int, default=20, help="Tiempo de integración (1-255, x2.8 ms).")
+    args = parser.parse_args()
+
+    # El controlador configura DEBUG al importarse; el logging no debe dominar la medición
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {}
+    for mode in ("fixed", "adaptive"):
+        rate, transactions = run_benchmark(mode, args.spectra, args.response_time, args.integration_time)
+        results[mode] = rate
+        print(f"[BENCHMARK] Modo {mode:<9}: {rate:8.3f} espectros/s "
+              f"({transactions} transacciones I2C para {args.spectra} espectros)")
+
+    print(f"[BENCHMARK] Mejora adaptive vs fixed: {results['adaptive'] / results['fixed']:.1f}x")
+
+    read_times = run_read_benchmark(args.spectra, args.response_time)
+    for name, elapsed_ms in read_times.items():
+        print(f"[BENCHMARK] Lectura {name:<9}: {elapsed_ms:8.2f} ms por espectro de 18 canales")
+    print(f"[BENCHMARK] Mejora fast vs per-byte: {read_times['per-byte'] / read_times['fast']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# benchmark_spectral_archive.py - Mide la escritura y la carga de un día de espectros en el archivo columnar.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Agregar la ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.spectral_archive import CHANNELS, SpectralArchiveReader, SpectralArchiveWriter
+
+PLASTICS = ["PET", "HDPE", "LDPE", "PP", "PS", "PVC"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del archivo espectral columnar.")
+    parser.add_argument("--readings", type=int, default=86400, help="Lecturas del día simulado (por defecto una por segundo).")
+    parser.add_argument("--chunk-rows", type=int, default=4096, help="Lecturas por bloque.")
+    parser.add_argument("--format", default="npz", choices=SpectralArchiveWriter.FORMATS, help="Formato de los bloques.")
+    parser.add_argument("--no-compress", action="store_true", help="Guardar los bloques sin compresión.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    spectra = rng.uniform(0, 5000, size=(args.readings, CHANNELS)).astype(np.float32)
+    day_start = datetime(2024, 11, 20).timestamp()
+    workdir = tempfile.mkdtemp()
+    try:
+        writer = SpectralArchiveWriter(workdir, chunk_rows=args.chunk_rows, file_format=args.format,
+                                       class_names=PLASTICS, compress=not args.no_compress)
+        start = time.perf_counter()
+        for index in range(args.readings):
+            writer.append(index % 4, spectra[index], predicted=PLASTICS[index % 6], distance=12.5,
+                          timestamp=day_start + index * 86400 / args.readings)
+        append_us = (time.perf_counter() - start) / args.readings * 1e6
+        writer.close()
+        total_s = time.perf_counter() - start
+
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(workdir) for name in names)
+        reader = SpectralArchiveReader(workdir)
+        start = time.perf_counter()
+        data = reader.load_day("2024-11-20")
+        load_ms = (time.perf_counter() - start) * 1000
+        assert np.array_equal(data["calibrated"], spectra)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"[BENCHMARK] Lecturas: {args.readings} | bloques: {writer.chunks_written} | formato: {writer.file_format}")
+    print(f"[BENCHMARK] append: {append_us:.2f} us/lectura | escritura total: {total_s:.2f} s | tamaño: {size / 1e6:.2f} MB")
+    print(f"[BENCHMARK] load_day: {load_ms:.1f} ms ({len(data['timestamp'])} lecturas)")
+
+
+if __name__ == "__main__":
+    main()
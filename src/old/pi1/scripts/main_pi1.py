@@ -28,6 +28,7 @@ from utils.real_time_config import RealTimeConfigManager
 from utils.config_manager import ConfigManager
 from utils.logging_manager import FunctionMonitor
 from utils.json_logger import log_detection
+from utils.spectral_archive import SpectralArchiveWriter
 from lib.sensor_diagnostics import run_sensor_diagnostics
 from lib.mux_diagnostics import run_mux_diagnostics
 
@@ -228,24 +229,38 @@ def main():
     
 
 
+    # Archivo columnar de lecturas espectrales
+    archive = None
+    if config.get("data_archive", {}).get("enabled", False):
+        archive = SpectralArchiveWriter.from_config(config)
+
+    # Percentiles del tiempo de lectura y clasificación por sensor
+    tracker = PerformanceTracker(config.get("system", {}).get("metrics_log_interval", 60), name="lectura y clasificación")
+
     # Seleccionar flujo según configuración
     if not sensors:
         logging.error("[MAIN] No se pudieron inicializar sensores. Finalizando...")
         sys.exit(1)
-        try:
-            while True:
-                system_config = config.get("system", {})
+
+    try:
+        while True:
             if config["system"].get("process_with_conveyor", False):
-                successful_reads, failed_reads, error_details = process_with_conveyor(config, sensors, mux)
+                successful_reads, failed_reads, error_details = process_with_conveyor(config, sensors, mux, archive, tracker)
+                tracker.log_metrics()
             else:
-                successful_reads, failed_reads, error_details = process_individual(config, sensors, mux)
+                successful_reads, failed_reads, error_details = process_individual(config, sensors, mux, archive, tracker)
+                tracker.log_metrics()
                 time.sleep(1)
 
-        except KeyboardInterrupt:
-            logging.info("[MAIN] Proceso interrumpido por el usuario.")
-            monitor.stop()
-        except Exception as e:
-            logging.critical(f"[MAIN] Error crítico en la ejecución principal: {e}", exc_info=True)
+    except KeyboardInterrupt:
+        logging.info("[MAIN] Proceso interrumpido por el usuario.")
+        monitor.stop()
+    except Exception as e:
+        logging.critical(f"[MAIN] Error crítico en la ejecución principal: {e}", exc_info=True)
+    finally:
+        # Guardar el bloque parcial del archivo aunque el ciclo termine por error
+        if archive is not None:
+            archive.close()
 
     generate_summary(successful_reads, failed_reads, error_details)
     
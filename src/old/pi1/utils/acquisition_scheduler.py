@@ -0,0 +1,303 @@
+# acquisition_scheduler.py - Planificador de adquisición para múltiples sensores AS7265x en un MUX.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+
+import logging
+import queue
+import threading
+import time
+
+_STOPPED = object()     # Marca de fin en la cola de resultados: el hilo de adquisición terminó
+
+
+class AcquisitionScheduler:
+    """
+    Planificador de lecturas espectrales que es dueño único del bus del MUX TCA9548A.
+
+    Todos los sensores comparten un solo bus I2C, por lo que leerlos con varios hilos solo
+    produce contención sobre el MUX. El planificador recorre los canales en orden fijo y, en
+    cada visita, recoge la medición anterior del canal e inicia la siguiente antes de pasar
+    al próximo canal. Así cada espectro cuesta un solo cambio de canal y los tiempos de
+    integración de los distintos canales se solapan.
+
+    Los sensores que exponen `start_measurement()`, `collect_measurement()` e
+    `integration_seconds` usan el modo solapado; el resto se lee de forma bloqueante con
+    `read_advanced_spectrum()` o `read_calibrated_spectrum()`.
+    """
+
+    def __init__(self, mux_manager, sensors, queue_size=32, lock=None, stats_interval=60, on_result=None, max_spectra=None):
+        """
+        Inicializa el planificador.
+
+        :param mux_manager: Instancia que controla el MUX (debe tener `select_channel`).
+        :param sensors: Lista de sensores con atributos `name` y `channel`.
+        :param queue_size: Tamaño máximo de la cola de resultados.
+        :param lock: Bloqueo opcional compartido con otros usuarios del bus I2C.
+        :param stats_interval: Intervalo en segundos para registrar estadísticas en los logs.
+        :param on_result: Función opcional `on_result(result)` llamada en el hilo de adquisición por cada resultado.
+        :param max_spectra: Espectros a publicar antes de detenerse. None adquiere hasta `stop()`.
+        """
+        self.mux_manager = mux_manager
+        self.sensors = sorted(sensors, key=lambda sensor: sensor.channel)
+        self.results = queue.Queue(maxsize=queue_size)
+        self.lock = lock or threading.Lock()
+        self.stats_interval = stats_interval
+        self.on_result = on_result
+        self.max_spectra = max_spectra
+
+        self._deadlines = {}            # Sensor -> instante (monotónico) en que termina su integración
+        self._active_channel = None     # Último canal seleccionado en el MUX
+        self._stop_event = threading.Event()
+        self._done = threading.Event()  # El hilo de adquisición terminó (con o sin error)
+        self._error = None              # Excepción que terminó el hilo, se relanza en get_result
+        self._thread = None
+
+        self.spectra_count = 0
+        self.channel_switches = 0
+        self.dropped_results = 0
+        self.errors = 0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._last_rate = 0.0
+
+    @staticmethod
+    def _supports_overlap(sensor):
+        """
+        Indica si el sensor permite separar el inicio de la integración de la lectura.
+        """
+        return all(hasattr(sensor, attr) for attr in ("start_measurement", "collect_measurement", "integration_seconds"))
+
+    @staticmethod
+    def _read_blocking(sensor):
+        """
+        Lee un espectro completo de forma bloqueante.
+        """
+        if hasattr(sensor, "read_advanced_spectrum"):
+            return sensor.read_advanced_spectrum()
+        return sensor.read_calibrated_spectrum()
+
+    def _select(self, channel):
+        """
+        Selecciona el canal en el MUX solo si no es el canal activo.
+        """
+        if channel == self._active_channel:
+            return
+        with self.lock:
+            self.mux_manager.select_channel(channel)
+        self._active_channel = channel
+        self.channel_switches += 1
+
+    def _limit_reached(self):
+        return self.max_spectra is not None and self.spectra_count >= self.max_spectra
+
+    def _put(self, item):
+        """
+        Coloca un elemento en la cola acotada descartando el más antiguo si está llena.
+        """
+        while True:
+            try:
+                self.results.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.results.get_nowait()
+                    self.dropped_results += 1
+                except queue.Empty:
+                    pass
+
+    def _publish(self, sensor, data):
+        """
+        Publica un resultado. Al alcanzar `max_spectra` se descarta y se detiene la adquisición.
+        """
+        if self._limit_reached():
+            return
+        result = {
+            "sensor": sensor.name,
+            "channel": sensor.channel,
+            "timestamp": time.time(),
+            "data": data,
+        }
+        if self.on_result:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                logging.warning(f"[SCHEDULER] Error en el callback de resultados: {e}")
+        self._put(result)
+
+        self.spectra_count += 1
+        self._window_count += 1
+        if self._limit_reached():
+            self._stop_event.set()
+
+    def _visit(self, sensor):
+        """
+        Atiende un sensor: recoge su medición pendiente (si existe) e inicia la siguiente.
+        """
+        try:
+            self._select(sensor.channel)
+            if not self._supports_overlap(sensor):
+                self._publish(sensor, self._read_blocking(sensor))
+                return
+
+            deadline = self._deadlines.pop(sensor, None)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+                self._publish(sensor, sensor.collect_measurement())
+
+            sensor.start_measurement()
+            self._deadlines[sensor] = time.monotonic() + sensor.integration_seconds
+        except Exception as e:
+            self.errors += 1
+            self._deadlines.pop(sensor, None)
+            logging.warning(f"[SCHEDULER] [SENSOR] Error en sensor {sensor.name} (canal {sensor.channel}): {e}")
+
+    def run_cycle(self):
+        """
+        Ejecuta una vuelta completa sobre todos los canales.
+        """
+        for sensor in self.sensors:
+            if self._stop_event.is_set():
+                break
+            self._visit(sensor)
+        self._log_stats()
+
+    def _run(self, cycles=None):
+        """
+        Bucle del hilo de adquisición.
+        """
+        logging.info(f"[SCHEDULER] Adquisición iniciada con {len(self.sensors)} sensores.")
+        completed = 0
+        try:
+            while not self._stop_event.is_set() and (cycles is None or completed < cycles):
+                self.run_cycle()
+                completed += 1
+        except Exception as e:
+            self._error = e
+            logging.error(f"[SCHEDULER] Error en el hilo de adquisición: {e}")
+        finally:
+            self._finish()
+            # Despierta a quien espera en get_result aunque el hilo haya terminado por error
+            self._done.set()
+            self._put(_STOPPED)
+        logging.info(f"[SCHEDULER] Adquisición detenida. Estadísticas: {self.get_stats()}")
+
+    def _finish(self):
+        """
+        Recoge las mediciones pendientes y deshabilita los canales del MUX.
+        Con `max_spectra` alcanzado las mediciones en curso se descartan sin leerlas.
+        """
+        if self._limit_reached():
+            self._deadlines.clear()
+        for sensor in list(self._deadlines):
+            try:
+                self._select(sensor.channel)
+                remaining = self._deadlines.pop(sensor) - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+                self._publish(sensor, sensor.collect_measurement())
+            except Exception as e:
+                self.errors += 1
+                logging.warning(f"[SCHEDULER] [SENSOR] Error recogiendo medición final de {sensor.name}: {e}")
+        try:
+            with self.lock:
+                self.mux_manager.disable_all_channels()
+        except Exception as e:
+            logging.error(f"[SCHEDULER] [MUX] Error deshabilitando canales: {e}")
+        self._active_channel = None
+
+    def start(self, cycles=None):
+        """
+        Inicia la adquisición en un hilo dedicado.
+
+        :param cycles: Número de vueltas a ejecutar. None para ejecutar hasta `stop()`.
+        """
+        if self._thread and self._thread.is_alive():
+            logging.warning("[SCHEDULER] La adquisición ya está en ejecución.")
+            return
+        self._stop_event.clear()
+        self._done.clear()
+        self._error = None
+        # Quitar la marca de fin de una ejecución anterior
+        pending = []
+        while True:
+            try:
+                item = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOPPED:
+                pending.append(item)
+        for item in pending:
+            self.results.put_nowait(item)
+        self._thread = threading.Thread(target=self._run, args=(cycles,), daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Detiene la adquisición y espera a que termine el hilo.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self):
+        """
+        Verifica si el hilo de adquisición está activo.
+        """
+        return bool(self._thread and self._thread.is_alive())
+
+    def get_result(self, timeout=None):
+        """
+        Obtiene el siguiente resultado de la cola.
+
+        :param timeout: Tiempo máximo de espera en segundos. None espera hasta el siguiente resultado
+                        o hasta que el hilo de adquisición termine.
+        :return: Diccionario con `sensor`, `channel`, `timestamp` y `data`, o None si vence el tiempo
+                 o la adquisición terminó sin más resultados.
+        :raises: La excepción que terminó el hilo de adquisición, si la hubo.
+        """
+        try:
+            result = self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if result is _STOPPED:
+            self._put(_STOPPED)     # La marca queda para las siguientes llamadas
+            if self._error is not None:
+                raise self._error
+            return None
+        return result
+
+    def spectra_per_second(self):
+        """
+        Devuelve la tasa de espectros por segundo medida en la ventana actual.
+        """
+        elapsed = time.monotonic() - self._window_start
+        if elapsed <= 0:
+            return self._last_rate
+        return self._window_count / elapsed
+
+    def get_stats(self):
+        """
+        Devuelve las estadísticas acumuladas de la adquisición.
+        """
+        return {
+            "spectra": self.spectra_count,
+            "spectra_per_second": round(self.spectra_per_second(), 2),
+            "channel_switches": self.channel_switches,
+            "dropped": self.dropped_results,
+            "errors": self.errors,
+            "queue_depth": self.results.qsize() - (1 if self._done.is_set() else 0),
+        }
+
+    def _log_stats(self):
+        """
+        Registra la tasa de espectros por segundo cada `stats_interval` segundos.
+        """
+        if time.monotonic() - self._window_start < self.stats_interval:
+            return
+        self._last_rate = self.spectra_per_second()
+        logging.info(f"[SCHEDULER] {self._last_rate:.2f} espectros/s | {self.get_stats()}")
+        self._window_start = time.monotonic()
+        self._window_count = 0
@@ -1,22 +1,22 @@
-import math
+import logging
+import time
 
-def identify_plastic_type(raw_data, plastic_spectra):
+from utils.spectral_classifier import SpectralClassifier
+
+def identify_plastic_type(raw_data, plastic_spectra, classifier=None):
     """
     Identifica el tipo de plástico basado en los datos crudos y espectros de referencia.
     :param raw_data: Datos crudos del sensor.
     :param plastic_spectra: Diccionario con los espectros de plásticos.
+    :param classifier: Instancia opcional de SpectralClassifier ya empaquetada. Reutilizarla
+                       entre lecturas evita reconstruir la matriz de referencias.
     :return: Nombre del plástico identificado y distancia mínima.
     """
-    min_distance = float('inf')
-    identified_plastic = None
-
-    for plastic, spectrum in plastic_spectra.items():
-        distance = math.sqrt(sum((raw_data[color] - spectrum[color]) ** 2 for color in raw_data))
-        if distance < min_distance:
-            min_distance = distance
-            identified_plastic = plastic
+    if classifier is None:
+        classifier = SpectralClassifier(plastic_spectra, bands=list(raw_data))
 
-    return identified_plastic, min_distance
+    result = classifier.classify(raw_data)
+    return result["plastic"], result["distance"]
 
 def process_calibrated_spectrum(sensor, conveyor_sync=True):
     """
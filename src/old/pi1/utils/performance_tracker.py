@@ -1,22 +1,43 @@
 # performance_tracker.py - Clase para rastrear estadísticas de rendimiento y procesamiento.
-from datetime import timedelta, datetime
+from datetime import datetime
 import logging
+import math
 
 
 class PerformanceTracker:
     """
     Clase para rastrear estadísticas de rendimiento y procesamiento.
+
+    Los tiempos se acumulan en cubetas logarítmicas (cada potencia de 2 se divide en
+    `sub_buckets` cubetas), por lo que además del promedio se obtienen percentiles con
+    un error relativo acotado (~4 % con 16 sub-cubetas) y memoria fija.
     """
-    def __init__(self, log_interval=60):
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, log_interval=60, name="procesamiento", lowest=0.001, highest=3600000.0, sub_buckets=16):
         """
         Inicializa el rastreador de rendimiento.
 
         :param log_interval: Intervalo en segundos para registrar métricas en los logs.
+        :param name: Nombre de la operación medida (aparece en los logs).
+        :param lowest: Tiempo mínimo distinguible en milisegundos.
+        :param highest: Tiempo máximo registrado en milisegundos; los mayores caen en la última cubeta.
+        :param sub_buckets: Cubetas por potencia de 2.
         """
-        self.total_processing_time = timedelta()
-        self.num_readings = 0
-        self.last_log_time = datetime.now()
         self.log_interval = log_interval
+        self.name = name
+        self.lowest = lowest
+        self.sub_buckets = sub_buckets
+        self.num_buckets = int(math.ceil(math.log2(highest / lowest) * sub_buckets)) + 2
+        self._scale = sub_buckets / math.log(2)
+        self.last_log_time = datetime.now()
+        self._clear()
+
+    def _clear(self):
+        self.buckets = [0] * self.num_buckets
+        self.total_processing_time = 0.0
+        self.max_time = 0.0
+        self.num_readings = 0
 
     def add_reading(self, processing_time):
         """
@@ -24,8 +45,15 @@ class PerformanceTracker:
 
         :param processing_time: Tiempo de procesamiento en milisegundos.
         """
-        self.total_processing_time += timedelta(milliseconds=processing_time)
+        if processing_time <= self.lowest:
+            index = 0
+        else:
+            index = min(int(math.log(processing_time / self.lowest) * self._scale) + 1, self.num_buckets - 1)
+        self.buckets[index] += 1
+        self.total_processing_time += processing_time
         self.num_readings += 1
+        if processing_time > self.max_time:
+            self.max_time = processing_time
 
     def get_average_time(self):
         """
@@ -35,8 +63,33 @@ class PerformanceTracker:
         """
         if self.num_readings == 0:
             return None
-        average_time = self.total_processing_time / self.num_readings
-        return average_time.total_seconds() * 1000  # Convertir a milisegundos
+        return self.total_processing_time / self.num_readings
+
+    def get_percentiles(self, quantiles=QUANTILES):
+        """
+        Calcula percentiles del tiempo de procesamiento.
+
+        :param quantiles: Cuantiles a calcular (entre 0 y 1).
+        :return: Diccionario {"p50": ms, ...} o None si no hay lecturas.
+        """
+        if self.num_readings == 0:
+            return None
+        targets = sorted(quantiles)
+        result = {}
+        cumulative = 0
+        position = 0
+        for index, count in enumerate(self.buckets):
+            if not count:
+                continue
+            cumulative += count
+            while position < len(targets) and cumulative >= targets[position] * self.num_readings:
+                # Media geométrica de los límites de la cubeta, sin superar el máximo observado
+                value = self.lowest if index == 0 else self.lowest * 2 ** ((index - 0.5) / self.sub_buckets)
+                result[f"p{round(targets[position] * 100):g}"] = min(value, self.max_time)
+                position += 1
+        for quantile in targets[position:]:
+            result[f"p{round(quantile * 100):g}"] = self.max_time
+        return result
 
     def log_metrics(self):
         """
@@ -46,7 +99,10 @@ class PerformanceTracker:
         if (now - self.last_log_time).total_seconds() >= self.log_interval:
             average_time = self.get_average_time()
             if average_time:
-                logging.info(f"Tiempo promedio de procesamiento: {average_time:.2f} ms")
+                percentiles = self.get_percentiles()
+                logging.info(f"Tiempo promedio de {self.name}: {average_time:.2f} ms | "
+                             f"p50: {percentiles['p50']:.2f} ms | p95: {percentiles['p95']:.2f} ms | "
+                             f"p99: {percentiles['p99']:.2f} ms | máx: {self.max_time:.2f} ms")
                 logging.info(f"Total de lecturas procesadas: {self.num_readings}")
             else:
                 logging.info("No hay lecturas para calcular métricas.")
@@ -56,6 +112,5 @@ class PerformanceTracker:
         """
         Resetea los datos del rastreador de rendimiento.
         """
-        self.total_processing_time = timedelta()
-        self.num_readings = 0
+        self._clear()
         logging.info("Rastreador de rendimiento reseteado.")
@@ -3,17 +3,48 @@ import time
 
 from lib.AS7265x_HighLevel import AS7265x_Manager
 from lib.TCA9548A_HighLevel import TCA9548A_Manager
-from utils.identify_plastic_type import identify_plastic_type
+from utils.spectral_archive import spectrum_values
+from utils.spectral_classifier import SpectralClassifier
 
 
-def process_individual(config, sensors, mux):
+def extract_spectrum_values(spectrum, bands=None):
+    """
+    Convierte un espectro del sensor en la lectura que espera el clasificador.
+
+    :param spectrum: Espectro en cualquiera de los formatos de los controladores.
+    :param bands: Bandas de la biblioteca; si se indican, se devuelve {banda: valor} en ese orden.
+    """
+    values = spectrum_values(spectrum)
+    return dict(zip(bands, values)) if bands else values
+
+
+def read_raw_for_archive(config, sensor, archive):
+    """
+    Lee los conteos crudos para el archivo solo si `data_archive.include_raw` está activo
+    (cuesta una lectura I2C adicional por sensor).
+
+    :return: Espectro crudo o None.
+    """
+    if archive is None or not config.get("data_archive", {}).get("include_raw", False):
+        return None
+    try:
+        return sensor.read_raw_spectrum()
+    except Exception as e:
+        logging.warning(f"[ARCHIVE] No se pudieron leer los conteos crudos: {e}")
+        return None
+
+
+def process_individual(config, sensors, mux, archive=None, tracker=None):
     """
     Procesa los sensores individualmente en modo individual.
+
+    :param archive: Instancia opcional de SpectralArchiveWriter para guardar cada lectura.
+    :param tracker: Instancia opcional de PerformanceTracker para el tiempo de lectura y clasificación.
     """
     successful_reads = 0
     failed_reads = 0
     error_details = []
-    plastic_spectra = config.get("plastic_spectra", {})                                             # Cargar espectros desde config.yaml
+    classifier = SpectralClassifier.from_config(config)                                             # Empaquetar referencias una sola vez
     mux_channels = [entry['channel'] for entry in config['mux']['channels']]                        # Cargar solo canales configurados
     sensor_names = {entry['channel']: entry['sensor_name'] for entry in config['mux']['channels']}  # Asociar sensores
     
@@ -36,9 +67,13 @@ def process_individual(config, sensors, mux):
 
             # Realizar lectura calibrada o cruda
             spectrum = sensor.read_calibrated_spectrum()
-            raw_data = extract_spectrum_values(spectrum)
-            identified_plastic, distance = identify_plastic_type(raw_data, plastic_spectra)
+            raw_data = extract_spectrum_values(spectrum, classifier.bands)
+            result = classifier.classify(raw_data)
+            identified_plastic, distance = result["plastic"], result["distance"]
             logging.info(f"[INDIVIDUAL] [SENSOR] Plástico identificado en canal {channel}: {identified_plastic} (distancia: {distance:.2f})")
+            if archive is not None:
+                archive.append(channel, spectrum, raw=read_raw_for_archive(config, sensor, archive), predicted=identified_plastic,
+                               confidence=result["confidence"], distance=distance)
             
             successful_reads += 1
         except IndexError as ie:
@@ -56,6 +91,8 @@ def process_individual(config, sensors, mux):
         finally:
             mux.disable_all_channels()
             elapsed_time = time.time() - start_time  # Fin del tiempo para este sensor
+            if tracker is not None:
+                tracker.add_reading(elapsed_time * 1000)
             logging.info("[MUX] Todos los canales deshabilitados.")
             logging.info(f"[INDIVIDUAL] [SENSOR] Captura completada. [MUX] Todos los canales deshabilitados.")
             logging.info(f"Tiempos de ejecución: {elapsed_time:.2f} segundos.")
@@ -64,11 +101,17 @@ def process_individual(config, sensors, mux):
 
 
 
-def process_with_conveyor(config, sensors, mux):
+def process_with_conveyor(config, sensors, mux, archive=None, tracker=None):
+    """
+    Procesa los sensores por canal sincronizado con el conveyor.
+
+    :param archive: Instancia opcional de SpectralArchiveWriter para guardar cada lectura.
+    :param tracker: Instancia opcional de PerformanceTracker para el tiempo de lectura y clasificación.
+    """
     successful_reads = 0
     failed_reads = 0
     error_details = []
-    plastic_spectra = config.get("plastic_spectra", {})                                             # Cargar espectros desde config.yaml
+    classifier = SpectralClassifier.from_config(config)                                             # Empaquetar referencias una sola vez
     mux_channels = [entry['channel'] for entry in config['mux']['channels']]                        # Cargar solo canales configurados
     sensor_names = {entry['channel']: entry['sensor_name'] for entry in config['mux']['channels']}  # Asociar sensores
 
@@ -108,8 +151,16 @@ def process_with_conveyor(config, sensors, mux):
                 "Orange": spectrum[4]['calibrated_value'],
                 "Red": spectrum[5]['calibrated_value']
             }
-            identified_plastic, distance = identify_plastic_type(raw_data, plastic_spectra)
+            result = classifier.classify(raw_data)
+            identified_plastic, distance = result["plastic"], result["distance"]
             logging.info(f"[CONVEYOR] [SENSOR] Plástico identificado en canal {channel}: {identified_plastic} (distancia: {distance:.2f})")
+            if archive is not None:
+                if read_calibrated:
+                    archive.append(channel, spectrum, raw=read_raw_for_archive(config, sensors[channel], archive),
+                                   predicted=identified_plastic, confidence=result["confidence"], distance=distance)
+                else:
+                    archive.append(channel, [], raw=spectrum, predicted=identified_plastic,
+                                   confidence=result["confidence"], distance=distance)
             successful_reads += 1
 
         except IndexError:
@@ -130,6 +181,8 @@ def process_with_conveyor(config, sensors, mux):
             mux.disable_all_channels()
             logging.info("[MUX] Todos los canales deshabilitados.")
             elapsed_time = time.time() - start_time
+            if tracker is not None:
+                tracker.add_reading(elapsed_time * 1000)
             logging.info(f"[CONVEYOR] [MUX] Todos los canales deshabilitados. Tiempo de ejecución: {elapsed_time:.2f} segundos.")
             logging.info("=" * 50)
 
@@ -3,10 +3,14 @@ import logging
 import time
 import threading
 
-from lib.as7265x import CustomAS7265x
 from typing import List, Dict
-from lib.mux_manager import MUXManager
-from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from lib.as7265x import CustomAS7265x
+except ImportError:
+    CustomAS7265x = None    # Solo se requiere en initialize_sensors; permite usar sensores ya creados (p. ej. emulados)
+from utils.acquisition_scheduler import AcquisitionScheduler
+from utils.spectral_ring import SpectralRingWriter
 
 
 class SensorManager:
@@ -14,19 +18,36 @@ class SensorManager:
     Clase para manejar múltiples sensores AS7265x conectados al MUX.
     """
 
-    def __init__(self, config, mux_manager, alert_manager=None, lock=None):
+    def __init__(self, config, mux_manager, alert_manager=None, lock=None, ring_buffer=None):
         """
         Inicializa el administrador de sensores.
 
         :param sensor_config: Configuración de los sensores cargada desde YAML.
         :param mux_manager: Instancia de MUXManager para manejar los canales.
         :param alert_manager: Instancia opcional de AlertManager para manejar alertas.
+        :param ring_buffer: SpectralRingWriter opcional. Si es None y `sensors.ring_buffer.enabled`
+                            está activo, se crea desde la configuración.
         """
         self.config = config                    # Configuración de los sensores.
         self.mux_manager = mux_manager          # Instancia de MUXManager.
         self.alert_manager = alert_manager      # Instancia de AlertManager.
         self.sensors = []                       # Lista de sensores inicializados.
         self.lock = lock or threading.Lock()    # Usar bloqueo personalizado o crear uno nuevo.
+        self.scheduler = None                   # Planificador de adquisición (se crea al iniciar).
+        self.ring_buffer = ring_buffer          # Lecturas recientes compartidas con otros procesos.
+        if self.ring_buffer is None and self.config.get('sensors', {}).get('ring_buffer', {}).get('enabled', False):
+            self.ring_buffer = SpectralRingWriter.from_config(self.config)
+
+    def _record(self, channel, data):
+        """
+        Publica una lectura en el búfer circular compartido.
+        """
+        if self.ring_buffer is None or not data:
+            return
+        try:
+            self.ring_buffer.write(channel, data)
+        except Exception as e:
+            logging.warning(f"[SENSOR_MANAGER] Error escribiendo en el búfer circular: {e}")
 
     
 
@@ -75,6 +96,7 @@ class SensorManager:
                     self.mux_manager.select_channel(sensor.channel)
                 data = sensor.read_advanced_spectrum()
                 logging.info(f"Datos leídos del sensor {sensor.name} en intento {attempt + 1}: {data}")
+                self._record(sensor.channel, data)
                 return data
             except Exception as e:
                 logging.warning(f"Error leyendo sensor {sensor.name} en intento {attempt + 1}: {e}")
@@ -113,36 +135,59 @@ class SensorManager:
             print(f"Error verificando estado del sensor: {e}")
             return False
 
-    def read_sensors_concurrently(self):
+    def read_sensors_concurrently(self, max_spectra=None, timeout=None):
+        """
+        Lee datos espectrales de los sensores mediante el planificador de adquisición.
+
+        El planificador es el único dueño del bus del MUX: cada espectro cuesta un solo
+        cambio de canal y las integraciones de los distintos canales se solapan.
+
+        :param max_spectra: Número de espectros a leer antes de detenerse. None lee indefinidamente.
+        :param timeout: Tiempo máximo de espera por cada resultado en segundos.
+        :return: Lista con los resultados leídos.
+        """
+        scheduler = self.start_acquisition(max_spectra=max_spectra)
+        results = []
+        try:
+            while max_spectra is None or len(results) < max_spectra:
+                result = scheduler.get_result(timeout=timeout)
+                if result is None:
+                    if scheduler.is_running():
+                        logging.warning("[SENSOR_MANAGER] Tiempo de espera agotado esperando resultados del planificador.")
+                    else:
+                        logging.warning("[SENSOR_MANAGER] El planificador se detuvo antes de completar la lectura.")
+                    break
+                logging.debug(f"Datos leídos del sensor {result['sensor']}: {result['data']}")
+                if max_spectra is not None:
+                    results.append(result)
+        finally:
+            self.stop_acquisition()
+        return results
+
+    def start_acquisition(self, queue_size=None, max_spectra=None):
+        """
+        Inicia el planificador de adquisición en segundo plano.
+
+        :param queue_size: Tamaño de la cola de resultados (por defecto `sensors.queue_size` o 32).
+        :param max_spectra: Espectros a adquirir antes de detenerse. None adquiere hasta `stop_acquisition()`.
+        :return: Instancia de AcquisitionScheduler en ejecución.
+        """
+        if self.scheduler and self.scheduler.is_running():
+            return self.scheduler
+        queue_size = queue_size or self.config.get('sensors', {}).get('queue_size', 32)
+        on_result = (lambda result: self._record(result['channel'], result['data'])) if self.ring_buffer else None
+        self.scheduler = AcquisitionScheduler(self.mux_manager, self.sensors, queue_size=queue_size, lock=self.lock,
+                                              on_result=on_result, max_spectra=max_spectra)
+        self.scheduler.start()
+        return self.scheduler
+
+    def stop_acquisition(self):
         """
-        Lee datos espectrales de los sensores de manera concurrente.
+        Detiene el planificador de adquisición y registra sus estadísticas.
         """
-        def read_sensor(sensor):
-            """
-            Lee datos de un sensor específico.
-            """
-            while True:
-                try:
-                    with self.lock:
-                        self.mux_manager.select_channel(sensor.channel)
-                    data = sensor.read_advanced_spectrum()
-                    logging.info(f"Datos leídos del sensor {sensor.name}: {data}")
-                except Exception as e:
-                    logging.error(f"Error leyendo datos del sensor {sensor.name}: {e}")
-                finally:
-                    with self.lock:
-                        self.mux_manager.disable_all_channels()
-
-        # Crear un ThreadPoolExecutor para ejecutar las lecturas en paralelo
-        with ThreadPoolExecutor(max_workers=len(self.sensors)) as executor:
-            futures = [executor.submit(read_sensor, sensor) for sensor in self.sensors]
-
-            # Manejar excepciones si ocurre algún error en los hilos
-            for future in futures:
-                try:
-                    future.result()
-                except Exception as e:
-                    logging.error(f"Error en la ejecución del hilo: {e}")
+        if self.scheduler:
+            self.scheduler.stop()
+            logging.info(f"[SENSOR_MANAGER] Adquisición detenida: {self.scheduler.get_stats()}")
 
     def read_all_sensors(self):
         """
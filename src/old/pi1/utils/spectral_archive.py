@@ -0,0 +1,366 @@
+# spectral_archive.py - Archivo columnar (NPZ comprimido o Parquet) de las lecturas espectrales AS7265x.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+
+import glob
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None          # Solo se requiere con format="parquet"
+
+SCHEMA_VERSION = 1
+CHANNELS = 18
+WAVELENGTHS_NM = [
+    410, 435, 460, 485, 510, 535, 560, 585, 610,
+    645, 680, 705, 730, 760, 810, 860, 900, 940
+]
+UNKNOWN_CLASS = 255         # Código de clase para lecturas sin clasificar
+
+# Columnas del archivo: nombre -> (dtype, ancho). Ancho None = una columna escalar.
+COLUMNS = {
+    "timestamp": (np.float64, None),        # Segundos epoch
+    "channel": (np.uint8, None),            # Canal del MUX
+    "calibrated": (np.float32, CHANNELS),   # Valores calibrados (NaN si la lectura tiene menos canales)
+    "raw": (np.uint16, CHANNELS),           # Conteos crudos (0 si no se leyeron)
+    "predicted": (np.uint8, None),          # Índice en `class_names`
+    "confidence": (np.float32, None),
+    "distance": (np.float32, None),         # Distancia a la referencia más cercana
+}
+
+
+def spectrum_values(spectrum):
+    """
+    Extrae los valores de un espectro en cualquiera de los formatos de los controladores:
+    diccionario con `calibrated_values`, diccionario {banda: valor}, lista de diccionarios
+    con `calibrated_value` o secuencia de valores.
+    """
+    if spectrum is None:
+        return []
+    if isinstance(spectrum, dict):
+        if "calibrated_values" in spectrum:
+            return list(spectrum["calibrated_values"])
+        return list(spectrum.values())
+    return [item["calibrated_value"] if isinstance(item, dict) else item for item in spectrum]
+
+
+class SpectralArchiveWriter:
+    """
+    Acumula lecturas espectrales en columnas de NumPy preasignadas y las guarda por bloques.
+
+    Cada bloque de `chunk_rows` lecturas (o lo acumulado tras `flush_interval` segundos, aunque
+    no lleguen lecturas nuevas, o al cambiar el día) se escribe como `directorio/AAAA-MM-DD/spectra_HHMMSS_NNNN.npz` (o
+    `.parquet`) con la versión de esquema, las longitudes de onda y los nombres de clase.
+    `append` solo copia valores a los arreglos; la compresión y la escritura se hacen en un
+    hilo aparte para no detener la adquisición.
+    """
+
+    FORMATS = ("npz", "parquet")
+
+    def __init__(self, directory, chunk_rows=4096, flush_interval=300, file_format="npz", class_names=None, compress=True):
+        """
+        :param directory: Directorio raíz del archivo.
+        :param chunk_rows: Lecturas por bloque.
+        :param flush_interval: Segundos máximos antes de guardar un bloque parcial.
+        :param file_format: "npz" (numpy, siempre disponible) o "parquet" (requiere pyarrow).
+        :param class_names: Nombres de las clases de plástico (p. ej. las llaves de `plastic_spectra`).
+        :param compress: Si es True los bloques se comprimen (NPZ con zlib, Parquet con zstd).
+                         Sin compresión los bloques ocupan más y se cargan varias veces más rápido.
+        """
+        if file_format not in self.FORMATS:
+            raise ValueError(f"[ARCHIVE] Formato no válido: {file_format}.")
+        if file_format == "parquet" and pq is None:
+            logging.warning("[ARCHIVE] pyarrow no está instalado. Usando formato 'npz'.")
+            file_format = "npz"
+
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.flush_interval = flush_interval
+        self.file_format = file_format
+        self.compress = compress
+        self.class_names = list(class_names or [])
+        self._class_codes = {name: code for code, name in enumerate(self.class_names)}
+
+        self._lock = threading.Lock()
+        self._columns = self._allocate()
+        self._rows = 0
+        self._chunk_day = None
+        self._chunk_started = time.monotonic()
+        self._sequence = 0
+        self.rows_written = 0
+        self.chunks_written = 0
+        self.errors = 0
+
+        self._pending = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Crea el archivo usando la sección `data_archive` de la configuración.
+        """
+        settings = config.get("data_archive", {})
+        return cls(
+            settings.get("directory", "data/spectra"),
+            chunk_rows=settings.get("chunk_rows", 4096),
+            flush_interval=settings.get("flush_interval", 300),
+            file_format=settings.get("format", "npz"),
+            class_names=list(config.get("plastic_spectra", {}).keys()),
+            compress=settings.get("compress", True)
+        )
+
+    def _allocate(self):
+        return {
+            name: np.zeros((self.chunk_rows, width) if width else self.chunk_rows, dtype=dtype)
+            for name, (dtype, width) in COLUMNS.items()
+        }
+
+    def _class_code(self, predicted):
+        if predicted is None:
+            return UNKNOWN_CLASS
+        code = self._class_codes.get(predicted)
+        if code is None:
+            if len(self.class_names) >= UNKNOWN_CLASS:
+                return UNKNOWN_CLASS
+            code = self._class_codes[predicted] = len(self.class_names)
+            self.class_names.append(predicted)
+        return code
+
+    def append(self, channel, calibrated, raw=None, predicted=None, confidence=None, distance=None, timestamp=None):
+        """
+        Agrega una lectura al bloque actual.
+
+        :param channel: Canal del MUX del sensor.
+        :param calibrated: Espectro calibrado (ver `spectrum_values`).
+        :param raw: Conteos crudos opcionales.
+        :param predicted: Clase predicha (nombre del plástico).
+        :param confidence: Confianza de la clasificación.
+        :param distance: Distancia a la referencia más cercana.
+        :param timestamp: Segundos epoch de la lectura (por defecto, ahora).
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        values = spectrum_values(calibrated)[:CHANNELS]
+        counts = spectrum_values(raw)[:CHANNELS]
+        day = date.fromtimestamp(timestamp)
+
+        with self._lock:
+            if self._rows and day != self._chunk_day:
+                self._rotate_locked()
+            if not self._rows:
+                self._chunk_day = day
+                self._chunk_started = time.monotonic()
+
+            row = self._rows
+            columns = self._columns
+            columns["timestamp"][row] = timestamp
+            columns["channel"][row] = channel
+            columns["calibrated"][row, :] = np.nan
+            columns["calibrated"][row, :len(values)] = values
+            columns["raw"][row, :len(counts)] = counts
+            columns["predicted"][row] = self._class_code(predicted)
+            columns["confidence"][row] = np.nan if confidence is None else confidence
+            columns["distance"][row] = np.nan if distance is None else distance
+            self._rows += 1
+
+            if self._rows >= self.chunk_rows or time.monotonic() - self._chunk_started >= self.flush_interval:
+                self._rotate_locked()
+
+    def _rotate_locked(self):
+        """
+        Entrega el bloque actual al hilo de escritura y prepara arreglos nuevos.
+        """
+        if not self._rows:
+            return
+        chunk = {name: column[:self._rows] for name, column in self._columns.items()}
+        self._pending.put((self._chunk_day, self._sequence, chunk, list(self.class_names)))
+        self._sequence += 1
+        self._columns = self._allocate()
+        self._rows = 0
+
+    def _chunk_path(self, day, sequence, first_timestamp):
+        folder = os.path.join(self.directory, day.isoformat())
+        os.makedirs(folder, exist_ok=True)
+        stamp = datetime.fromtimestamp(first_timestamp).strftime("%H%M%S")
+        return os.path.join(folder, f"spectra_{stamp}_{sequence:04d}.{self.file_format}")
+
+    def _write_chunk(self, day, sequence, chunk, class_names):
+        path = self._chunk_path(day, sequence, chunk["timestamp"][0])
+        temporary = path + ".tmp"
+        if self.file_format == "npz":
+            with open(temporary, "wb") as file:
+                save = np.savez_compressed if self.compress else np.savez
+                save(
+                    file, schema_version=np.uint16(SCHEMA_VERSION), wavelengths=np.asarray(WAVELENGTHS_NM, dtype=np.uint16),
+                    class_names=np.asarray(class_names, dtype=str), **chunk
+                )
+        else:
+            arrays = {name: pa.array(values) for name, values in chunk.items() if values.ndim == 1}
+            for name in ("calibrated", "raw"):
+                arrays[name] = pa.FixedSizeListArray.from_arrays(pa.array(chunk[name].ravel()), CHANNELS)
+            metadata = {"schema_version": str(SCHEMA_VERSION), "class_names": ",".join(class_names)}
+            table = pa.table(arrays).replace_schema_metadata(metadata)
+            pq.write_table(table, temporary, compression="zstd" if self.compress else "none")
+        os.replace(temporary, path)     # Un lector nunca ve un bloque a medio escribir
+        return path
+
+    def _flush_if_stale(self):
+        """
+        Entrega el bloque parcial si lleva `flush_interval` segundos abierto.
+        """
+        with self._lock:
+            if self._rows and time.monotonic() - self._chunk_started >= self.flush_interval:
+                self._rotate_locked()
+
+    def _run(self):
+        """
+        Hilo de escritura de bloques. Sin bloques pendientes revisa periódicamente la edad del
+        bloque parcial, de modo que las lecturas esporádicas se guardan sin esperar a `append`.
+        """
+        check_interval = max(0.1, self.flush_interval / 4) if self.flush_interval else None
+        while True:
+            try:
+                item = self._pending.get(timeout=check_interval)
+            except queue.Empty:
+                self._flush_if_stale()
+                continue
+            try:
+                if item is None:
+                    return
+                path = self._write_chunk(*item)
+                self.rows_written += len(item[2]["timestamp"])
+                self.chunks_written += 1
+                logging.debug(f"[ARCHIVE] Bloque guardado: {path}")
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"[ARCHIVE] Error guardando bloque espectral: {e}")
+            finally:
+                self._pending.task_done()
+
+    def flush(self):
+        """
+        Guarda el bloque parcial y espera a que se escriban los bloques pendientes.
+        """
+        with self._lock:
+            self._rotate_locked()
+        self._pending.join()
+
+    def close(self):
+        """
+        Guarda lo pendiente y detiene el hilo de escritura.
+        """
+        self.flush()
+        self._pending.put(None)
+        self._thread.join()
+
+
+class SpectralArchiveReader:
+    """
+    Lector del archivo espectral: concatena los bloques de un día o de un rango de fechas.
+    """
+
+    def __init__(self, directory):
+        """
+        :param directory: Directorio raíz del archivo.
+        """
+        self.directory = directory
+
+    def chunk_paths(self, day):
+        """
+        Devuelve los bloques de un día en orden cronológico.
+        """
+        folder = os.path.join(self.directory, day.isoformat() if isinstance(day, date) else str(day))
+        return sorted(glob.glob(os.path.join(folder, "spectra_*.npz")) + glob.glob(os.path.join(folder, "spectra_*.parquet")))
+
+    @staticmethod
+    def _load_chunk(path):
+        """
+        Carga un bloque y devuelve sus columnas y nombres de clase.
+        """
+        if path.endswith(".npz"):
+            with np.load(path) as data:
+                version = int(data["schema_version"])
+                if version > SCHEMA_VERSION:
+                    raise ValueError(f"[ARCHIVE] Versión de esquema no soportada en {path}: {version}")
+                return {name: data[name] for name in COLUMNS}, [str(name) for name in data["class_names"]]
+
+        if pq is None:
+            raise ImportError("[ARCHIVE] pyarrow no está instalado; no se pueden leer bloques Parquet.")
+        table = pq.read_table(path)
+        metadata = table.schema.metadata or {}
+        if int(metadata.get(b"schema_version", b"0")) > SCHEMA_VERSION:
+            raise ValueError(f"[ARCHIVE] Versión de esquema no soportada en {path}.")
+        columns = {}
+        for name, (dtype, width) in COLUMNS.items():
+            column = table.column(name).combine_chunks()
+            if width:
+                column = column.flatten().to_numpy(zero_copy_only=False).reshape(-1, width)
+            else:
+                column = column.to_numpy(zero_copy_only=False)
+            columns[name] = column.astype(dtype, copy=False)
+        class_names = metadata.get(b"class_names", b"").decode("utf-8")
+        return columns, class_names.split(",") if class_names else []
+
+    def load_paths(self, paths):
+        """
+        Carga y concatena bloques. Los códigos de clase se reasignan a una lista común.
+
+        :return: Diccionario de columnas (arreglos de NumPy) más `class_names`.
+        """
+        parts = {name: [] for name in COLUMNS}
+        class_names = []
+        codes = {}
+        for path in paths:
+            columns, names = self._load_chunk(path)
+            # Traducir los códigos locales del bloque a la lista común
+            mapping = np.full(256, UNKNOWN_CLASS, dtype=np.uint8)
+            for code, name in enumerate(names):
+                if name not in codes:
+                    codes[name] = len(class_names)
+                    class_names.append(name)
+                mapping[code] = codes[name]
+            columns["predicted"] = mapping[columns["predicted"]]
+            for name in COLUMNS:
+                parts[name].append(columns[name])
+
+        result = {}
+        for name, (dtype, width) in COLUMNS.items():
+            if parts[name]:
+                result[name] = np.concatenate(parts[name])
+            else:
+                result[name] = np.zeros((0, width) if width else 0, dtype=dtype)
+        result["class_names"] = class_names
+        return result
+
+    def load_day(self, day):
+        """
+        Carga todas las lecturas de un día.
+
+        :param day: datetime.date o texto "AAAA-MM-DD".
+        """
+        return self.load_paths(self.chunk_paths(day))
+
+    def load_range(self, start, end):
+        """
+        Carga las lecturas entre dos instantes (datetime), inclusive.
+        """
+        paths = []
+        day = start.date()
+        while day <= end.date():
+            paths.extend(self.chunk_paths(day))
+            day += timedelta(days=1)
+        data = self.load_paths(paths)
+        mask = (data["timestamp"] >= start.timestamp()) & (data["timestamp"] <= end.timestamp())
+        class_names = data.pop("class_names")
+        result = {name: column[mask] for name, column in data.items()}
+        result["class_names"] = class_names
+        return result
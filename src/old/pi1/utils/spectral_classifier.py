@@ -0,0 +1,184 @@
+# spectral_classifier.py - Clasificador vectorizado de espectros por vecino más cercano.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+
+import logging
+import numpy as np
+
+
+class SpectralClassifier:
+    """
+    Clasificador de plásticos por espectro de referencia más cercano.
+
+    Empaqueta la biblioteca de espectros de referencia en una matriz contigua de NumPy
+    una sola vez y clasifica lecturas individuales o lotes completos con un único
+    cálculo vectorizado de distancias.
+    """
+
+    METRICS = ("euclidean", "cosine", "spectral_angle")
+
+    def __init__(self, plastic_spectra, bands=None, metric="euclidean"):
+        """
+        Inicializa el clasificador a partir de la biblioteca de espectros.
+
+        :param plastic_spectra: Diccionario {plástico: referencia}. Cada referencia puede ser un
+                                diccionario {banda: valor}, una lista de valores (p. ej. 18 canales)
+                                o una lista de referencias para el mismo plástico.
+        :param bands: Orden de las bandas a usar cuando las lecturas son diccionarios.
+                      Si es None se toma el orden de la primera referencia.
+        :param metric: Métrica de distancia ("euclidean", "cosine" o "spectral_angle").
+        """
+        if metric not in self.METRICS:
+            raise ValueError(f"[CLASSIFIER] Métrica no válida: {metric}. Seleccione entre {list(self.METRICS)}.")
+        if not plastic_spectra:
+            raise ValueError("[CLASSIFIER] La biblioteca de espectros está vacía.")
+
+        self.metric = metric
+        self.bands = list(bands) if bands is not None else self._infer_bands(plastic_spectra)
+
+        plastics = []
+        labels = []
+        rows = []
+        group_starts = []
+        for plastic, references in plastic_spectra.items():
+            references = self._split_references(references)
+            if not references:
+                # minimum.reduceat no admite grupos vacíos: el plástico se omite
+                logging.warning(f"[CLASSIFIER] El plástico {plastic} no tiene espectros de referencia. Se omite.")
+                continue
+            plastics.append(plastic)
+            group_starts.append(len(rows))
+            for reference in references:
+                rows.append(self._to_vector(reference))
+                labels.append(plastic)
+        if not rows:
+            raise ValueError("[CLASSIFIER] Ningún plástico de la biblioteca tiene espectros de referencia.")
+
+        self.labels = plastics                                 # Un nombre por plástico
+        self.reference_labels = labels                         # Un nombre por fila de la matriz
+        self.references = np.ascontiguousarray(rows, dtype=np.float64)
+        self._group_starts = np.asarray(group_starts, dtype=np.intp)
+
+        # Precalcular normas de las referencias para no repetirlas en cada lectura
+        self._ref_sq_norms = np.einsum("ij,ij->i", self.references, self.references)
+        self._ref_norms = np.sqrt(self._ref_sq_norms)
+
+        logging.info(f"[CLASSIFIER] Biblioteca empaquetada: {len(self.labels)} plásticos, "
+                     f"{self.references.shape[0]} referencias, {self.references.shape[1]} canales, métrica={metric}.")
+
+    @classmethod
+    def from_config(cls, config, metric=None):
+        """
+        Crea el clasificador usando la sección `plastic_spectra` de la configuración.
+
+        :param config: Configuración del sistema cargada desde YAML.
+        :param metric: Métrica opcional; por defecto `classification.metric` o "euclidean".
+        """
+        metric = metric or config.get("classification", {}).get("metric", "euclidean")
+        return cls(config.get("plastic_spectra", {}), metric=metric)
+
+    @staticmethod
+    def _split_references(references):
+        """
+        Devuelve la lista de referencias individuales de un plástico (vacía si no tiene ninguna).
+        """
+        if not references:
+            return []
+        if isinstance(references, dict):
+            return [references]
+        if references and isinstance(references[0], (dict, list, tuple)):
+            return list(references)
+        return [references]
+
+    def _infer_bands(self, plastic_spectra):
+        """
+        Obtiene el orden de las bandas de la primera referencia tipo diccionario.
+        """
+        for references in plastic_spectra.values():
+            references = self._split_references(references)
+            if references:
+                return list(references[0].keys()) if isinstance(references[0], dict) else None
+        return None
+
+    def _to_vector(self, reading):
+        """
+        Convierte una lectura (diccionario o secuencia) en un vector ordenado por banda.
+        """
+        if isinstance(reading, dict):
+            if self.bands is None:
+                raise ValueError("[CLASSIFIER] La biblioteca no define bandas para lecturas tipo diccionario.")
+            return [reading[band] for band in self.bands]
+        return list(reading)
+
+    def _to_matrix(self, readings):
+        """
+        Convierte un lote de lecturas en una matriz (n_lecturas, n_canales).
+        """
+        matrix = np.asarray([self._to_vector(reading) for reading in readings], dtype=np.float64)
+        if matrix.ndim != 2 or matrix.shape[1] != self.references.shape[1]:
+            raise ValueError(f"[CLASSIFIER] Dimensión de lectura inválida: {matrix.shape}. "
+                             f"Se esperaban {self.references.shape[1]} canales.")
+        return matrix
+
+    def distances(self, readings):
+        """
+        Calcula la distancia de cada lectura a cada referencia en una sola operación.
+
+        :param readings: Lista de lecturas.
+        :return: Matriz (n_lecturas, n_referencias) de distancias.
+        """
+        matrix = self._to_matrix(readings)
+        dots = matrix @ self.references.T
+
+        if self.metric == "euclidean":
+            sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+            squared = sq_norms[:, None] + self._ref_sq_norms[None, :] - 2.0 * dots
+            return np.sqrt(np.maximum(squared, 0.0))
+
+        norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix))
+        denominator = norms[:, None] * self._ref_norms[None, :]
+        cosine = np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+        cosine = np.clip(cosine, -1.0, 1.0)
+        if self.metric == "cosine":
+            return 1.0 - cosine
+        return np.arccos(cosine)
+
+    def classify_batch(self, readings, top_k=1):
+        """
+        Clasifica un lote de lecturas.
+
+        :param readings: Lista de lecturas (diccionarios o secuencias).
+        :param top_k: Número de plásticos candidatos a devolver por lectura.
+        :return: Lista de resultados con `plastic`, `distance`, `margin`, `confidence` y `matches`.
+                 `confidence` es 1 - distancia / distancia del segundo plástico (0 = empate, 1 = sin ambigüedad).
+        """
+        if not readings:
+            return []
+
+        # Distancia mínima por plástico (las referencias de cada plástico son contiguas)
+        per_plastic = np.minimum.reduceat(self.distances(readings), self._group_starts, axis=1)
+        top_k = max(1, min(top_k, len(self.labels)))
+        order = np.argsort(per_plastic, axis=1, kind="stable")
+
+        results = []
+        for row, ranking in zip(per_plastic, order):
+            best = float(row[ranking[0]])
+            runner_up = float(row[ranking[1]]) if len(ranking) > 1 else float("inf")
+            results.append({
+                "plastic": self.labels[ranking[0]],
+                "distance": best,
+                "margin": runner_up - best,
+                "confidence": 1.0 - best / runner_up if runner_up > 0 else 0.0,
+                "matches": [(self.labels[i], float(row[i])) for i in ranking[:top_k]],
+            })
+        return results
+
+    def classify(self, reading, top_k=1):
+        """
+        Clasifica una sola lectura.
+
+        :param reading: Lectura del sensor (diccionario {banda: valor} o secuencia de canales).
+        :param top_k: Número de plásticos candidatos a devolver.
+        :return: Diccionario con `plastic`, `distance`, `margin`, `confidence` y `matches`.
+        """
+        return self.classify_batch([reading], top_k=top_k)[0]
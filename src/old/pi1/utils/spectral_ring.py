@@ -0,0 +1,166 @@
+# spectral_ring.py - Búfer circular en memoria compartida (mmap) con las lecturas espectrales recientes.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from utils.spectral_archive import CHANNELS, spectrum_values
+
+MAGIC = b"SPRB"
+VERSION = 1
+DEFAULT_PATH = "/dev/shm/pi1_spectra.ring"
+
+# Encabezado: magic, versión, tamaño de registro, capacidad, reservado, total de registros escritos
+HEADER = struct.Struct("<4sHHIIQ")
+HEADER_SIZE = 64                    # El índice de escritura queda en su propia línea de caché
+WRITE_INDEX_OFFSET = 16
+
+# Registro de tamaño fijo (96 bytes, alineado a 8)
+RECORD_DTYPE = np.dtype([
+    ("seq", "<u8"),                 # Versión del seqlock: impar mientras se escribe
+    ("timestamp", "<f8"),           # Segundos epoch
+    ("channel", "<u2"),             # Canal del MUX
+    ("status", "<u2"),              # 0 = lectura válida
+    ("reserved", "<u4"),
+    ("values", "<f4", CHANNELS),    # Valores calibrados (NaN si la lectura tiene menos canales)
+])
+
+
+class SpectralRingWriter:
+    """
+    Escritor único del búfer circular de espectros recientes.
+
+    El archivo (por defecto en /dev/shm, es decir, en RAM) contiene un encabezado y
+    `capacity` registros de tamaño fijo. Cada registro usa un seqlock: el escritor pone su
+    versión en impar, escribe los campos y la deja en par. Los lectores de otros procesos
+    copian los registros y descartan los que cambiaron de versión mientras los copiaban,
+    sin bloquear nunca al escritor.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, capacity=4096):
+        """
+        :param path: Ruta del archivo compartido.
+        :param capacity: Número de registros del búfer.
+        """
+        self.path = path
+        self.capacity = capacity
+        size = HEADER_SIZE + capacity * RECORD_DTYPE.itemsize
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, RECORD_DTYPE.itemsize, capacity, 0, 0)
+        self._records = np.ndarray(capacity, dtype=RECORD_DTYPE, buffer=self._mmap, offset=HEADER_SIZE)
+        self._records[:] = np.zeros(1, dtype=RECORD_DTYPE)
+        self._write_index = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Crea el búfer usando la sección `sensors.ring_buffer` de la configuración.
+        """
+        settings = config.get("sensors", {}).get("ring_buffer", {})
+        return cls(settings.get("path", DEFAULT_PATH), settings.get("capacity", 4096))
+
+    def write(self, channel, spectrum, timestamp=None, status=0):
+        """
+        Agrega una lectura al búfer, sobrescribiendo la más antigua si está lleno.
+
+        :param channel: Canal del MUX del sensor.
+        :param spectrum: Espectro en cualquiera de los formatos de `spectrum_values`.
+        :param timestamp: Segundos epoch (por defecto, ahora).
+        :param status: Código de estado de la lectura (0 = válida).
+        """
+        values = spectrum_values(spectrum)[:CHANNELS]
+        slot = self._write_index % self.capacity
+        record = self._records[slot]
+        seq = int(record["seq"])
+
+        record["seq"] = seq + 1                         # Impar: escritura en curso
+        record["timestamp"] = time.time() if timestamp is None else timestamp
+        record["channel"] = channel
+        record["status"] = status
+        record["values"] = np.nan
+        record["values"][:len(values)] = values
+        record["seq"] = seq + 2                         # Par: registro consistente
+
+        self._write_index += 1
+        struct.pack_into("<Q", self._mmap, WRITE_INDEX_OFFSET, self._write_index)
+
+    def close(self, remove=False):
+        """
+        Libera el mapeo y, opcionalmente, elimina el archivo compartido.
+        """
+        self._records = None
+        self._mmap.close()
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SpectralRingReader:
+    """
+    Lector sin bloqueo del búfer circular. Se puede usar desde cualquier proceso local.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        :param path: Ruta del archivo compartido creado por SpectralRingWriter.
+        """
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, capacity, _, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+            self._mmap.close()
+            raise ValueError(f"[RING] Formato de búfer no soportado en {path}.")
+        self.capacity = capacity
+        # Vista directa (sin copia) de los registros compartidos
+        self.records = np.ndarray(capacity, dtype=RECORD_DTYPE, buffer=self._mmap, offset=HEADER_SIZE)
+
+    def write_index(self):
+        """
+        Devuelve el total de registros escritos desde que se creó el búfer.
+        """
+        return struct.unpack_from("<Q", self._mmap, WRITE_INDEX_OFFSET)[0]
+
+    def latest(self, count=None):
+        """
+        Devuelve las `count` lecturas más recientes en orden cronológico.
+
+        Los registros se copian en un solo paso y luego se validan contra su versión
+        esperada: se descartan los que se estaban escribiendo o que el escritor sobrescribió
+        durante la copia.
+
+        :param count: Número de lecturas (por defecto, la capacidad completa).
+        :return: Arreglo estructurado de NumPy con los campos de RECORD_DTYPE.
+        """
+        end = self.write_index()
+        count = self.capacity if count is None else min(count, self.capacity)
+        start = max(0, end - count)
+        indices = np.arange(start, end, dtype=np.uint64)
+        slots = (indices % self.capacity).astype(np.intp)
+
+        snapshot = self.records[slots]                          # Copia
+        expected = (indices // self.capacity + 1) * 2           # Versión de la generación pedida
+        current = self.records["seq"][slots]
+        valid = (snapshot["seq"] == expected) & (current == expected)
+        return snapshot[valid]
+
+    def last(self):
+        """
+        Devuelve la lectura más reciente o None si el búfer está vacío.
+        """
+        records = self.latest(1)
+        return records[0] if len(records) else None
+
+    def close(self):
+        self.records = None
+        self._mmap.close()
@@ -130,6 +130,27 @@ def load_config(config_path="/home/raspberry-2/capstonepupr/src/pi2/config/pi2_c
     with open(config_path, "r") as file:
         return yaml.safe_load(file)
 
+def drain_queue(data_queue, max_batch=100, window=0.05):
+    """
+    Espera la primera lectura del buffer y agrupa las que lleguen dentro de `window` segundos.
+
+    :param data_queue: Buffer de lecturas.
+    :param max_batch: Número máximo de lecturas por lote.
+    :param window: Ventana de agrupación en segundos.
+    :return: Lista de lecturas.
+    """
+    batch = [data_queue.get()]
+    deadline = time.monotonic() + window
+    while len(batch) < max_batch:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(data_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
 def publish_data(mqtt_client, greengrass_manager, topic, data_queue):
     """
     Publica datos del buffer a MQTT y AWS IoT Core.
@@ -141,12 +162,14 @@ def publish_data(mqtt_client, greengrass_manager, topic, data_queue):
     """
     while True:
         try:
-            payload = data_queue.get()
-            mqtt_client.publish(topic, payload)
-            logging.info(f"Datos publicados en MQTT: {payload}")
-            
-            response = greengrass_manager.invoke_function(payload)
-            logging.info(f"Datos procesados por Greengrass: {response}")
+            batch = drain_queue(data_queue)
+            for payload in batch:
+                mqtt_client.publish(topic, payload)
+            logging.info(f"Datos publicados en MQTT: {len(batch)} lecturas")
+
+            # Una sola invocación asíncrona por lote en lugar de una invocación síncrona por lectura
+            accepted = greengrass_manager.invoke_batch(batch)
+            logging.info(f"Lote de {len(batch)} lecturas enviado a Greengrass: {accepted}")
 
         except Exception as e:
             logging.error(f"Error publicando datos: {e}")
@@ -234,20 +257,11 @@ def main():
     logging.info(f"Queue de datos inicializada con tamaño máximo: {config['data_queue']['max_size']}")
 
     # Iniciar hilo para publicar datos
-    def publish_data():
-        while True:
-            try:
-                payload = data_queue.get()
-                mqtt_client.publish(config['mqtt']['topics']['sensor_data'], payload)
-                logging.info(f"Datos publicados en MQTT: {payload}")
-                
-                response = greengrass_manager.invoke_function(payload)
-                logging.info(f"Datos procesados por Greengrass: {response}")
-
-            except Exception as e:
-                logging.error(f"Error publicando datos: {e}")
-    
-    publish_thread = Thread(target=publish_data,daemon=True)
+    publish_thread = Thread(
+        target=publish_data,
+        args=(mqtt_client, greengrass_manager, config['mqtt']['topics']['sensor_data'], data_queue),
+        daemon=True
+    )
     publish_thread.start()
 
     # Ciclo principal
@@ -1,4 +1,5 @@
 import boto3
+import json
 import logging
 
 class GreengrassManager:
@@ -33,9 +34,48 @@ class GreengrassManager:
         try:
             response = self.client.invoke(
                 FunctionName=self.config['greengrass']['functions'][0]['name'],
-                Payload=str(payload).encode('utf-8')
+                Payload=json.dumps(payload, default=str).encode('utf-8')
             )
             return response['Payload'].read().decode('utf-8')
         except Exception as e:
             logging.error(f"Error al invocar función de Greengrass: {e}")
             return None
+
+    def _invoke_event(self, function_name, body):
+        """
+        Invoca una función de forma asíncrona (Event) sin esperar su respuesta.
+
+        :return: True si Lambda aceptó la invocación.
+        """
+        response = self.client.invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=json.dumps(body, default=str).encode('utf-8')
+        )
+        response['Payload'].read()
+        return response.get('StatusCode') == 202
+
+    def invoke_batch(self, payloads, function_name=None):
+        """
+        Envía varias lecturas con invocaciones asíncronas (Event) sin esperar la respuesta.
+
+        Solo las funciones que declaran `batch: true` en `greengrass.functions` reciben el lote
+        en una sola invocación como {"batch": [...]}; las demás reciben una invocación por
+        lectura con el mismo payload que `invoke_function`.
+
+        :param payloads: Lista de lecturas.
+        :param function_name: Nombre de la función (por defecto, la primera configurada).
+        :return: True si Lambda aceptó todas las invocaciones.
+        """
+        functions = self.config['greengrass']['functions']
+        function = next((entry for entry in functions if entry['name'] == function_name), None) if function_name else functions[0]
+        if function is None:
+            logging.error(f"Función de Greengrass no configurada: {function_name}")
+            return False
+        try:
+            if function.get('batch', False):
+                return self._invoke_event(function['name'], {"batch": payloads})
+            return all([self._invoke_event(function['name'], payload) for payload in payloads])
+        except Exception as e:
+            logging.error(f"Error al invocar función de Greengrass con {len(payloads)} lecturas: {e}")
+            return False
@@ -3,17 +3,23 @@
 # Copyright (c) 2024
 # Proyecto: Smart Recycling Bin
 
+import asyncio
 import sys
 import os
 import time
-import json
 import random
+import uuid
 import logging
 from datetime import datetime
 from modules.network_manager import NetworkManager
 from modules.real_time_config import RealTimeConfigManager
 from modules.config_manager import ConfigManager
 from modules.mqtt_handler import MQTTHandler
+from modules.metrics import MetricsRegistry
+from modules import trace_context
+from modules.logging_manager import StructuredLogger
+from modules.conveyor_tracker import ConveyorTracker
+from modules.async_runtime import AsyncRuntime, AsyncMQTTAdapter
 
 def setup_logger():
     logging.basicConfig(
@@ -25,44 +31,115 @@ def setup_logger():
 def calculate_delay(distance, conveyor_speed):
     return round(distance / conveyor_speed, 2)
 
-def on_message_received(client, userdata, msg):
+# Registro estructurado para el callback MQTT (se formatea solo si el nivel está habilitado)
+hot_log = StructuredLogger(logging.getLogger("MAIN PI-1"))
+
+def on_message_received(topic, payload):
     """
-    Procesa mensajes MQTT en Raspberry 1.
+    Procesa mensajes MQTT en Raspberry 1 (en el bucle de eventos; no debe bloquear).
     """
     try:
-        payload = json.loads(msg.payload.decode())
-
         # Extraer datos del mensaje
         event_id = payload.get("id", "Sin ID")
         timestamp = payload.get("timestamp", "Sin Timestamp")
         material = payload.get("material", "Desconocido")
 
         # Log del evento recibido
-        logger.info(f"[RPI1] Evento recibido | ID: {event_id} | Material: {material} | Timestamp: {timestamp}")
+        hot_log.debug("rpi1.event", sample=10, id=event_id, material=material, timestamp=timestamp)
 
         # Realizar acciones adicionales si aplica
         # Ejemplo: validar el material
         if material not in ["PET", "HDPE"]:
-            logger.warning(f"[RPI1] Material desconocido: {material}. ID Evento: {event_id}")
-        else:
-            logger.info(f"[RPI1] Material válido: {material}. ID Evento: {event_id}")
+            hot_log.warning("rpi1.material.unknown", every=10, id=event_id, material=material)
 
-    except json.JSONDecodeError as e:
-        logger.error(f"[RPI1] Error decodificando JSON: {e}")
     except Exception as e:
-        logger.error(f"[RPI1] Error procesando mensaje: {e}")
+        hot_log.error("rpi1.message_error", every=10, error=e)
+
+
+async def run(runtime, config_manager, logger):
+    """
+    Tareas de Raspberry Pi 1 en el bucle de eventos: configuración, red, MQTT y cinta.
+    """
+    real_time_config = RealTimeConfigManager(config_manager)
+    real_time_config.start_monitoring(runtime.loop)
+    runtime.on_shutdown(real_time_config.stop_monitoring)
+
+    # Obtener configuración
+    config = real_time_config.get_config()
+    if not config_manager.validate_section("mqtt"):
+        raise ValueError("Error: La sección MQTT no está configurada en el archivo de configuración.")
+
+    # Configuración de red
+    logger.info("Iniciando monitoreo de red...")
+    network_manager = NetworkManager(config_manager)
+    runtime.spawn(network_manager.monitor_async(runtime), "network_monitor")
+
+    # Inicializa MQTTHandler sobre el bucle de eventos
+    mqtt_handler = MQTTHandler(config_manager)
+    metrics = MetricsRegistry.default()
+    metrics.start_exporters(config_manager, mqtt_handler)
+    runtime.on_shutdown(metrics.stop_exporters)
+    evaluation_time_ms = metrics.histogram("spectrum_evaluation_ms", "Tiempo desde la llegada al sensor hasta la publicación")
+    mqtt = AsyncMQTTAdapter(mqtt_handler, runtime)
+    for topic in mqtt_handler.topics.values():
+        mqtt.subscribe(topic, on_message_received)
+    await mqtt.start()
+    logger.info("Esperando mensajes MQTT de Raspberry 3...")
+
+    # Cálculo de delay y simulación de detección
+    distance_to_sensor = config["system"].get("distance_to_sensor", 24)  # en pulgadas
+    conveyor_speed = config["system"].get("conveyor_speed", 100)  # en pulgadas por segundo
+    evaluation_time_min = 0.1
+    evaluation_time_max = 1.0
+
+    detection_interval = config.get("execution", {}).get("material_detection_interval", 2.0)
+
+    # Rastreador de la cinta: cada material se programa contra su propia línea de tiempo (temporizadores del bucle)
+    conveyor_tracker = ConveyorTracker(config_manager, conveyor_speed=conveyor_speed)
+    conveyor_tracker.start(runtime.loop)
+    runtime.on_shutdown(conveyor_tracker.stop)
+    delay_to_sensor = calculate_delay(distance_to_sensor, conveyor_speed)
+    logger.info(f"[PI-1] Tiempo estimado para llegada al sensor: {delay_to_sensor} segundos")
+
+    def publish_evaluation(event_id, started, arrival):
+        # Publica el material evaluado a Raspberry Pi 2
+        material = random.choice(["PET", "HDPE", "UNKNOWN"])
+        evaluation_time_ms.observe((time.perf_counter() - started) * 1000)
+        metrics.counter("materials_classified_total", "Materiales clasificados", {"material": material}).inc()
+        payload = {
+            "id": event_id,
+            "timestamp": datetime.now().isoformat(),
+            "material": material,
+            "trace": [arrival],     # El id del evento es el id de la traza
+        }
+        trace_context.add_hop(payload, "pi1.classified")
+        hot_log.info("rpi1.material.evaluated", id=event_id, material=material)
+        mqtt_handler.publish("material/entrada", payload)
+        # Sin el payload completo: el campo `trace` crece con cada salto y el repr cuesta en cada material
+        hot_log.debug("rpi1.event.published", sample=10, id=event_id, topic="material/entrada")
+
+    def evaluate_material(event_id):
+        # Simula la evaluación del material sin bloquear a los demás materiales en la cinta
+        evaluation_time = round(random.uniform(evaluation_time_min, evaluation_time_max), 2)
+        hot_log.debug("rpi1.material.evaluating", sample=10, id=event_id, seconds=evaluation_time)
+        conveyor_tracker.schedule_in(evaluation_time, publish_evaluation, event_id, time.perf_counter(),
+                                     trace_context.hop("pi1.sensor"), event_id=event_id, label="publish")
+
+    while True:
+        # Simula la entrada de un material a la cinta; su llegada al sensor se programa en el rastreador
+        event_id = str(uuid.uuid4())
+        conveyor_tracker.track_item(event_id, "UNKNOWN")
+        conveyor_tracker.schedule_at_distance(event_id, distance_to_sensor, evaluate_material, event_id, label="sensor")
+        await asyncio.sleep(detection_interval)
 
 
 def main():
     logger = setup_logger()
-    network_manager = None  # Inicialización para evitar errores de referencia
-    mqtt_handler = None     # Inicialización para evitar errores de referencia
+    logger.info("=" * 70)
+    logger.info("Iniciando sistema de detección de materiales en Raspberry Pi 1")
+    logger.info("=" * 70)
 
     try:
-        logger.info("=" * 70)
-        logger.info("Iniciando sistema de detección de materiales en Raspberry Pi 1")
-        logger.info("=" * 70)
-
         # Configuración del sistema
         try:
             config_manager = ConfigManager(config_path="/home/raspberry-1/capstonepupr/src/tst/configs/pi1_config.yaml")
@@ -70,92 +147,18 @@ def main():
         except Exception as e:
             logger.error(f"Error inicializando ConfigManager: {e}")
             raise
-        
+
         # Limpiar caché antes de iniciar
         logger.info("Limpiando caché de configuraciones...")
         config_manager.clear_cache()
-        time.sleep(0.5)
-
-        real_time_config = RealTimeConfigManager(config_manager)
-        real_time_config.start_monitoring()
-
-        # Obtener configuración
-        config = real_time_config.get_config()
-        if not config_manager.validate_section("mqtt"):
-            raise ValueError("Error: La sección MQTT no está configurada en el archivo de configuración.")
-
-
-        # Configuración de red
-        logger.info("Iniciando monitoreo de red...")
-        network_manager = NetworkManager(config)
-        network_manager.start_monitoring()
-
-        # Inicializa MQTTHandler
-        mqtt_handler = MQTTHandler(config_manager)
-        mqtt_handler.client.on_message = on_message_received
-        mqtt_handler.connect_and_subscribe()
-        logger.info("Esperando mensajes MQTT de Raspberry 3...")
-        mqtt_handler.client.loop_forever()
-
-        # Cálculo de delay y simulación de detección
-        distance_to_sensor = config["system"].get("distance_to_sensor", 24)  # en pulgadas
-        conveyor_speed = config["system"].get("conveyor_speed", 100)  # en pulgadas por segundo
-        evaluation_time_min = 0.1
-        evaluation_time_max = 1.0
-
-        while True:
-            # Simula el tiempo de llegada del material al sensor
-            delay_to_sensor = calculate_delay(distance_to_sensor, conveyor_speed)
-            logger.info(f"[PI-1] Tiempo estimado para llegada al sensor: {delay_to_sensor} segundos")
-            time.sleep(delay_to_sensor)
-
-            # Simula la evaluación del material
-            evaluation_time = round(random.uniform(evaluation_time_min, evaluation_time_max), 2)
-            logger.info(f"[PI-1] Evaluando material durante {evaluation_time} segundos")
-            time.sleep(evaluation_time)
-
-            # Publica el material evaluado a Raspberry Pi 2
-            event_id = str(uuid.uuid4())
-            timestamp = datetime.now().isoformat()
-            material = random.choice(["PET", "HDPE", "UNKNOWN"])
-
-            payload = {
-                "id": event_id,
-                "timestamp": timestamp,
-                "material": material,
-            }
-
-            logger.info(f"[PI-1] Material evaluado: {material} | ID Evento: {event_id}")
-            mqtt_handler.publish("material/entrada", payload)
-            logger.info(f"[PI-1] Evento publicado en MQTT: {payload}")
-
-    except KeyboardInterrupt:
-        logger.info("Interrupción detectada. Apagando sistema...")
-        if network_manager:
-            logger.info("Apagando Monitoreo del Network...")
-            network_manager.stop_monitoring()
-            logger.info("Sistema apagado correctamente.") 
-        if mqtt_handler.is_connected():
-            logger.info("Desconectando cliente MQTT...")
-            mqtt_handler.disconnect()
-            logger.info("Cliente MQTT desconectado.")       
-        
+
+        # Un solo bucle de eventos ejecuta MQTT, la cinta y los monitores; Ctrl+C/SIGTERM lo apagan en orden
+        AsyncRuntime(config_manager).run(run, config_manager, logger)
     except Exception as e:
         logger.error(f"Error crítico en la ejecución: {e}")
     finally:
-        if network_manager.is_monitoring():
-            network_manager.stop_monitoring()
-        if mqtt_handler.is_connected():
-            logger.info("Desconectando cliente MQTT...")
-            mqtt_handler.disconnect()
-            logger.info("Cliente MQTT desconectado.")
-        if real_time_config.is_monitoring():
-            logger.info("Deteniendo monitoreo de configuración...")
-            real_time_config.stop_monitoring()
-            logger.info("Monitoreo de configuración detenido.")
         logger.info("Proceso finalizado.")
         sys.exit(0)
 
 if __name__ == "__main__":
     main()
-
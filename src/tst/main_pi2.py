@@ -3,16 +3,21 @@
 # Copyright (c) 2024
 # Proyecto: Smart Recycling Bin
 
-import json
+import functools
 import logging
+import sys
 import time
 import random
 from modules.config_manager import ConfigManager
 from modules.real_time_config import RealTimeConfigManager
 from modules.network_manager import NetworkManager
 from modules.mqtt_handler import MQTTHandler
+from modules.metrics import MetricsRegistry
+from modules.trace_context import add_hop, continue_trace
 from modules.logging_manager import LoggingManager
-from raspberry_pi.pi2.sim.relay_controller import RelayController # Cambiar a la línea de abajo para usar el controlador real
+from modules.conveyor_tracker import ConveyorTracker
+from modules.async_runtime import AsyncRuntime, AsyncMQTTAdapter
+from raspberry_pi.pi2.sim.relay_controller_v2 import RelayController  # Pulsos programados con ActuationScheduler (no bloquea)
 
 def setup_logger():
     logging.basicConfig(
@@ -32,27 +37,51 @@ def calculate_delay(distance, conveyor_speed):
     """
     return round(distance / conveyor_speed, 2)
 
-def activate_relays(client, userdata, msg, relay_controller):
-    payload = json.loads(msg.payload.decode())
+def activate_relays(topic, payload, relay_controller, mqtt_handler):
+    """
+    Acción manual de válvula (`valvula/accion`). Solo programa el pulso en el planificador del
+    controlador de relés, por lo que se atiende directamente en el bucle de eventos.
+    """
     event_id = payload.get("id", "Sin ID")
     category = payload.get("category", "Desconocido")
     activation_time = payload.get("activation_time", 1.0)
 
-    relay_config = next((relay for relay in config["mux"]["relays"] if relay["category"] == category), None)
-    if relay_config:
-        relay_index = relay_config["mux_channel"]
-        relay_controller.activate_relay(relay_index, activation_time)
+    settings = config_manager.snapshot()
+    # El controlador identifica cada relé por su posición en `mux.relays` (`category` o `assigned_material`)
+    relay_index = next((index for index, relay in enumerate(settings.get("mux.relays", []))
+                        if relay.get("category", relay.get("assigned_material")) == category), None)
+    if relay_index is not None:
+        relay_controller.activate_relay(relay_index, activation_time, event_id=event_id)
         logger.info(f"[PI2] Relay {relay_index} activado para categoría {category} por {activation_time} segundos.")
         
         # Publicar mensaje de material procesado
-        processed_payload = {"id": event_id, "material": category}
+        processed_payload = continue_trace(payload, {"material": category}, "pi2.valve")
         mqtt_handler.publish("material/procesado", processed_payload)
     else:
         logger.warning(f"[PI2] Categoría no encontrada: {category}. ID Evento: {event_id}")
 
-def on_message_received(client, userdata, msg, relay_controller):
+def log_status(topic, payload):
+    """
+    Registra mensajes de estado de válvulas y alertas.
+    """
+    logger.info(f"[PI2] {topic}: {payload}")
+
+def fire_valve(relay_controller, relay_index, activation_time, event, mqtt_handler=None):
+    """
+    Activa la válvula de un material y publica `material/procesado` conservando su traza.
+    """
+    processed_payload = continue_trace(event, {"material": event.get("material")}, "pi2.valve")
+    relay_controller.activate_relay(relay_index, activation_time, event_id=event.get("id"))
+    if mqtt_handler:
+        mqtt_handler.publish("material/procesado", processed_payload)
+
+def on_message_received(topic, payload, relay_controller, conveyor_tracker=None, mqtt_handler=None):
+    """
+    Procesa un evento de material en el bucle de eventos. La activación del relé solo
+    programa el pulso (ActuationScheduler maneja el I2C en su propio hilo), sin bloquear el bucle.
+    """
     try:
-        payload = json.loads(msg.payload.decode())
+        add_hop(payload, "pi2.recv")
 
         event_id = payload.get("id", "Sin ID")
         timestamp = payload.get("timestamp", "Sin Timestamp")
@@ -60,31 +89,96 @@ def on_message_received(client, userdata, msg, relay_controller):
 
         logger.info(f"[PI2] Evento recibido | ID: {event_id} | Material: {material} | Timestamp: {timestamp}")
 
-        activation_time_min = config["mux"].get("activation_time_min", 0.5)
-        activation_time_max = config["mux"].get("activation_time_max", 3.0)
+        # Instantánea de la configuración: búsquedas O(1) sin logs en la ruta crítica
+        settings = config_manager.snapshot()
+        activation_time_min = settings.get("mux.activation_time_min", 0.5)
+        activation_time_max = settings.get("mux.activation_time_max", 3.0)
         activation_time = round(random.uniform(activation_time_min, activation_time_max), 2)
 
         if material in ["PET", "HDPE"]:
             relay_index = 0 if material == "PET" else 1
-            relay_controller.activate_relay(relay_index, activation_time)
-            logger.info(f"[PI2] Relay {relay_index} activado para {material} por {activation_time} segundos. ID Evento: {event_id}")
+            if conveyor_tracker:
+                # Programar la válvula contra la línea de tiempo de la cinta en lugar de bloquear el callback
+                distance_key = "delays.sensor_to_valve_1" if relay_index == 0 else "delays.sensor_to_valve_2"
+                distance = settings.get(distance_key, 0)
+                conveyor_tracker.track_item(event_id, material)
+                conveyor_tracker.schedule_at_distance(
+                    event_id, distance, fire_valve, relay_controller, relay_index, activation_time, payload, mqtt_handler,
+                    label=f"valve_{relay_index + 1}"
+                )
+                logger.info(f"[PI2] Relay {relay_index} programado para {material} a {distance} m ({activation_time} segundos). ID Evento: {event_id}")
+            else:
+                fire_valve(relay_controller, relay_index, activation_time, payload, mqtt_handler)
+                logger.info(f"[PI2] Relay {relay_index} activado para {material} por {activation_time} segundos. ID Evento: {event_id}")
         else:
             logger.warning(f"[PI2] Material desconocido: {material}. ID Evento: {event_id}")
 
-    except json.JSONDecodeError as e:
-        logger.error(f"[PI2] Error decodificando JSON: {e}")
     except Exception as e:
         logger.error(f"[PI2] Error procesando mensaje: {e}")
 
+async def run(runtime):
+    """
+    Tareas de Raspberry Pi 2 en el bucle de eventos: configuración, red, MQTT y válvulas.
+    """
+    global config
+    real_time_config = RealTimeConfigManager(config_manager)
+    real_time_config.start_monitoring(runtime.loop)
+    runtime.on_shutdown(real_time_config.stop_monitoring)
+    config = real_time_config.get_config()
+    if not config_manager.validate_section("mqtt"):
+        raise ValueError("Error: La sección MQTT no está configurada en el archivo de configuración.")
+
+    logger.info("Iniciando monitoreo de red...")
+    network_manager = NetworkManager(config_manager)
+    runtime.spawn(network_manager.monitor_async(runtime), "network_monitor")
+
+    conveyor_speed = config["system"].get("conveyor_speed", 100)
+    distances = config.get("delays", {})
+
+    delay_sensor_to_valve_1 = calculate_delay(distances.get("sensor_to_valve_1", 0), conveyor_speed)
+    delay_sensor_to_valve_2 = calculate_delay(distances.get("sensor_to_valve_2", 0), conveyor_speed)
+
+    logger.info(f"[PI2] Delay sensor a válvula 1: {delay_sensor_to_valve_1} segundos")
+    logger.info(f"[PI2] Delay sensor a válvula 2: {delay_sensor_to_valve_2} segundos")
+
+    logger.info("[PI2] Configurando controlador de relay...")
+    relay_controller = RelayController(config_manager)
+    runtime.on_shutdown(relay_controller.shutdown)     # Apaga los relés que queden energizados
+
+    # Rastreador de la cinta: varias piezas pueden viajar hacia las válvulas a la vez (temporizadores del bucle)
+    conveyor_tracker = ConveyorTracker(config_manager, conveyor_speed=conveyor_speed)
+    conveyor_tracker.start(runtime.loop)
+    runtime.on_shutdown(conveyor_tracker.stop)
+
+    # Inicializa MQTTHandler sobre el bucle de eventos
+    mqtt_handler = MQTTHandler(config_manager)
+    MetricsRegistry.default().start_exporters(config_manager, mqtt_handler)
+    runtime.on_shutdown(MetricsRegistry.default().stop_exporters)
+    mqtt = AsyncMQTTAdapter(mqtt_handler, runtime)
+    topics = mqtt_handler.topics
+    # Eventos de detección: solo programan la válvula, se atienden en el bucle
+    mqtt.subscribe(topics.get("detection", "material/deteccion"), functools.partial(
+        on_message_received, relay_controller=relay_controller,
+        conveyor_tracker=conveyor_tracker, mqtt_handler=mqtt_handler))
+    # Acciones manuales: también solo programan el pulso
+    mqtt.subscribe(topics.get("action", "valvula/accion"), functools.partial(
+        activate_relays, relay_controller=relay_controller, mqtt_handler=mqtt_handler))
+    for key in ("status", "alertas"):
+        if key in topics:
+            mqtt.subscribe(topics[key], log_status)
+    await mqtt.start()
+    logger.info("Esperando mensajes MQTT de Raspberry 1...")
+    await runtime.wait_stopped()
+
+
 def main():
+    global config_manager, logger
     logger = setup_logger()
-    network_manager = None
-    mqtt_handler = None
-    try:
-        logger.info("=" * 70)
-        logger.info("Iniciando sistema de control de Relay en Raspberry Pi 2")
-        logger.info("=" * 70)
+    logger.info("=" * 70)
+    logger.info("Iniciando sistema de control de Relay en Raspberry Pi 2")
+    logger.info("=" * 70)
 
+    try:
         # Configuración del sistema
         try:
             config_manager = ConfigManager(config_path="/home/raspberry-2/capstonepupr/src/tst/configs/pi2_config.yaml")
@@ -96,61 +190,11 @@ def main():
         logger.info("Limpiando caché de configuraciones...")
         config_manager.clear_cache()
 
-        real_time_config = RealTimeConfigManager(config_manager)
-        real_time_config.start_monitoring()
-        global config
-        config = real_time_config.get_config()
-        if not config_manager.validate_section("mqtt"):
-            raise ValueError("Error: La sección MQTT no está configurada en el archivo de configuración.")
-
-
-        logger.info("Iniciando monitoreo de red...")
-        network_manager = NetworkManager(config)
-        network_manager.start_monitoring()
-
-        conveyor_speed = config["system"].get("conveyor_speed", 100)
-        distances = config.get("delays", {})
-
-        delay_sensor_to_valve_1 = calculate_delay(distances.get("sensor_to_valve_1", 0), conveyor_speed)
-        delay_sensor_to_valve_2 = calculate_delay(distances.get("sensor_to_valve_2", 0), conveyor_speed)
-
-        logger.info(f"[PI2] Delay sensor a válvula 1: {delay_sensor_to_valve_1} segundos")
-        logger.info(f"[PI2] Delay sensor a válvula 2: {delay_sensor_to_valve_2} segundos")
-
-        logger.info("[PI2] Configurando controlador de relay...")
-        relay_controller = RelayController(config["mux"]["relays"])
-
-        # Inicializa MQTTHandler
-        mqtt_handler = MQTTHandler(config_manager)
-        mqtt_handler.client.on_message = lambda client, userdata, msg: on_message_received(client, userdata, msg, relay_controller)
-        mqtt_handler.connect_and_subscribe()
-        logger.info("Esperando mensajes MQTT de Raspberry 1...")
-        mqtt_handler.client.loop_forever()
-
-    except KeyboardInterrupt:
-        logger.info("Interrupción detectada. Apagando sistema...")
-        if network_manager:
-            logger.info("Apagando Monitoreo del Network...")
-            network_manager.stop_monitoring()
-            logger.info("Sistema apagado correctamente.") 
-        if mqtt_handler.is_connected():
-            logger.info("Desconectando cliente MQTT...")
-            mqtt_handler.disconnect()
-            logger.info("Cliente MQTT desconectado.")       
-        
+        # Un solo bucle de eventos ejecuta MQTT, las válvulas y los monitores; Ctrl+C/SIGTERM lo apagan en orden
+        AsyncRuntime(config_manager).run(run)
     except Exception as e:
         logger.error(f"Error crítico en la ejecución: {e}")
     finally:
-        if network_manager:
-            network_manager.stop_monitoring()
-        if mqtt_handler.is_connected():
-            logger.info("Desconectando cliente MQTT...")
-            mqtt_handler.disconnect()
-            logger.info("Cliente MQTT desconectado.")
-        if real_time_config():
-            logger.info("Deteniendo monitoreo de configuración...")
-            real_time_config.stop_monitoring()
-            logger.info("Monitoreo de configuración detenido.")
         logger.info("Proceso finalizado.")
         sys.exit(0)
 
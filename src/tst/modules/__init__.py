@@ -21,6 +21,7 @@ from .alert_manager import AlertManager
 from .logging_manager import LoggingManager
 from .greengrass import GreengrassManager
 from .json_manager import JSONManager
+from .conveyor_tracker import ConveyorTracker
 
 __all__ = [
     "MQTTHandler",
@@ -31,5 +32,6 @@ __all__ = [
     "FunctionMonitor",
     "GreengrassManager",
     "JSONManager",
-    "LoggingManager"
+    "LoggingManager",
+    "ConveyorTracker"
 ]
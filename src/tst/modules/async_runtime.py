@@ -0,0 +1,461 @@
+# async_runtime.py - Núcleo asyncio de las Raspberry Pi: bucle de eventos, temporizadores, ejecutor acotado y adaptador MQTT.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+"""
+Un solo bucle de eventos ejecuta todas las tareas de una Raspberry Pi:
+
+- MQTT: el socket de paho se registra en el bucle (`add_reader`/`add_writer`) mediante sus
+  callbacks de socket, por lo que no hay hilo `loop_start`/`loop_forever`.
+- Temporizadores de la cinta y de las válvulas: ConveyorTracker arma un solo temporizador
+  del bucle para la acción más próxima en lugar de usar su propio hilo.
+- Monitoreo de red y de configuración: tareas del bucle; las verificaciones bloqueantes
+  (ping, lectura del YAML) se ejecutan en el ejecutor acotado.
+- Operaciones bloqueantes (I2C, relés, subprocesos) se envían al ejecutor con
+  `run_blocking`/`submit`; un semáforo limita cuántas pueden estar en espera.
+
+Las funciones síncronas registradas como callbacks se ejecutan en el hilo del bucle y no
+deben bloquear; la métrica `runtime_loop_lag_ms` mide el retraso del bucle.
+"""
+
+import asyncio
+import functools
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.logging_manager import LoggingManager
+from modules.metrics import MetricsRegistry
+from modules.topic_router import INLINE
+from modules.wire_codec import decode_payload, CodecError
+
+
+class AsyncRuntime:
+    """
+    Bucle de eventos de una Raspberry Pi con tareas supervisadas y un ejecutor acotado.
+    """
+
+    def __init__(self, config_manager):
+        """
+        :param config_manager: Instancia de ConfigManager (sección `runtime`).
+        """
+        self.config_manager = config_manager
+        self.logger = LoggingManager(config_manager).setup_logger("[ASYNC_RUNTIME]")
+        self.executor_workers = config_manager.get("runtime.executor_workers", 2)
+        self.executor_queue = config_manager.get("runtime.executor_queue", 32)
+        self.lag_interval = config_manager.get("runtime.lag_check_interval", 0.5)
+        self.shutdown_timeout = config_manager.get("runtime.shutdown_timeout", 5.0)
+
+        self.loop = None
+        self._thread_id = None
+        self._executor = None
+        self._slots = None
+        self._stopping = None
+        self._tasks = set()
+        self._cleanups = []
+        self.loop_lag = MetricsRegistry.default().histogram("runtime_loop_lag_ms", "Retraso del bucle de eventos (ms)")
+
+    # --- Ciclo de vida -------------------------------------------------------------------
+
+    def run(self, main, *args):
+        """
+        Ejecuta `main(runtime, *args)` en un bucle nuevo hasta que termine, se llame a
+        `stop()` o llegue SIGINT/SIGTERM. Después ejecuta las funciones de `on_shutdown`.
+        Un `main` que solo registra tareas y callbacks debe terminar con `await runtime.wait_stopped()`.
+
+        :param main: Función async que recibe el runtime como primer argumento.
+        """
+        asyncio.run(self._run(main, *args))
+
+    async def _run(self, main, *args):
+        self.loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._executor = ThreadPoolExecutor(self.executor_workers, thread_name_prefix="blocking")
+        self.loop.set_default_executor(self._executor)
+        self._slots = asyncio.Semaphore(self.executor_queue)
+        self._stopping = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(signum, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass    # Fuera del hilo principal o en plataformas sin señales
+
+        self.spawn(self._watch_lag(), "loop_lag")
+        main_task = self.spawn(main(self, *args), "main")
+        main_task.add_done_callback(lambda _: self.stop())
+        try:
+            await self._stopping.wait()
+        finally:
+            await self._shutdown()
+
+    def stop(self):
+        """
+        Solicita el apagado ordenado. Se puede llamar desde cualquier hilo.
+        """
+        if self.loop is None or self._stopping is None:
+            return
+        self.call_soon(self._stopping.set)
+
+    async def wait_stopped(self):
+        """
+        Espera hasta que se solicite el apagado (para `main` que solo prepara tareas y callbacks).
+        """
+        await self._stopping.wait()
+
+    def on_shutdown(self, callback, *args):
+        """
+        Registra una función (síncrona o async) a ejecutar al apagar, en orden inverso al registro.
+        """
+        self._cleanups.append((callback, args))
+
+    async def _shutdown(self):
+        self.logger.info("Apagando runtime...")
+        current = asyncio.current_task()
+        tasks = [task for task in self._tasks if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for callback, args in reversed(self._cleanups):
+            try:
+                result = callback(*args)
+                if asyncio.iscoroutine(result):
+                    await asyncio.wait_for(result, self.shutdown_timeout)
+            except Exception as e:
+                self.logger.error(f"Error al apagar {getattr(callback, '__qualname__', callback)}: {e}")
+        self._cleanups.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.logger.info("Runtime detenido.")
+
+    # --- Tareas y temporizadores ---------------------------------------------------------
+
+    def in_loop(self):
+        """
+        Indica si el hilo actual es el del bucle de eventos.
+        """
+        return threading.get_ident() == self._thread_id
+
+    def call_soon(self, callback, *args):
+        """
+        Ejecuta `callback(*args)` en el hilo del bucle. Se puede llamar desde cualquier hilo.
+        """
+        if self.in_loop():
+            return self.loop.call_soon(callback, *args)
+        return self.loop.call_soon_threadsafe(callback, *args)
+
+    def spawn(self, coroutine, name=None):
+        """
+        Crea una tarea supervisada: sus excepciones se registran y se cancela al apagar.
+        """
+        task = self.loop.create_task(coroutine, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(f"La tarea {task.get_name()} terminó con error: {task.exception()!r}")
+
+    def call_at(self, deadline, callback, *args):
+        """
+        Programa `callback(*args)` en un instante de `time.monotonic()` (en el hilo del bucle).
+
+        :return: asyncio.TimerHandle (se puede cancelar).
+        """
+        return self.loop.call_later(max(0.0, deadline - time.monotonic()), callback, *args)
+
+    def every(self, interval, callback, *args, name=None, blocking=False):
+        """
+        Ejecuta `callback(*args)` cada `interval` segundos (el intervalo se mide desde el inicio
+        de cada ejecución para no acumular deriva).
+
+        :param callback: Función síncrona o async.
+        :param blocking: Si es True la función síncrona se ejecuta en el ejecutor acotado.
+        :return: La tarea periódica.
+        """
+        async def periodic():
+            next_run = time.monotonic()
+            while True:
+                try:
+                    if blocking:
+                        await self.run_blocking(callback, *args)
+                    else:
+                        result = callback(*args)
+                        if asyncio.iscoroutine(result):
+                            await result
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.logger.error(f"Error en la tarea periódica {name or callback}: {e}")
+                next_run = max(next_run + interval, time.monotonic())
+                await asyncio.sleep(next_run - time.monotonic())
+        return self.spawn(periodic(), name)
+
+    async def run_blocking(self, function, *args, **kwargs):
+        """
+        Ejecuta una función bloqueante en el ejecutor acotado y espera su resultado.
+        Si hay `runtime.executor_queue` operaciones en espera, la llamada espera su turno
+        en lugar de acumular trabajo sin límite.
+        """
+        async with self._slots:
+            return await self.loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+    def submit(self, function, *args):
+        """
+        Envía una función bloqueante al ejecutor sin esperar su resultado (p. ej. activar un relé
+        desde un temporizador). Se puede llamar desde cualquier hilo.
+        """
+        self.call_soon(lambda: self.spawn(self.run_blocking(function, *args), getattr(function, "__name__", None)))
+
+    async def _watch_lag(self):
+        """
+        Mide cuánto se retrasa el bucle respecto a una espera programada.
+        """
+        while True:
+            start = self.loop.time()
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag.observe(max(0.0, self.loop.time() - start - self.lag_interval) * 1000)
+
+
+class AsyncMQTTAdapter:
+    """
+    Conecta el cliente paho de un MQTTHandler al bucle de eventos del runtime.
+
+    paho notifica la apertura y el cierre del socket y cuándo tiene datos por escribir; el
+    adaptador registra el socket en el bucle y llama a `loop_read`/`loop_write` cuando está
+    listo, y a `loop_misc` (keepalive) una vez por segundo. La publicación sigue pasando por
+    la cola de MQTTHandler; sus escrituras llegan al bucle con `call_soon_threadsafe`.
+
+    La conexión usa el conjunto de brokers del manejador: conecta al broker sano más rápido,
+    mantiene una conexión de reserva al siguiente y, al perder la principal, la reemplaza por
+    la de reserva desde el mismo callback de desconexión.
+    """
+
+    def __init__(self, mqtt_handler, runtime):
+        """
+        :param mqtt_handler: Instancia de MQTTHandler (aún sin conectar).
+        :param runtime: Instancia de AsyncRuntime ya en ejecución.
+        """
+        self.handler = mqtt_handler
+        self.runtime = runtime
+        self.logger = mqtt_handler.logger
+        self.connect_timeout = mqtt_handler.config_manager.get("runtime.mqtt_connect_timeout", 10.0)
+
+        self._connected = None
+        self._closing = False
+        self._reconnect_task = None
+
+    @property
+    def client(self):
+        return self.handler.client
+
+    async def start(self):
+        """
+        Registra los callbacks de socket, conecta al broker sano más rápido e inicia el
+        keepalive y la supervisión de los brokers.
+        """
+        self._connected = asyncio.Event()
+        self.handler.auto_reconnect = False     # El adaptador reconecta desde el bucle
+        self._attach(self.client)
+
+        await self.handler.pool.measure_async()
+        await self._connect()
+        self.runtime.spawn(self._misc_loop(), "mqtt_misc")
+        self.runtime.spawn(self._supervise(), "mqtt_supervisor")
+        self.runtime.on_shutdown(self.close)
+
+    def _attach(self, client):
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+        client.on_message = self._on_message
+
+    async def _connect(self, order=None):
+        """
+        Conecta el cliente principal al primer broker de `order` (por defecto, `pool.rank()`).
+        """
+        for broker in order or self.handler.pool.rank():
+            try:
+                self.logger.info(f"Intentando conectar al broker {broker}:{self.handler.port}...")
+                await self.runtime.run_blocking(self.client.connect, broker, self.handler.port, self.handler.keepalive)
+                await asyncio.wait_for(self._connected.wait(), self.connect_timeout)
+                self.handler.current_broker = broker
+                self.logger.info(f"Conexión exitosa al broker {broker}.")
+                return
+            except (OSError, asyncio.TimeoutError) as e:
+                self.logger.warning(f"No se pudo conectar al broker {broker}:{self.handler.port}. Error: {e!r}")
+        raise ConnectionError("No se pudo conectar a ningún broker MQTT.")
+
+    async def _connect_standby(self):
+        """
+        Abre la conexión de reserva (sin suscripciones) al siguiente broker más rápido.
+        """
+        handler = self.handler
+        if handler.standby is not None:
+            handler.standby.disconnect()
+            handler.standby = handler.standby_broker = None
+        for broker in handler.standby_candidates():
+            client = handler._new_client(handler.standby_id)
+            self._attach(client)
+            try:
+                await self.runtime.run_blocking(client.connect, broker, handler.port, handler.keepalive)
+                handler.standby, handler.standby_broker = client, broker
+                self.logger.info(f"[MQTT] Conexión de reserva abierta con el broker {broker}.")
+                return
+            except OSError as e:
+                self.logger.warning(f"[MQTT] No se pudo abrir la conexión de reserva con {broker}:{handler.port}. Error: {e!r}")
+
+    def _promote_standby(self, started):
+        """
+        Reemplaza la conexión principal por la de reserva (en el hilo del bucle).
+
+        :return: True si había una conexión de reserva lista.
+        """
+        previous_broker = self.handler.current_broker
+        previous = self.handler.swap_to_standby()
+        if previous is None:
+            return False
+        self.handler._subscribe_to_topics()
+        self._connected.set()
+        self.handler._start_replay()
+        previous.disconnect()
+        self.handler.record_failover(started, previous_broker)
+        return True
+
+    async def _reconnect(self, started):
+        """
+        Sin conexión de reserva: mide los brokers y reintenta con espera exponencial con
+        variación aleatoria hasta recuperar la conexión.
+        """
+        previous_broker = self.handler.current_broker
+        backoff = self.handler.backoff
+        while not self._closing and not self._connected.is_set():
+            await self.handler.pool.measure_async()
+            try:
+                await self._connect(self.handler.pool.rank(exclude={previous_broker}) + [previous_broker])
+            except ConnectionError:
+                await asyncio.sleep(backoff.next())
+                continue
+            backoff.reset()
+            self.handler.record_failover(started, previous_broker)
+
+    async def _supervise(self):
+        """
+        Cada `failover.probe_interval` segundos mide los brokers, cambia de broker si el actual
+        dejó de responder al sondeo y repone la conexión de reserva.
+        """
+        handler = self.handler
+        if not handler.probe_interval:
+            return
+        while not self._closing:
+            await asyncio.sleep(handler.probe_interval)
+            await handler.pool.measure_async()
+            if self._connected.is_set() and handler.pool.is_down(handler.current_broker):
+                self.logger.warning(f"[MQTT] El broker {handler.current_broker} no responde al sondeo. Cambiando de broker...")
+                self._connected.clear()
+                self._fail_over(time.monotonic())
+            if (handler.standby_enabled and self._connected.is_set()
+                    and (handler.standby is None or not handler.standby.is_connected())):
+                await self._connect_standby()
+
+    def _fail_over(self, started):
+        if self._promote_standby(started):
+            return
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = self.runtime.spawn(self._reconnect(started), "mqtt_reconnect")
+
+    async def _misc_loop(self):
+        while True:
+            self.client.loop_misc()
+            if self.handler.standby is not None:
+                self.handler.standby.loop_misc()
+            await asyncio.sleep(1.0)
+
+    # --- Callbacks de paho (el registro de sockets puede llegar desde otros hilos) -------
+
+    def _socket_op(self, method, sock, *args):
+        """
+        Registra o retira un socket del bucle. En el hilo del bucle se aplica de inmediato
+        (paho cierra el socket justo después de `on_socket_close`); desde otros hilos se
+        difiere y se ignora si el socket ya se cerró.
+        """
+        fd = sock.fileno()
+        if fd < 0:
+            return
+        if self.runtime.in_loop():
+            method(fd, *args)
+            return
+
+        def apply():
+            try:
+                method(fd, *args)
+            except (OSError, ValueError):
+                pass    # El socket se cerró antes de que el bucle atendiera el cambio
+        self.runtime.call_soon(apply)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self._socket_op(self.runtime.loop.add_reader, sock, client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        self._socket_op(self.runtime.loop.remove_reader, sock)
+        self._socket_op(self.runtime.loop.remove_writer, sock)
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self._socket_op(self.runtime.loop.add_writer, sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self._socket_op(self.runtime.loop.remove_writer, sock)
+
+    def _on_connect(self, client, userdata, flags, rc):
+        self.handler.on_connect(client, userdata, flags, rc)
+        if rc == 0 and client is self.client:
+            self._connected.set()       # MQTTHandler.on_connect ya suscribió los filtros de las rutas
+
+    def _on_disconnect(self, client, userdata, rc):
+        if client is not self.client:
+            return      # Conexión de reserva o ya reemplazada: la supervisión la repone
+        self._connected.clear()
+        if self._closing:
+            return
+        self.logger.warning(f"[MQTT] Desconectado del broker MQTT (rc={rc}). Cambiando de broker desde el bucle...")
+        self._fail_over(time.monotonic())
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            decoded = decode_payload(msg.payload)
+        except (ValueError, CodecError) as e:
+            self.logger.error(f"[MQTT] Error decodificando mensaje en {msg.topic}: {e}")
+            return
+        for message in (decoded if isinstance(decoded, list) else [decoded]):
+            self.handler.received_messages.inc()
+            self.handler.router.dispatch(msg.topic, message, spawn=self.runtime.spawn)
+
+    # --- API --------------------------------------------------------------------------------
+
+    def subscribe(self, topic_filter, callback, qos=0, mode=INLINE):
+        """
+        Registra un callback `callback(topic, message)` para un filtro de tópico en la tabla
+        de despacho de MQTTHandler. El callback recibe el mensaje ya decodificado (un mensaje
+        por llamada aunque lleguen en lote).
+
+        :param mode: "inline": se ejecuta en el bucle (si es async, como tarea; si es
+            síncrono, no debe bloquear). "pool": se ejecuta en el pool de trabajadores del
+            enrutador, en orden por tópico; debe ser síncrono.
+        """
+        self.handler.route(topic_filter, callback, mode, qos)
+
+    def is_connected(self):
+        return bool(self._connected and self._connected.is_set())
+
+    async def close(self):
+        """
+        Envía los mensajes pendientes y se desconecta (los sockets siguen atendidos por el bucle).
+        """
+        self._closing = True
+        await self.runtime.run_blocking(self.handler.disconnect)
@@ -0,0 +1,131 @@
+# broker_pool.py - Selección del broker MQTT más rápido y espera exponencial con variación aleatoria para reconexiones.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+"""
+Conjunto de brokers MQTT con RTT medido.
+
+`BrokerPool.measure()` sondea en paralelo el puerto MQTT de todos los brokers configurados
+(una conexión TCP no bloqueante por broker, como HealthProber) y mantiene un RTT EWMA por
+broker. `rank()` ordena los brokers sanos del más rápido al más lento, seguidos de los que
+no respondieron, de modo que la conexión nunca espera el tiempo de espera de un broker caído
+antes de probar el siguiente.
+"""
+
+import random
+
+from modules.health_probe import HealthProber, LinkStats, ProbeTarget
+from modules.metrics import MetricsRegistry
+
+# Nombre de la interfaz lógica del sondeo (sin enlazar a una IP de origen)
+_POOL = "pool"
+
+
+class Backoff:
+    """
+    Espera exponencial con variación aleatoria completa ("full jitter").
+
+    Cada llamada a `next()` devuelve un valor aleatorio entre `minimum` y el límite actual,
+    que se multiplica por `factor` hasta `maximum`. La variación evita que las tres Raspberry
+    Pi reconecten al mismo tiempo tras una caída del broker.
+    """
+
+    def __init__(self, minimum=0.5, maximum=30.0, factor=2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self._ceiling = minimum
+
+    def next(self):
+        delay = random.uniform(self.minimum, self._ceiling)
+        self._ceiling = min(self._ceiling * self.factor, self.maximum)
+        return delay
+
+    def reset(self):
+        self._ceiling = self.minimum
+
+
+class BrokerPool:
+    """
+    Brokers configurados con su RTT y pérdida medidos.
+    """
+
+    def __init__(self, brokers, port=1883, timeout=0.5, alpha=0.3, fail_rounds=2, registry=None):
+        """
+        :param brokers: Lista de direcciones de broker (en orden de preferencia).
+        :param port: Puerto MQTT común.
+        :param timeout: Espera máxima de una ronda de sondeo en segundos.
+        :param alpha: Peso EWMA de la ronda más reciente.
+        :param fail_rounds: Rondas sin respuesta para considerar caído un broker.
+        :param registry: Registro de métricas (por defecto, el compartido).
+        """
+        self.brokers = list(brokers)
+        self.port = port
+        self.fail_rounds = fail_rounds
+        # Un broker caído con el host activo rechaza la conexión: solo el SYN-ACK cuenta como éxito
+        self.prober = HealthProber({_POOL: {}}, [ProbeTarget(broker, broker, port) for broker in self.brokers],
+                                   timeout, reachable_errors={0})
+        self.stats = {broker: LinkStats(alpha) for broker in self.brokers}
+        registry = registry or MetricsRegistry.default()
+        self._rtt_gauges = {broker: registry.gauge("mqtt_broker_rtt_ms", "RTT de conexión TCP al broker (ms)",
+                                                    {"broker": broker}) for broker in self.brokers}
+
+    @classmethod
+    def from_config(cls, mqtt_config, brokers):
+        """
+        Crea el conjunto a partir de la sección `mqtt` de la configuración.
+
+        :param mqtt_config: Diccionario de la sección `mqtt` (usa `port` y `failover.*`).
+        :param brokers: Lista normalizada de brokers.
+        """
+        failover = mqtt_config.get("failover", {})
+        return cls(brokers, mqtt_config.get("port", 1883),
+                   timeout=failover.get("probe_timeout", 0.5),
+                   alpha=failover.get("ewma_alpha", 0.3),
+                   fail_rounds=failover.get("fail_rounds", 2))
+
+    def _record(self, results):
+        for broker, rtt in zip(self.brokers, results[_POOL]):
+            self.stats[broker].update([rtt])
+            if rtt is not None:
+                self._rtt_gauges[broker].set(round(self.stats[broker].rtt_ms, 3))
+        return dict(zip(self.brokers, results[_POOL]))
+
+    def measure(self):
+        """
+        Sondea todos los brokers en paralelo (bloquea como máximo `timeout`).
+
+        :return: Diccionario {broker: rtt_ms o None}.
+        """
+        return self._record(self.prober.probe_all())
+
+    async def measure_async(self):
+        """
+        Igual que `measure` pero espera desde el bucle de asyncio.
+        """
+        return self._record(await self.prober.probe_all_async())
+
+    def is_down(self, broker):
+        """
+        Indica si un broker no respondió en las últimas `fail_rounds` rondas.
+        """
+        stats = self.stats.get(broker)
+        return stats is not None and stats.consecutive_failures >= self.fail_rounds
+
+    def rank(self, exclude=()):
+        """
+        Ordena los brokers según la última medición: primero los que respondieron, del menor
+        al mayor RTT; después los demás en el orden configurado (por si el sondeo falló pero
+        el broker acepta conexiones).
+
+        :param exclude: Brokers que se omiten (p. ej. el que acaba de fallar).
+        """
+        candidates = [broker for broker in self.brokers if broker not in exclude]
+        healthy = [broker for broker in candidates
+                   if self.stats[broker].rtt_ms is not None and self.stats[broker].consecutive_failures == 0]
+        healthy.sort(key=lambda broker: self.stats[broker].rtt_ms)
+        return healthy + [broker for broker in candidates if broker not in healthy]
+
+    def get_stats(self):
+        return {broker: stats.as_dict() for broker, stats in self.stats.items()}
@@ -4,15 +4,80 @@
 # Proyecto: Smart Recycling Bin
 
 import yaml
+import copy
 import logging
 import os
+import threading
+from types import MappingProxyType
 from modules.logging_manager import LoggingManager
 
+_MISSING = object()
+
+
+class ConfigSnapshot:
+    """
+    Vista inmutable y aplanada de la configuración.
+
+    Cada ruta jerárquica ("mqtt.port", "mqtt", "mux.relays", ...) se precalcula en un solo
+    diccionario, por lo que `get` es una búsqueda O(1) sin dividir la clave ni registrar en
+    los logs. Los valores son copias: modificar la configuración no altera una instantánea
+    ya entregada. Los valores compuestos (diccionarios y listas) no deben modificarse.
+    """
+
+    __slots__ = ("_values", "version")
+
+    def __init__(self, config_data, version=0):
+        """
+        :param config_data: Diccionario anidado con la configuración.
+        :param version: Número de versión de la instantánea (crece con cada recarga).
+        """
+        values = {}
+        self._flatten(copy.deepcopy(config_data or {}), "", values)
+        self._values = MappingProxyType(values)
+        self.version = version
+
+    @classmethod
+    def _flatten(cls, node, prefix, values):
+        for key, value in node.items():
+            path = f"{prefix}{key}"
+            values[path] = value
+            if isinstance(value, dict):
+                cls._flatten(value, f"{path}.", values)
+
+    def get(self, key_path, default=None):
+        """
+        Obtiene un valor por su clave jerárquica (e.g., "mqtt.port") sin registrar en los logs.
+        """
+        return self._values.get(key_path, default)
+
+    def __getitem__(self, key_path):
+        return self._values[key_path]
+
+    def __contains__(self, key_path):
+        return key_path in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+
 class ConfigManager:
     """
     Clase para manejar la configuración centralizada del sistema.
     """
 
+    # Claves obligatorias y su valor predeterminado
+    REQUIRED_KEYS = {
+        "mqtt.enable_mqtt": True,
+        "mqtt.broker_addresses": ["192.168.1.147"],
+        "mqtt.port": 1883,
+        "mqtt.keepalive": 60,
+        "mqtt.topics.entry": "material/entrada",
+        "mqtt.topics.detection": "material/deteccion",
+        "mqtt.topics.action": "valvula/accion",
+        "mqtt.topics.status": "valvula/estado",
+        "mqtt.topics.alertas": "raspberry-3/alertas"
+    }
+
     def __init__(self, config_path):
         """
         Inicializa el manejador de configuraciones.
@@ -21,6 +86,10 @@ class ConfigManager:
         """
         self.config_path = config_path
         self.config_data = {}
+        self._snapshot = ConfigSnapshot({})
+        self._snapshot_lock = threading.Lock()
+        self._file_signature = None
+        self._warned_keys = set()
 
         # Configurar logger
         try:
@@ -35,59 +104,100 @@ class ConfigManager:
         self.config_data = self.load_config()
         self.validate_config()
 
-    def load_config(self, config_path):
+    def load_config(self, config_path=None):
         """
-        Carga el archivo de configuración YAML.
+        Carga el archivo de configuración YAML y reconstruye la instantánea.
         """
         try:
+            if config_path is None:
+                config_path = self.config_path
             with open(config_path, "r") as file:
-                self.config_data = yaml.safe_load(file)
-            logger.info("[CONFIG_MANAGER] Configuración cargada exitosamente.")
-            logger.debug(f"[CONFIG_MANAGER] Contenido de la configuración: {self.config_data}")
+                self.config_data = yaml.safe_load(file) or {}
+            self._file_signature = self._signature()
+            self._rebuild_snapshot()
+            self.logger.info("Configuración cargada exitosamente.")
         except Exception as e:
-            logger.error(f"[CONFIG_MANAGER] Error al cargar configuración: {e}")
+            self.logger.error(f"Error al cargar configuración: {e}")
             raise
 
+        return self.config_data
 
-    def load_config(self, config_path=None):
+    def _signature(self):
         """
-        Carga el archivo de configuración YAML.
+        Devuelve (mtime_ns, tamaño) del archivo de configuración, o None si no existe.
         """
         try:
-            if config_path is None:
-                config_path = self.config_path
-            with open(config_path, "r") as file:
-                self.config_data = yaml.safe_load(file)
-            logger.info("[CONFIG_MANAGER] Configuración cargada exitosamente.")
-        except Exception as e:
-            logger.error(f"[CONFIG_MANAGER] Error al cargar configuración: {e}")
-            raise
+            stat = os.stat(self.config_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
 
+    def _rebuild_snapshot(self):
+        """
+        Reemplaza la instantánea aplanada por una nueva construida desde `config_data`.
+        """
+        with self._snapshot_lock:
+            self._snapshot = ConfigSnapshot(self.config_data, self._snapshot.version + 1)
+            self._warned_keys.clear()
 
-        return logger
+    def replace_config(self, config_data):
+        """
+        Reemplaza la configuración completa por un diccionario ya cargado y validado
+        (p. ej. por RealTimeConfigManager) sin volver a leer el archivo.
 
-    def validate_config(self):
+        :param config_data: Diccionario con la configuración nueva.
         """
-        Valida y completa claves faltantes en la configuración.
+        self.config_data = config_data
+        self._file_signature = self._signature()
+        self._rebuild_snapshot()
+
+    def snapshot(self):
+        """
+        Devuelve la instantánea inmutable actual de la configuración.
+
+        Los lectores en rutas críticas deben obtenerla una vez por mensaje o ciclo y
+        consultarla con `get`; la instantánea no cambia aunque el archivo se recargue.
+        """
+        return self._snapshot
+
+    def reload_if_changed(self):
         """
-        required_keys = {
-            "mqtt.enable_mqtt": True,
-            "mqtt.broker_addresses": ["192.168.1.147"],
-            "mqtt.port": 1883,
-            "mqtt.keepalive": 60,
-            "mqtt.topics.entry": "material/entrada",
-            "mqtt.topics.detection": "material/deteccion",
-            "mqtt.topics.action": "valvula/accion",
-            "mqtt.topics.status": "valvula/estado",
-            "mqtt.topics.alertas": "raspberry-3/alertas"
-        }
+        Recarga la configuración solo si el archivo cambió (mtime o tamaño).
 
+        :return: True si la configuración se recargó.
+        """
+        signature = self._signature()
+        if signature is None or signature == self._file_signature:
+            return False
+        self.load_config()
+        return True
 
-        for key, default in required_keys.items():
+    def validate_config(self):
+        """
+        Valida y completa claves faltantes en la configuración.
+        """
+        for key, default in self.REQUIRED_KEYS.items():
             if self.get(key, None) is None:
                 self.set(key, default)
                 self.logger.info(f"Clave faltante: {key}. Valor predeterminado establecido: {default}")
 
+    @classmethod
+    def section_errors(cls, config_data):
+        """
+        Valida las secciones de una configuración sin modificarla: cada sección de
+        REQUIRED_KEYS (p. ej. "mqtt") debe existir y ser un diccionario.
+
+        :param config_data: Diccionario con la configuración a validar.
+        :return: Lista de errores (vacía si la configuración es válida).
+        """
+        errors = []
+        for section in dict.fromkeys(key.split(".")[0] for key in cls.REQUIRED_KEYS):
+            if section not in config_data:
+                errors.append(f"Falta la sección obligatoria '{section}'.")
+            elif not isinstance(config_data[section], dict):
+                errors.append(f"La sección '{section}' debe ser un diccionario.")
+        return errors
+
     def get(self, key_path, default=None):
         """
         Obtiene un valor de configuración basado en su clave.
@@ -96,16 +206,15 @@ class ConfigManager:
         :param default: Valor predeterminado si la clave no existe.
         :return: Valor asociado a la clave o el valor predeterminado.
         """
-        keys = key_path.split(".")
-        value = self.config_data
-
-        try:
-            for key in keys:
-                value = value[key]
+        value = self._snapshot.get(key_path, _MISSING)
+        if value is not _MISSING:
             return value
-        except (KeyError, TypeError):
+
+        # Solo se advierte la primera vez que falta cada clave
+        if key_path not in self._warned_keys:
+            self._warned_keys.add(key_path)
             self.logger.warning(f"Clave faltante: {key_path}. Usando valor predeterminado: {default}")
-            return default
+        return default
 
     def set(self, key_path, value):
         """
@@ -121,6 +230,7 @@ class ConfigManager:
             config = config.setdefault(key, {})
 
         config[keys[-1]] = value
+        self._rebuild_snapshot()
         self.logger.info(f"Clave configurada: {key_path} = {value}")
 
         # Guardar cambios en el archivo YAML
@@ -133,6 +243,7 @@ class ConfigManager:
         try:
             with open(self.config_path, "w") as yaml_file:
                 yaml.safe_dump(self.config_data, yaml_file)
+            self._file_signature = self._signature()
             self.logger.info("Configuración guardada exitosamente.")
         except Exception as e:
             self.logger.error(f"Error al guardar la configuración: {e}")
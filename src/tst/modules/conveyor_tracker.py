@@ -0,0 +1,322 @@
+# conveyor_tracker.py - Seguimiento de materiales en la cinta transportadora y programación de acciones.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict
+
+
+@dataclass
+class TrackedItem:
+    event_id: str
+    material: str
+    detected_at: float                  # Reloj monotónico al momento de la detección
+    position: float = 0.0               # Posición en la cinta (metros) al momento de la detección
+    wall_timestamp: float = field(default_factory=time.time)
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(order=True)
+class ScheduledAction:
+    deadline: float
+    sequence: int
+    event_id: str = field(compare=False)
+    label: str = field(compare=False)
+    callback: Callable = field(compare=False)
+    args: tuple = field(compare=False, default=())
+    cancelled: bool = field(compare=False, default=False)
+    counted: bool = field(compare=False, default=False)    # Cuenta como pendiente de su material
+
+
+class ConveyorTracker:
+    """
+    Línea de tiempo de los materiales en la cinta transportadora.
+
+    Cada material se registra con su ID de evento, el instante (reloj monotónico) y la posición
+    de detección. Las acciones (p. ej. activar una válvula) se programan contra esa línea de
+    tiempo en un heap de vencimientos atendido por un solo hilo, por lo que pueden viajar
+    varios materiales entre el espectrómetro y las válvulas al mismo tiempo sin bloquear
+    el hilo que recibe los mensajes MQTT.
+
+    Con `start(loop=...)` el heap lo atiende un único temporizador del bucle de asyncio
+    (armado para la acción más próxima) en lugar del hilo propio; las acciones se ejecutan
+    entonces en el hilo del bucle y no deben bloquear.
+
+    Los materiales sin acciones pendientes se olvidan `conveyor.item_ttl` segundos después de
+    su detección. Los vencimientos de TTL van en un segundo heap y cada material lleva la
+    cuenta de sus acciones pendientes, así que expirar cuesta O(log n) por material.
+    """
+
+    def __init__(self, config_manager, conveyor_speed=None):
+        """
+        Inicializa el rastreador de la cinta.
+
+        :param config_manager: Instancia de ConfigManager para manejar configuraciones centralizadas.
+        :param conveyor_speed: Velocidad de la cinta en metros por segundo (por defecto `system.conveyor_speed`).
+        """
+        from modules.logging_manager import LoggingManager
+
+        self.config_manager = config_manager
+        self.conveyor_speed = conveyor_speed or self.config_manager.get("system.conveyor_speed", 0.5)
+        self.item_ttl = self.config_manager.get("conveyor.item_ttl", 30)
+        self.logger = LoggingManager(config_manager).setup_logger("[CONVEYOR_TRACKER]")
+
+        if self.conveyor_speed <= 0:
+            raise ValueError("La velocidad del conveyor debe ser mayor que 0.")
+
+        self.items = {}
+        self._heap = []
+        self._expiry = []               # Heap de (vencimiento del TTL, secuencia, material)
+        self._pending = {}              # ID de evento -> acciones pendientes
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._loop = None
+        self._timer = None
+
+        self.actions_fired = 0
+        self.max_lateness_ms = 0.0
+
+    def track_item(self, event_id, material, position=0.0, detected_at=None, metadata=None):
+        """
+        Registra un material detectado en la cinta.
+
+        :param event_id: ID único del evento.
+        :param material: Material identificado.
+        :param position: Posición (metros) del punto de detección.
+        :param detected_at: Instante monotónico de la detección (por defecto ahora).
+        :param metadata: Datos adicionales del evento.
+        :return: Instancia de TrackedItem.
+        """
+        item = TrackedItem(
+            event_id=event_id,
+            material=material,
+            detected_at=detected_at if detected_at is not None else time.monotonic(),
+            position=position,
+            metadata=metadata or {}
+        )
+        with self._condition:
+            self.items[event_id] = item
+            heapq.heappush(self._expiry, (item.detected_at + self.item_ttl, next(self._sequence), item))
+        self.logger.debug(f"Material {material} registrado en la cinta. ID Evento: {event_id}")
+        return item
+
+    def position_of(self, event_id, now=None):
+        """
+        Calcula la posición actual (metros) de un material en la cinta.
+        """
+        item = self.items.get(event_id)
+        if item is None:
+            return None
+        now = now if now is not None else time.monotonic()
+        return item.position + self.conveyor_speed * (now - item.detected_at)
+
+    def time_to_reach(self, event_id, distance):
+        """
+        Devuelve el instante monotónico en que un material alcanza la posición `distance`.
+        """
+        item = self.items[event_id]
+        return item.detected_at + (distance - item.position) / self.conveyor_speed
+
+    def schedule_at_distance(self, event_id, distance, callback, *args, label="action"):
+        """
+        Programa una acción para cuando el material llegue a una posición de la cinta.
+
+        :param event_id: ID del material registrado con `track_item`.
+        :param distance: Posición de destino en metros (p. ej. distancia del sensor a la válvula).
+        :param callback: Función a ejecutar en el hilo del rastreador.
+        :param label: Nombre descriptivo de la acción para los logs.
+        :return: Instancia de ScheduledAction (se puede cancelar).
+        """
+        if event_id not in self.items:
+            raise KeyError(f"Material no registrado: {event_id}")
+        return self.schedule_at(self.time_to_reach(event_id, distance), callback, *args, event_id=event_id, label=label)
+
+    def schedule_at(self, deadline, callback, *args, event_id=None, label="action"):
+        """
+        Programa una acción para un instante monotónico específico.
+        """
+        action = ScheduledAction(deadline, next(self._sequence), event_id, label, callback, args)
+        with self._condition:
+            if event_id is not None:
+                action.counted = True
+                self._pending[event_id] = self._pending.get(event_id, 0) + 1
+            heapq.heappush(self._heap, action)
+            self._condition.notify()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._arm_timer)
+        return action
+
+    def schedule_in(self, delay, callback, *args, event_id=None, label="action"):
+        """
+        Programa una acción dentro de `delay` segundos.
+        """
+        return self.schedule_at(time.monotonic() + delay, callback, *args, event_id=event_id, label=label)
+
+    def cancel(self, event_id):
+        """
+        Cancela las acciones pendientes de un material y lo elimina de la línea de tiempo.
+        """
+        with self._condition:
+            for action in self._heap:
+                if action.event_id == event_id:
+                    action.cancelled = True
+                    self._uncount(action)
+            self.items.pop(event_id, None)
+
+    def in_flight(self):
+        """
+        Devuelve el número de materiales que están actualmente en la cinta.
+        """
+        return len(self.items)
+
+    def _uncount(self, action):
+        """
+        Descuenta una acción de las pendientes de su material. Se llama con el candado tomado.
+        """
+        if not action.counted:
+            return
+        action.counted = False
+        remaining = self._pending[action.event_id] - 1
+        if remaining:
+            self._pending[action.event_id] = remaining
+        else:
+            del self._pending[action.event_id]
+
+    def _pop(self, now):
+        """
+        Saca la acción más próxima del heap. Si era la última pendiente de un material cuyo TTL
+        ya venció, el material se elimina. Se llama con el candado tomado.
+        """
+        action = heapq.heappop(self._heap)
+        self._uncount(action)
+        item = self.items.get(action.event_id)
+        if item is not None and action.event_id not in self._pending and now - item.detected_at > self.item_ttl:
+            del self.items[action.event_id]
+        return action
+
+    def _expire_items(self, now):
+        """
+        Elimina los materiales cuyo TTL venció y no tienen acciones pendientes (los que aún
+        tienen acciones se eliminan en `_pop` al salir la última). Se llama con el candado tomado.
+        """
+        while self._expiry and self._expiry[0][0] <= now:
+            _, _, item = heapq.heappop(self._expiry)
+            if self.items.get(item.event_id) is item and item.event_id not in self._pending:
+                del self.items[item.event_id]
+
+    def _run(self):
+        """
+        Hilo que ejecuta las acciones en orden de vencimiento.
+        """
+        while True:
+            with self._condition:
+                while self._running and (not self._heap or self._heap[0].deadline > time.monotonic()):
+                    timeout = self._heap[0].deadline - time.monotonic() if self._heap else None
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                now = time.monotonic()
+                action = self._pop(now)
+                self._expire_items(now)
+
+            self._execute(action, now)
+
+    def _execute(self, action, now):
+        if action.cancelled:
+            return
+        lateness_ms = (now - action.deadline) * 1000
+        self.max_lateness_ms = max(self.max_lateness_ms, lateness_ms)
+        try:
+            action.callback(*action.args)
+            self.actions_fired += 1
+            self.logger.debug(f"Acción '{action.label}' ejecutada ({lateness_ms:.1f} ms de retraso). ID Evento: {action.event_id}")
+        except Exception as e:
+            self.logger.error(f"Error ejecutando acción '{action.label}' para {action.event_id}: {e}")
+
+    def _arm_timer(self):
+        """
+        (Bucle de asyncio) Arma el temporizador para la acción más próxima.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        with self._condition:
+            if not self._running or not self._heap:
+                return
+            delay = self._heap[0].deadline - time.monotonic()
+        self._timer = self._loop.call_later(max(0.0, delay), self._on_timer)
+
+    def _on_timer(self):
+        """
+        (Bucle de asyncio) Ejecuta las acciones vencidas y vuelve a armar el temporizador.
+        """
+        self._timer = None
+        due = []
+        with self._condition:
+            now = time.monotonic()
+            while self._running and self._heap and self._heap[0].deadline <= now:
+                due.append(self._pop(now))
+            self._expire_items(now)
+        for action in due:
+            self._execute(action, now)
+        self._arm_timer()
+
+    def start(self, loop=None):
+        """
+        Inicia el rastreador.
+
+        :param loop: Bucle de asyncio en el que se ejecutan las acciones. Sin bucle se usa un hilo propio.
+        """
+        if self.is_running():
+            return
+        self._running = True
+        if loop is not None:
+            self._loop = loop
+            loop.call_soon_threadsafe(self._arm_timer)
+        else:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self.logger.info(f"Rastreador de la cinta iniciado (velocidad {self.conveyor_speed} m/s, modo {'asyncio' if loop else 'hilo'}).")
+
+    def stop(self):
+        """
+        Detiene el rastreador. Las acciones pendientes se descartan.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._loop is not None:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._loop = None
+        self.logger.info("Rastreador de la cinta detenido.")
+
+    def is_running(self):
+        """
+        Verifica si el rastreador está activo.
+        """
+        if self._loop is not None:
+            return self._running
+        return bool(self._thread and self._thread.is_alive())
+
+    def get_stats(self):
+        """
+        Devuelve estadísticas del rastreador.
+        """
+        return {
+            "in_flight": self.in_flight(),
+            "pending_actions": sum(1 for action in self._heap if not action.cancelled),
+            "actions_fired": self.actions_fired,
+            "max_lateness_ms": round(self.max_lateness_ms, 2),
+        }
@@ -0,0 +1,233 @@
+# file_watcher.py - Vigilancia de archivos basada en eventos (inotify) con respaldo por sondeo.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MODIFY
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_inotify():
+    """
+    Carga las funciones de inotify desde libc. Devuelve None si no están disponibles (p. ej. fuera de Linux).
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class FileWatcher:
+    """
+    Vigila un archivo y ejecuta `callback()` en un hilo propio cuando su contenido cambia.
+
+    Con inotify se vigila el directorio del archivo, de modo que también se detectan los
+    editores que guardan escribiendo un archivo temporal y renombrándolo. Las ráfagas de
+    eventos de un mismo guardado se agrupan: el callback se ejecuta cuando pasan `debounce`
+    segundos sin eventos nuevos. Si inotify no está disponible se sondea (mtime, tamaño)
+    cada `poll_interval` segundos.
+
+    Con `start(loop=...)` no se crea hilo: el descriptor de inotify (o el sondeo) se atiende
+    desde el bucle de asyncio y el callback se ejecuta en su ejecutor por defecto.
+    """
+
+    def __init__(self, path, callback, debounce=0.2, poll_interval=5, use_inotify=True, logger=None):
+        """
+        :param path: Ruta del archivo a vigilar.
+        :param callback: Función sin argumentos a ejecutar tras un cambio.
+        :param debounce: Segundos sin eventos antes de ejecutar el callback.
+        :param poll_interval: Intervalo de sondeo en segundos cuando no hay inotify.
+        :param use_inotify: Si es False se usa siempre el sondeo.
+        :param logger: Logger del componente que usa el vigilante.
+        """
+        self.path = os.path.abspath(path)
+        self.directory, self.filename = os.path.split(self.path)
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.logger = logger
+
+        self.mode = None
+        self.changes = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._fd = None
+        self._loop = None
+        self._handle = None
+        self._last = None
+
+    def _open_inotify(self):
+        """
+        Crea el descriptor de inotify y agrega la vigilancia del directorio.
+        """
+        libc = _load_inotify()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(self.directory or "."), WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _read_events(self):
+        """
+        Lee los eventos pendientes e indica si alguno corresponde al archivo vigilado.
+        """
+        try:
+            data = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return False
+        relevant = False
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if os.fsdecode(name) == self.filename:
+                relevant = True
+        return relevant
+
+    def _run_inotify(self):
+        while not self._stop_event.is_set():
+            ready, _, _ = select.select([self._fd], [], [], 0.5)
+            if not ready or not self._read_events():
+                continue
+            # Agrupar la ráfaga de eventos de un mismo guardado
+            while select.select([self._fd], [], [], self.debounce)[0]:
+                self._read_events()
+            self._fire()
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _run_polling(self):
+        last = self._signature()
+        while not self._stop_event.wait(self.poll_interval):
+            current = self._signature()
+            if current == last:
+                continue
+            # Esperar a que el archivo deje de cambiar
+            while not self._stop_event.wait(self.debounce):
+                settled = self._signature()
+                if settled == current:
+                    break
+                current = settled
+            last = current
+            self._fire()
+
+    def _on_readable(self):
+        """
+        (Bucle de asyncio) Lee los eventos de inotify y reinicia la espera de agrupación.
+        """
+        if self._read_events():
+            if self._handle is not None:
+                self._handle.cancel()
+            self._handle = self._loop.call_later(self.debounce, self._debounced)
+
+    def _debounced(self):
+        self._handle = None
+        self._fire_in_executor()
+
+    def _poll_tick(self):
+        """
+        (Bucle de asyncio) Sondea el archivo y espera a que deje de cambiar antes del callback.
+        """
+        current = self._signature()
+        if current != self._last:
+            self._handle = self._loop.call_later(self.debounce, self._poll_settle, current)
+        else:
+            self._handle = self._loop.call_later(self.poll_interval, self._poll_tick)
+
+    def _poll_settle(self, previous):
+        settled = self._signature()
+        if settled != previous:
+            self._handle = self._loop.call_later(self.debounce, self._poll_settle, settled)
+            return
+        self._last = settled
+        self._fire_in_executor()
+        self._handle = self._loop.call_later(self.poll_interval, self._poll_tick)
+
+    def _fire_in_executor(self):
+        self._loop.run_in_executor(None, self._fire)
+
+    def _fire(self):
+        self.changes += 1
+        try:
+            self.callback()
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Error procesando cambio en {self.path}: {e}")
+
+    def start(self, loop=None):
+        """
+        Inicia la vigilancia en un hilo separado o, con `loop`, en el bucle de asyncio (llamar desde su hilo).
+        """
+        if self.is_running():
+            return
+        self._stop_event.clear()
+        self._fd = self._open_inotify() if self.use_inotify else None
+        self.mode = "inotify" if self._fd is not None else "polling"
+        if loop is not None:
+            self._loop = loop
+            if self._fd is not None:
+                loop.add_reader(self._fd, self._on_readable)
+            else:
+                self._last = self._signature()
+                self._handle = loop.call_later(self.poll_interval, self._poll_tick)
+        else:
+            target = self._run_inotify if self._fd is not None else self._run_polling
+            self._thread = threading.Thread(target=target, daemon=True)
+            self._thread.start()
+        if self.logger:
+            self.logger.info(f"Vigilando {self.path} (modo {self.mode}).")
+
+    def stop(self):
+        """
+        Detiene la vigilancia.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._loop is not None:
+            if self._handle is not None:
+                self._handle.cancel()
+                self._handle = None
+            if self._fd is not None:
+                self._loop.remove_reader(self._fd)
+            self._loop = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def is_running(self):
+        if self._loop is not None:
+            return True
+        return bool(self._thread and self._thread.is_alive())
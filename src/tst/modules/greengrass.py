@@ -3,12 +3,37 @@
 # Copyright (c) 2024
 # Proyecto: Smart Recycling Bin
 
+import json
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from modules.metrics import MetricsRegistry
+from modules.publish_pipeline import PublishPipeline
+
+# Límite de la API de Lambda para el cuerpo de una invocación asíncrona (Event)
+EVENT_PAYLOAD_LIMIT = 256 * 1024
+
+
+def _encode(payload):
+    return json.dumps(payload, separators=(",", ":"), default=str)
+
 
 class GreengrassManager:
     """
     Clase para manejar la interacción con AWS IoT Greengrass.
     Permite invocar funciones Lambda locales para procesamiento de datos.
+
+    - `invoke_function` invoca una función y espera su respuesta (RequestResponse), o la
+      dispara sin esperar (Event) con `wait=False`; si todas las ranuras siguen ocupadas
+      tras `greengrass.event_timeout` el payload se descarta en lugar de bloquear.
+    - `submit` encola un payload para una invocación Event en segundo plano. Los payloads
+      de una misma función que llegan dentro de `greengrass.batch.window` se envían en una
+      sola invocación `{"batch": [...]}` si la función declara `batch: true`.
+
+    Como máximo `greengrass.max_concurrency` invocaciones están en curso a la vez; el
+    cliente de Lambda reutiliza las conexiones HTTP de su pool entre invocaciones.
     """
 
     def __init__(self, config_manager, mqtt_handler=None):
@@ -20,60 +45,132 @@ class GreengrassManager:
         """
         from modules.logging_manager import LoggingManager
         import boto3
+        from botocore.config import Config
 
         self.config_manager = config_manager
         self.mqtt_handler = mqtt_handler
-        self.enable_greengrass = self.config_manager.get("system.enable_greengrass", True)
         self.logger = LoggingManager(config_manager).setup_logger("[GREENGRASS_MANAGER]")
 
         # Cargar configuración específica de Greengrass
         self.config = self.config_manager.get("greengrass", {})
+        self.enable_greengrass = self.config.get("enable_greengrass", self.config_manager.get("system.enable_greengrass", True))
         self.region = self.config.get("region", "us-east-1")
         self.group_name = self.config.get("group_name", "default_group")
         self.functions = self.config.get("functions", [])
+        self.max_concurrency = self.config.get("max_concurrency", 4)
+        self.max_batch_bytes = min(self.config.get("max_batch_bytes", 240 * 1024), EVENT_PAYLOAD_LIMIT)
+        self.event_timeout = self.config.get("event_timeout", 0.05)
+
+        # Búsqueda de la ARN por nombre en O(1) en lugar de recorrer la lista en cada invocación
+        self._arns = {function["name"]: function["arn"] for function in self.functions}
+        self._batch_functions = {function["name"] for function in self.functions if function.get("batch", False)}
 
         if not self.enable_greengrass:
             self.logger.warning("Greengrass está deshabilitado en la configuración.")
 
-        # Inicializar cliente de Lambda para Greengrass
-        self.lambda_client = boto3.client('lambda', region_name=self.region)
+        # Inicializar cliente de Lambda para Greengrass (`endpoint_url` permite apuntar a un servidor local)
+        self.lambda_client = boto3.client(
+            'lambda',
+            region_name=self.region,
+            endpoint_url=self.config.get("endpoint_url"),
+            config=Config(max_pool_connections=self.max_concurrency,
+                          retries={"max_attempts": self.config.get("max_attempts", 2)})
+        )
+
+        # Invocaciones en curso acotadas: el hilo de la cola espera una ranura; `wait=False` espera como máximo `event_timeout`
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="greengrass")
+
+        metrics = MetricsRegistry.default()
+        self.invoke_time = metrics.histogram("greengrass_invoke_ms", "Duración de una invocación Lambda (ms)")
+        self.invoked = metrics.counter("greengrass_payloads_invoked_total", "Payloads entregados a funciones Lambda")
+        self.invocations = metrics.counter("greengrass_invocations_total", "Invocaciones Lambda realizadas")
+        self.errors = metrics.counter("greengrass_payloads_failed_total", "Payloads cuya invocación falló")
+        self.dropped = metrics.counter("greengrass_payloads_dropped_total", "Payloads descartados por la cola o las ranuras llenas")
+
+        # Cola de micro-lotes: agrupa por función los payloads enviados con `submit`
+        batch_config = self.config.get("batch", {})
+        self.pipeline = PublishPipeline(
+            self._send_batch,
+            queue_size=batch_config.get("queue_size", 1000),
+            batch_window=batch_config.get("window", 0.05),
+            max_batch=batch_config.get("max_batch", 100),
+            batch_topics=self._batch_functions,
+            qos0_policy=batch_config.get("policy", "drop_oldest"),
+            logger=self.logger,
+            latency_histogram=metrics.histogram("greengrass_queue_latency_ms", "Espera en la cola de Greengrass (ms)")
+        )
+        self._pipeline_started = False
+        self._pipeline_lock = threading.Lock()
+
+    def _resolve(self, function_name):
+        """
+        Devuelve la ARN de una función configurada (también acepta una ARN directamente).
+        """
+        function_arn = self._arns.get(function_name)
+        if function_arn is None and function_name.startswith("arn:"):
+            function_arn = function_name
+        if not function_arn:
+            self.logger.error(f"No se encontró una función Lambda llamada '{function_name}' en la configuración.")
+            raise ValueError(f"No se encontró una función Lambda llamada '{function_name}' en el archivo de configuración.")
+        return function_arn
+
+    @staticmethod
+    def _prepare(payload):
+        """
+        Copia el payload y le agrega un ID único para trazabilidad (se conserva el existente,
+        que es el id de la traza del evento).
+        """
+        payload_with_id = dict(payload) if isinstance(payload, dict) else {"data": payload}
+        payload_with_id.setdefault("id", str(uuid.uuid4()))
+        return payload_with_id
+
+    @staticmethod
+    def _decode(result):
+        try:
+            return json.loads(result) if result else None
+        except ValueError:
+            return result.decode("utf-8", errors="replace")
 
-    def invoke_function(self, function_name, payload):
+    def invoke_function(self, function_name, payload, wait=True):
         """
         Invoca una función Lambda localmente en Greengrass.
 
         :param function_name: Nombre de la función Lambda definida en la configuración.
         :param payload: Datos en formato JSON para enviar a la función Lambda.
-        :return: Respuesta de la función Lambda.
+        :param wait: Si es False, la invocación es asíncrona (Event) y no se espera respuesta; el
+                     payload se descarta si no hay una ranura libre en `event_timeout` segundos.
+        :return: Respuesta de la función Lambda (decodificada de JSON) o None con `wait=False`.
         """
         if not self.enable_greengrass:
             self.logger.warning("Greengrass está deshabilitado. Invocación omitida.")
             return None
 
-        # Buscar la ARN de la función por su nombre
-        function_arn = None
-        for function in self.functions:
-            if function['name'] == function_name:
-                function_arn = function['arn']
-                break
-
-        if not function_arn:
-            self.logger.error(f"No se encontró una función Lambda llamada '{function_name}' en la configuración.")
-            raise ValueError(f"No se encontró una función Lambda llamada '{function_name}' en el archivo de configuración.")
-
-        # Agregar ID único al payload para trazabilidad
-        payload_with_id = payload.copy() if isinstance(payload, dict) else {"data": payload}
-        payload_with_id["id"] = str(uuid.uuid4())
+        function_arn = self._resolve(function_name)
+        payload_with_id = self._prepare(payload)
+        if not wait:
+            if not self._invoke_async(function_name, function_arn, _encode(payload_with_id), 1, self.event_timeout):
+                self.dropped.inc()
+                self.logger.warning(f"Invocaciones de Greengrass saturadas. Payload para '{function_name}' descartado.")
+            return None
 
         # Invocar la función Lambda en Greengrass
         try:
-            response = self.lambda_client.invoke(
-                FunctionName=function_arn,
-                InvocationType='RequestResponse',
-                Payload=str(payload_with_id)
-            )
-            result = response['Payload'].read()
-            self.logger.info(f"Respuesta de la función Lambda '{function_name}': {result}")
+            with self._slots, self.invoke_time.time():
+                response = self.lambda_client.invoke(
+                    FunctionName=function_arn,
+                    InvocationType='RequestResponse',
+                    Payload=_encode(payload_with_id)
+                )
+                raw = response['Payload'].read()
+            self.invocations.inc()
+            result = self._decode(raw)
+            if response.get("FunctionError"):
+                self.errors.inc()
+                self.logger.error(f"La función Lambda '{function_name}' devolvió un error: {result}")
+            else:
+                self.invoked.inc()
+                self.logger.info(f"Respuesta de la función Lambda '{function_name}': {result}")
 
             # Publicar el evento en MQTT si está habilitado
             if self.mqtt_handler and self.mqtt_handler.is_connected():
@@ -85,5 +182,127 @@ class GreengrassManager:
 
             return result
         except Exception as e:
+            self.errors.inc()
             self.logger.error(f"Error al invocar la función Lambda '{function_name}': {e}")
             raise
+
+    def submit(self, function_name, payload):
+        """
+        Encola un payload para una invocación asíncrona (Event) agrupada con los demás
+        payloads de la misma función. No espera a la red.
+
+        :return: False si el payload se descartó (Greengrass deshabilitado o cola llena).
+        """
+        if not self.enable_greengrass:
+            return False
+        self._resolve(function_name)
+        if not self._pipeline_started:
+            with self._pipeline_lock:
+                if not self._pipeline_started:
+                    self.pipeline.start()
+                    self._pipeline_started = True
+        if not self.pipeline.enqueue(function_name, self._prepare(payload), 0):
+            self.dropped.inc()
+            return False
+        return True
+
+    def _batches(self, messages):
+        """
+        Serializa los mensajes en cuerpos `{"batch": [...]}` de hasta `max_batch_bytes`.
+
+        :return: Generador de tuplas (cuerpo JSON, número de payloads).
+        """
+        overhead = len('{"batch":[]}')
+        parts, size = [], overhead
+        for message in messages:
+            part = _encode(message)
+            if parts and size + len(part) + 1 > self.max_batch_bytes:
+                yield '{"batch":[' + ",".join(parts) + "]}", len(parts)
+                parts, size = [], overhead
+            parts.append(part)
+            size += len(part) + 1
+        if parts:
+            yield '{"batch":[' + ",".join(parts) + "]}", len(parts)
+
+    def _send_batch(self, function_name, messages, qos):
+        """
+        Envía un lote de la cola (hilo emisor de PublishPipeline).
+        """
+        function_arn = self._resolve(function_name)
+        if function_name in self._batch_functions:
+            for body, count in self._batches(messages):
+                self._invoke_async(function_name, function_arn, body, count)
+        else:
+            for message in messages:
+                self._invoke_async(function_name, function_arn, _encode(message), 1)
+
+    def _invoke_async(self, function_name, function_arn, body, count, timeout=None):
+        """
+        Lanza una invocación Event en el pool; espera una ranura si ya hay `max_concurrency` en curso.
+
+        :param timeout: Espera máxima por una ranura en segundos (None: sin límite).
+        :return: False si no se obtuvo una ranura a tiempo.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            return False
+        try:
+            future = self._executor.submit(self._invoke_event, function_name, function_arn, body, count)
+        except RuntimeError:
+            self._slots.release()   # El pool ya se cerró
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return True
+
+    def _invoke_event(self, function_name, function_arn, body, count):
+        try:
+            with self.invoke_time.time():
+                response = self.lambda_client.invoke(FunctionName=function_arn, InvocationType='Event', Payload=body)
+                response['Payload'].read()  # Consumir el cuerpo (vacío) devuelve la conexión al pool
+            self.invocations.inc()
+            if response.get("StatusCode") != 202:
+                raise RuntimeError(f"código de estado {response.get('StatusCode')}")
+            self.invoked.inc(count)
+        except Exception as e:
+            self.errors.inc(count)
+            self.logger.error(f"Error en la invocación asíncrona de '{function_name}' ({count} payloads): {e}")
+
+    def flush(self, timeout=5.0):
+        """
+        Espera a que se envíen los payloads encolados y terminen las invocaciones en curso.
+
+        :return: True si todo se completó antes del tiempo límite.
+        """
+        deadline = time.monotonic() + timeout
+        if not self.pipeline.flush(timeout):
+            return False
+        acquired = 0
+        try:
+            while acquired < self.max_concurrency:
+                if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                    return False
+                acquired += 1
+            return True
+        finally:
+            for _ in range(acquired):
+                self._slots.release()
+
+    def get_stats(self):
+        """
+        Devuelve los contadores de la cola y de las invocaciones.
+        """
+        return {
+            "queue": self.pipeline.get_stats(),
+            "invocations": self.invocations.value(),
+            "payloads_invoked": self.invoked.value(),
+            "payloads_failed": self.errors.value(),
+            "payloads_dropped": self.dropped.value(),
+            "invoke_ms": self.invoke_time.snapshot(),
+        }
+
+    def close(self, timeout=5.0):
+        """
+        Envía los payloads pendientes y cierra el pool de invocaciones.
+        """
+        self.pipeline.stop(timeout)
+        self.flush(timeout)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,219 @@
+# health_probe.py - Sondeo paralelo de conectividad por interfaz con conexiones TCP no bloqueantes y estadísticas EWMA.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+"""
+Sondeo de salud de los enlaces sin crear procesos.
+
+Cada ronda inicia a la vez una conexión TCP no bloqueante hacia cada objetivo (brokers,
+puerta de enlace, `ping_host`) desde cada interfaz y espera a todas con un solo `select`
+(o con el bucle de asyncio). El tiempo hasta el SYN-ACK es el RTT; un RST (conexión
+rechazada) también demuestra que el host es alcanzable. Las conexiones se cierran de
+inmediato, antes de cualquier intercambio de datos.
+
+Se usan conexiones TCP en lugar de ICMP porque los sockets ICMP crudos requieren
+privilegios de root (CAP_NET_RAW) en la Raspberry Pi.
+"""
+
+import asyncio
+import errno
+import selectors
+import socket
+import time
+from dataclasses import dataclass
+
+# Errores de connect que prueban que el host respondió
+REACHABLE_ERRORS = {0, errno.ECONNREFUSED}
+
+
+@dataclass(frozen=True)
+class ProbeTarget:
+    name: str
+    host: str
+    port: int
+
+
+class LinkStats:
+    """
+    Estadísticas EWMA de un enlace (interfaz): RTT de los sondeos exitosos y proporción de pérdidas.
+
+    La pérdida se promedia por objetivo y la del enlace es la del mejor objetivo: un host
+    caído (p. ej. `ping_host` sin salida a Internet) no degrada el enlace mientras otro
+    objetivo responda, pero si el enlace falla todos los objetivos pierden a la vez.
+    """
+
+    def __init__(self, alpha=0.3):
+        """
+        :param alpha: Peso de la ronda más reciente (0-1). Mayor alpha reacciona más rápido.
+        """
+        self.alpha = alpha
+        self.rtt_ms = None
+        self.target_loss = []
+        self.rounds = 0
+        self.consecutive_failures = 0
+        self.last_success = None
+
+    @property
+    def loss(self):
+        return min(self.target_loss) if self.target_loss else 0.0
+
+    def update(self, results):
+        """
+        Incorpora una ronda de sondeos.
+
+        :param results: Lista de RTT en ms por objetivo (None para los sondeos perdidos).
+        """
+        if not results:
+            return
+        if len(self.target_loss) != len(results):
+            self.target_loss = [0.0 if rtt is not None else 1.0 for rtt in results]
+        else:
+            self.target_loss = [self.alpha * (rtt is None) + (1 - self.alpha) * loss
+                                for rtt, loss in zip(results, self.target_loss)]
+        rtts = [rtt for rtt in results if rtt is not None]
+        if rtts:
+            rtt = min(rtts)     # El objetivo más cercano representa la latencia del enlace
+            self.rtt_ms = rtt if self.rtt_ms is None else self.alpha * rtt + (1 - self.alpha) * self.rtt_ms
+            self.consecutive_failures = 0
+            self.last_success = time.monotonic()
+        else:
+            self.consecutive_failures += 1
+        self.rounds += 1
+
+    def as_dict(self):
+        return {
+            "rtt_ms": round(self.rtt_ms, 2) if self.rtt_ms is not None else None,
+            "loss": round(self.loss, 3),
+            "rounds": self.rounds,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class HealthProber:
+    """
+    Sondea en paralelo todos los objetivos desde todas las interfaces.
+    """
+
+    def __init__(self, interfaces, targets, timeout=0.3, reachable_errors=REACHABLE_ERRORS):
+        """
+        :param interfaces: Diccionario {nombre: {"device": "eth0", "ip": "192.168.1.145", "gateway": ...}}.
+            Con `ip` el socket se enlaza a esa dirección de origen (y a `device` con SO_BINDTODEVICE
+            si hay permisos), de modo que cada interfaz se mide por separado.
+        :param targets: Lista de ProbeTarget comunes a todas las interfaces.
+        :param timeout: Segundos máximos de espera por ronda.
+        :param reachable_errors: Resultados de connect que cuentan como éxito. Con `{0}` una
+            conexión rechazada es una falla (el servicio, no solo el host, debe responder).
+        """
+        self.interfaces = interfaces
+        self.targets = list(targets)
+        self.timeout = timeout
+        self.reachable_errors = reachable_errors
+        self.bind_errors = {}
+
+    def targets_for(self, interface):
+        """
+        Objetivos de una interfaz: los comunes más su puerta de enlace.
+        """
+        settings = self.interfaces[interface]
+        targets = list(self.targets)
+        if settings.get("gateway"):
+            targets.append(ProbeTarget("gateway", settings["gateway"], settings.get("gateway_port", 53)))
+        return targets
+
+    def _open(self, interface, target):
+        """
+        Inicia una conexión no bloqueante. Devuelve el socket o None si no se pudo iniciar.
+        """
+        settings = self.interfaces[interface]
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            if settings.get("device") and hasattr(socket, "SO_BINDTODEVICE"):
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, settings["device"].encode())
+                except PermissionError:
+                    pass    # Sin CAP_NET_RAW basta el enlace por dirección de origen
+            if settings.get("ip"):
+                sock.bind((settings["ip"], 0))
+            code = sock.connect_ex((target.host, target.port))
+        except OSError as e:
+            self.bind_errors[interface] = str(e)
+            sock.close()
+            return None
+        if code not in (0, errno.EINPROGRESS, errno.ECONNREFUSED):
+            sock.close()
+            return None
+        return sock
+
+    def _finish(self, sock, started, finished):
+        """
+        Cierra un sondeo terminado y devuelve su RTT en ms o None si falló.
+        """
+        try:
+            code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            return (finished - started) * 1000 if code in self.reachable_errors else None
+        finally:
+            sock.close()
+
+    def _start_round(self):
+        """
+        Inicia todos los sondeos de una ronda.
+
+        :return: Tupla (resultados inicializados en None, lista de (interfaz, índice, socket), instante de inicio).
+        """
+        started = time.perf_counter()
+        results = {interface: [None] * len(self.targets_for(interface)) for interface in self.interfaces}
+        pending = []
+        for interface in self.interfaces:
+            for index, target in enumerate(self.targets_for(interface)):
+                sock = self._open(interface, target)
+                if sock is not None:
+                    pending.append((interface, index, sock))
+        return results, pending, started
+
+    def probe_all(self):
+        """
+        Ejecuta una ronda de sondeos (bloquea como máximo `timeout` segundos).
+
+        :return: Diccionario {interfaz: [rtt_ms o None por objetivo]}.
+        """
+        results, pending, started = self._start_round()
+        with selectors.DefaultSelector() as selector:
+            for interface, index, sock in pending:
+                selector.register(sock, selectors.EVENT_WRITE, (interface, index))
+            deadline = started + self.timeout
+            while selector.get_map():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                events = selector.select(remaining)
+                finished = time.perf_counter()
+                for key, _ in events:
+                    selector.unregister(key.fileobj)
+                    interface, index = key.data
+                    results[interface][index] = self._finish(key.fileobj, started, finished)
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+        return results
+
+    async def probe_all_async(self):
+        """
+        Igual que `probe_all` pero espera los sockets desde el bucle de asyncio (sin hilos).
+        """
+        loop = asyncio.get_running_loop()
+        results, pending, started = self._start_round()
+        futures = []
+        for interface, index, sock in pending:
+            future = loop.create_future()
+            loop.add_writer(sock, lambda future=future: future.done() or future.set_result(time.perf_counter()))
+            futures.append((interface, index, sock, future))
+        if futures:
+            await asyncio.wait([future for *_, future in futures], timeout=self.timeout)
+        for interface, index, sock, future in futures:
+            loop.remove_writer(sock)
+            if future.done():
+                results[interface][index] = self._finish(sock, started, future.result())
+            else:
+                sock.close()
+        return results
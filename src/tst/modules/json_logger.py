@@ -3,10 +3,9 @@
 # Copyright (c) 2024
 # Proyecto: Smart Recycling Bin
 
-import os
-import json
 from datetime import datetime
 import uuid
+from modules.jsonl_writer import JSONLinesWriter
 
 class JSONLogger:
     """
@@ -25,6 +24,7 @@ class JSONLogger:
         self.config_manager = config_manager
         self.mqtt_handler = mqtt_handler
         self.enable_logging = self.config_manager.get("system.enable_json_logging", True)
+        self.publish_records = self.config_manager.get("logging.json_publish_mqtt", True)
         self.logger = LoggingManager(config_manager).setup_logger("[JSON_LOGGER]")
 
     def log_data(self, data, file_path_key="logging.json_file"):
@@ -40,16 +40,11 @@ class JSONLogger:
 
         try:
             file_path = self.config_manager.get(file_path_key, "logs/data.json")
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-            with open(file_path, "a") as json_file:
-                json.dump(data, json_file)
-                json_file.write("\n")
-
-            self.logger.info(f"Datos registrados exitosamente en {file_path}.")
+            # Escritor compartido con JSONManager: un archivo abierto y un búfer por ruta
+            JSONLinesWriter.from_config(self.config_manager, file_path, logger=self.logger).write(data)
 
             # Publicar datos mediante MQTT si está habilitado
-            if self.mqtt_handler and self.mqtt_handler.is_connected():
+            if self.publish_records and self.mqtt_handler and self.mqtt_handler.is_connected():
                 self.mqtt_handler.publish("data/json", data)
         except Exception as e:
             self.logger.error(f"Error registrando datos en JSON: {e}")
@@ -4,9 +4,11 @@
 # Proyecto: Smart Recycling Bin
 
 import os
-import json
 from datetime import datetime
 import uuid
+from modules.wire_codec import encode_payload
+from modules.jsonl_writer import JSONLinesWriter
+from modules.jsonl_reader import JSONLinesReader
 
 class JSONManager:
     """
@@ -25,9 +27,16 @@ class JSONManager:
         self.config_manager = config_manager
         self.mqtt_handler = mqtt_handler
         self.enable_logging = self.config_manager.get("system.enable_json_logging", True)
+        self.publish_records = self.config_manager.get("logging.json_publish_mqtt", True)
         self.logger = LoggingManager(config_manager).setup_logger("[JSON_MANAGER]")
 
-    def generate_json(self, sensor_id, channel, spectral_data, detected_material, confidence):
+    def _writer(self, file_path):
+        """
+        Devuelve el escritor JSON-lines compartido del archivo (se abre una sola vez).
+        """
+        return JSONLinesWriter.from_config(self.config_manager, file_path, logger=self.logger)
+
+    def generate_json(self, sensor_id, channel, spectral_data, detected_material, confidence, binary=False):
         """
         Genera un objeto JSON para representar los datos de medición.
 
@@ -36,14 +45,16 @@ class JSONManager:
         :param spectral_data: Diccionario con valores espectrales.
         :param detected_material: Material identificado.
         :param confidence: Nivel de confianza en la clasificación.
-        :return: Diccionario JSON con un ID único.
+        :param binary: Si es True devuelve el registro codificado con `wire_codec` (float32, id de 16 bytes),
+                       o su JSON en bytes si no tiene representación binaria sin pérdida.
+        :return: Diccionario JSON con un ID único (o bytes si `binary` es True).
         """
         if not self.enable_logging:
             self.logger.warning("El registro de datos JSON está deshabilitado.")
             return None
 
         self.logger.info("Generando JSON con los datos de medición.")
-        return {
+        record = {
             "id": str(uuid.uuid4()),
             "timestamp": datetime.now().isoformat(),
             "sensor_id": sensor_id,
@@ -52,6 +63,11 @@ class JSONManager:
             "detected_material": detected_material,
             "confidence": confidence
         }
+        if not binary:
+            return record
+        payload = encode_payload(record)
+        # El respaldo JSON también va en bytes: MQTTHandler publica los bytes tal cual y envolvería un str
+        return payload.encode("utf-8") if isinstance(payload, str) else payload
 
     def save_json(self, data, file_path_key="logging.json_file"):
         """
@@ -64,44 +80,60 @@ class JSONManager:
             self.logger.warning("El registro de datos JSON está deshabilitado. Guardado omitido.")
             return
 
+        file_path = self.config_manager.get(file_path_key, "logs/data.json")
         try:
-            file_path = self.config_manager.get(file_path_key, "logs/data.json")
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)  # Crear el directorio si no existe
-
-            with open(file_path, "a") as file:
-                file.write(json.dumps(data) + "\n")
-
-            self.logger.info(f"Datos guardados en {file_path}.")
+            # El registro queda en el búfer del escritor; se escribe por tamaño o tiempo
+            self._writer(file_path).write(data)
 
             # Publicar datos mediante MQTT si está habilitado
-            if self.mqtt_handler and self.mqtt_handler.is_connected():
+            if self.publish_records and self.mqtt_handler and self.mqtt_handler.is_connected():
                 self.mqtt_handler.publish("data/json", data)
         except Exception as e:
             self.logger.error(f"Error guardando datos en {file_path}: {e}")
 
-    def load_json(self, file_path_key="logging.json_file"):
+    def iter_json(self, file_path_key="logging.json_file", start=None, end=None, event_types=None, event_key="event"):
         """
-        Carga datos JSON desde un archivo.
+        Recorre los registros de un archivo JSON-lines sin cargarlo completo en memoria.
+
+        El índice de timestamps del archivo permite saltar directamente al inicio de la ventana.
+        Los segmentos rotados (`archivo.N`, `archivo.AAAA-MM-DD`) se leen antes que el archivo vivo.
 
         :param file_path_key: Clave en la configuración para obtener la ruta del archivo.
-        :return: Lista de objetos JSON.
+        :param start: Inicio de la ventana (datetime, texto ISO o epoch).
+        :param end: Fin de la ventana (inclusive).
+        :param event_types: Valores aceptados del campo `event_key`.
+        :param event_key: Campo que identifica el tipo de registro.
+        :return: Generador de objetos JSON.
         """
         if not self.enable_logging:
-            self.logger.warning("El registro de datos JSON está deshabilitado. Carga omitida.")
-            return []
+            self.logger.warning("El registro de datos JSON está deshabilitado. Lectura omitida.")
+            return
 
-        try:
-            file_path = self.config_manager.get(file_path_key, "logs/data.json")
+        file_path = self.config_manager.get(file_path_key, "logs/data.json")
+        reader = JSONLinesReader(file_path, use_mmap=self.config_manager.get("logging.json_reader.use_mmap", True))
+        if not reader.segments():
+            self.logger.warning(f"El archivo {file_path} no existe.")
+            return
 
-            if not os.path.exists(file_path):
-                self.logger.warning(f"El archivo {file_path} no existe.")
-                return []
+        if os.path.exists(file_path):
+            self._writer(file_path).flush()     # Incluir los registros aún en el búfer
+        yield from reader.iter_records(start=start, end=end, event_types=event_types, event_key=event_key)
+
+    def load_json(self, file_path_key="logging.json_file", start=None, end=None, event_types=None, event_key="event"):
+        """
+        Carga datos JSON desde un archivo. Para archivos grandes se recomienda `iter_json` o una ventana de tiempo.
 
-            with open(file_path, "r") as file:
-                self.logger.info(f"Cargando datos desde {file_path}.")
-                return [json.loads(line) for line in file.readlines()]
+        :param file_path_key: Clave en la configuración para obtener la ruta del archivo.
+        :param start: Inicio de la ventana (datetime, texto ISO o epoch).
+        :param end: Fin de la ventana (inclusive).
+        :param event_types: Valores aceptados del campo `event_key`.
+        :param event_key: Campo que identifica el tipo de registro.
+        :return: Lista de objetos JSON.
+        """
+        try:
+            return list(self.iter_json(file_path_key, start, end, event_types, event_key))
         except Exception as e:
-            self.logger.error(f"Error cargando datos desde {file_path}: {e}")
+            self.logger.error(f"Error cargando datos desde {file_path_key}: {e}")
             return []
 
     def clean_json(self, file_path_key="logging.json_file"):
@@ -118,8 +150,7 @@ class JSONManager:
             file_path = self.config_manager.get(file_path_key, "logs/data.json")
 
             if os.path.exists(file_path):
-                with open(file_path, "w") as file:
-                    file.truncate(0)
+                self._writer(file_path).truncate()
                 self.logger.info(f"El archivo {file_path} ha sido limpiado.")
             else:
                 self.logger.warning(f"El archivo {file_path} no existe.")
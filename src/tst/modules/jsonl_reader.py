@@ -0,0 +1,249 @@
+# jsonl_reader.py - Lectura en flujo de archivos JSON-lines con índice de desplazamientos por timestamp.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+"""
+Lectura de los registros JSON-lines de JSONManager/JSONLogger en memoria acotada.
+
+Junto a cada archivo de datos existe un índice disperso `archivo.idx`: entradas de tamaño
+fijo (timestamp epoch f64, desplazamiento en bytes u64) agregadas por JSONLinesWriter cada
+`index_stride` registros. Como los registros se agregan en orden cronológico, el lector
+busca en el índice (búsqueda binaria sobre el archivo mapeado en memoria) el último
+desplazamiento anterior al inicio de la ventana solicitada y lee desde ahí, deteniéndose
+al pasar el final de la ventana.
+
+Los segmentos rotados por JSONLinesWriter (`archivo.N` por tamaño, `archivo.AAAA-MM-DD[.n]`
+por fecha) se recorren antes que el archivo vivo, del más antiguo al más reciente; los que
+quedan completamente fuera de la ventana se omiten leyendo solo su primera y última línea.
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+from datetime import datetime
+
+INDEX_ENTRY = struct.Struct(">dQ")
+INDEX_SUFFIX = ".idx"
+# Sufijos de rotación de JSONLinesWriter: `.N` (tamaño) y `.AAAA-MM-DD[.n]` (fecha)
+SEGMENT_SUFFIX = re.compile(r"\.(\d+|\d{4}-\d{2}-\d{2}(\.\d+)?)$")
+
+
+def index_path(path):
+    """
+    Devuelve la ruta del índice de un archivo de datos.
+    """
+    return path + INDEX_SUFFIX
+
+
+def to_epoch(value):
+    """
+    Convierte un timestamp ISO, datetime o número a segundos epoch. Devuelve None si no es válido.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class JSONLinesReader:
+    """
+    Lector en flujo de un archivo JSON-lines.
+
+    Los métodos devuelven generadores: solo el registro actual está en memoria. Con
+    `use_mmap` el archivo se recorre mapeado en memoria (sin copias a búferes de Python);
+    el sistema operativo mantiene en caché solo las páginas que se visitan.
+    """
+
+    def __init__(self, path, use_mmap=True, timestamp_key="timestamp"):
+        """
+        :param path: Ruta del archivo JSON-lines.
+        :param use_mmap: Si es True el archivo se lee mapeado en memoria.
+        :param timestamp_key: Campo con el timestamp ISO de cada registro.
+        """
+        self.path = path
+        self.index_path = index_path(path)
+        self.use_mmap = use_mmap
+        self.timestamp_key = timestamp_key
+
+    def segments(self):
+        """
+        Devuelve los segmentos rotados del archivo, del más antiguo al más reciente, seguidos
+        del archivo vivo (si existe).
+
+        Los segmentos se ordenan por fecha de modificación: renombrar no la cambia, y cada
+        segmento dejó de escribirse antes de que se abriera el siguiente.
+        """
+        directory = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(self.path)
+        rotated = []
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            names = []
+        for name in names:
+            if name.startswith(prefix) and SEGMENT_SUFFIX.fullmatch(name[len(prefix):]):
+                path = os.path.join(directory, name)
+                try:
+                    rotated.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue        # Rotado o eliminado mientras se listaba
+        rotated.sort()
+        paths = [path for _, path in rotated]
+        if os.path.exists(self.path):
+            paths.append(self.path)
+        return paths
+
+    def _bounds(self, path):
+        """
+        Devuelve el timestamp del primer y del último registro de un segmento (None si no se pueden leer).
+        """
+        try:
+            with open(path, "rb") as file:
+                size = os.fstat(file.fileno()).st_size
+                if not size:
+                    return None, None
+                with mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ) as data:
+                    first_end = data.find(b"\n")
+                    last_start = data.rfind(b"\n", 0, size - 1) + 1
+                    first = json.loads(data[:first_end if first_end >= 0 else size])
+                    last = json.loads(data[last_start:size])
+            return first.get(self.timestamp_key), last.get(self.timestamp_key)
+        except (OSError, ValueError, AttributeError):
+            return None, None
+
+    def _seek_offset(self, start_epoch, file_size, path=None):
+        """
+        Busca en el índice el desplazamiento del último registro indexado anterior a `start_epoch`.
+        """
+        index_file = index_path(path) if path is not None else self.index_path
+        if start_epoch is None or not os.path.exists(index_file):
+            return 0
+        size = os.path.getsize(index_file)
+        count = size // INDEX_ENTRY.size
+        if not count:
+            return 0
+        with open(index_file, "rb") as file, mmap.mmap(file.fileno(), count * INDEX_ENTRY.size, access=mmap.ACCESS_READ) as index:
+            low, high = 0, count
+            while low < high:
+                middle = (low + high) // 2
+                if INDEX_ENTRY.unpack_from(index, middle * INDEX_ENTRY.size)[0] < start_epoch:
+                    low = middle + 1
+                else:
+                    high = middle
+            if low == 0:
+                return 0
+            offset = INDEX_ENTRY.unpack_from(index, (low - 1) * INDEX_ENTRY.size)[1]
+        # Un índice de un archivo ya truncado o rotado no es válido
+        return offset if offset <= file_size else 0
+
+    def _lines(self, offset, path=None):
+        """
+        Genera las líneas completas del archivo (o del segmento `path`) a partir de `offset`.
+        """
+        with open(path or self.path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if offset >= size:
+                return
+            if not self.use_mmap:
+                file.seek(offset)
+                for line in file:
+                    if line.endswith(b"\n"):
+                        yield line
+                return
+            with mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ) as data:
+                position = offset
+                while position < size:
+                    end = data.find(b"\n", position)
+                    if end < 0:
+                        return      # Línea incompleta (el escritor todavía no la termina)
+                    yield data[position:end]
+                    position = end + 1
+
+    def iter_records(self, start=None, end=None, event_types=None, event_key="event"):
+        """
+        Genera los registros dentro de una ventana de tiempo y, opcionalmente, de ciertos tipos.
+        Incluye los segmentos rotados, en orden cronológico, antes del archivo vivo.
+
+        :param start: Inicio de la ventana (datetime, texto ISO o epoch). None desde el inicio del archivo.
+        :param end: Fin de la ventana (inclusive). None hasta el final del archivo.
+        :param event_types: Valores aceptados de `event_key` (p. ej. {"material_detectado"}).
+        :param event_key: Campo que identifica el tipo de registro ("event", "detected_material", ...).
+        """
+        # Límites y registros se comparan en segundos epoch: los registros pueden traer texto ISO o `time.time()`
+        start_epoch = to_epoch(start) if start is not None else None
+        end_epoch = to_epoch(end) if end is not None else None
+        if (start is not None and start_epoch is None) or (end is not None and end_epoch is None):
+            raise ValueError(f"Límite de ventana inválido: {start if start_epoch is None else end}")
+        event_types = set(event_types) if event_types else None
+
+        for path in self.segments():
+            if path != self.path and (start_epoch is not None or end_epoch is not None):
+                first, last = (to_epoch(bound) for bound in self._bounds(path))
+                if start_epoch is not None and last is not None and last < start_epoch:
+                    continue        # El segmento termina antes de la ventana
+                if end_epoch is not None and first is not None and first > end_epoch:
+                    return          # Este segmento y los siguientes empiezan después de la ventana
+            try:
+                passed_end = yield from self._iter_file(path, start_epoch, end_epoch, event_types, event_key)
+            except FileNotFoundError:
+                continue            # El segmento rotó (o se eliminó) después de listarlo
+            if passed_end:
+                return
+
+    def _iter_file(self, path, start_epoch, end_epoch, event_types, event_key):
+        """
+        Genera los registros de un segmento dentro de la ventana.
+
+        :return: True si se encontró un registro posterior al fin de la ventana.
+        """
+        offset = self._seek_offset(start_epoch, os.path.getsize(path), path)
+        for line in self._lines(offset, path):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if start_epoch is not None or end_epoch is not None:
+                epoch = to_epoch(record.get(self.timestamp_key)) if isinstance(record, dict) else None
+                if epoch is None:
+                    continue
+                if start_epoch is not None and epoch < start_epoch:
+                    continue
+                if end_epoch is not None and epoch > end_epoch:
+                    return True     # Los registros se agregan en orden cronológico
+            if event_types is not None and (not isinstance(record, dict) or record.get(event_key) not in event_types):
+                continue
+            yield record
+        return False
+
+    def build_index(self, stride=32):
+        """
+        Reconstruye el índice recorriendo el archivo completo (archivos escritos sin JSONLinesWriter).
+
+        :param stride: Registros entre entradas del índice.
+        :return: Número de entradas escritas.
+        """
+        entries = 0
+        temporary = self.index_path + ".tmp"
+        with open(temporary, "wb") as index:
+            offset = 0
+            count = 0
+            for line in self._lines(0):
+                if count % stride == 0:
+                    try:
+                        epoch = to_epoch(json.loads(line).get(self.timestamp_key))
+                    except (ValueError, AttributeError):
+                        epoch = None
+                    if epoch is not None:
+                        index.write(INDEX_ENTRY.pack(epoch, offset))
+                        entries += 1
+                count += 1
+                offset += len(line) + (0 if line.endswith(b"\n") else 1)
+        os.replace(temporary, self.index_path)
+        return entries
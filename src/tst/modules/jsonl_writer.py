@@ -0,0 +1,311 @@
+# jsonl_writer.py - Escritor JSON-lines con búfer, descarga por umbrales y rotación por tamaño y fecha.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import date
+from modules.jsonl_reader import INDEX_ENTRY, index_path, to_epoch
+
+
+class JSONLinesWriter:
+    """
+    Escritor de larga duración para archivos JSON-lines (un objeto JSON por línea).
+
+    `write` serializa el registro y lo agrega a un búfer en memoria; el archivo se mantiene
+    abierto y el búfer se escribe con una sola llamada cuando supera `flush_bytes` o cuando
+    pasan `flush_interval` segundos (hilo de descarga). La durabilidad se controla con
+    `fsync_policy`:
+    - "none": el sistema operativo decide cuándo llegar a la SD.
+    - "interval": `os.fsync` como máximo cada `fsync_interval` segundos.
+    - "each": descarga y `os.fsync` en cada registro (el comportamiento más seguro y más lento).
+
+    El archivo rota cuando supera `max_bytes` (respaldos `archivo.1` ... `archivo.N`) y, si
+    `rotate_daily` es True, al cambiar la fecha (`archivo.AAAA-MM-DD`). Una misma instancia
+    se comparte entre hilos y entre componentes mediante `for_path`.
+
+    Cada `index_stride` registros se agrega una entrada (timestamp, desplazamiento) al índice
+    `archivo.idx` que usa JSONLinesReader para saltar directamente a una ventana de tiempo.
+    """
+
+    FSYNC_POLICIES = ("none", "interval", "each")
+
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, path, flush_bytes=65536, flush_interval=1.0, fsync_policy="interval", fsync_interval=5.0,
+                 max_bytes=5 * 1024 * 1024, backup_count=5, rotate_daily=False, index_stride=32, logger=None):
+        """
+        :param path: Ruta del archivo JSON-lines.
+        :param flush_bytes: Bytes en el búfer que provocan una escritura inmediata.
+        :param flush_interval: Segundos máximos que un registro permanece en el búfer.
+        :param fsync_policy: "none", "interval" o "each".
+        :param fsync_interval: Segundos entre llamadas a fsync con la política "interval".
+        :param max_bytes: Tamaño máximo del archivo antes de rotar (0 deshabilita la rotación por tamaño).
+        :param backup_count: Número de respaldos por tamaño que se conservan.
+        :param rotate_daily: Si es True el archivo rota al cambiar la fecha.
+        :param index_stride: Registros entre entradas del índice de timestamps (0 lo deshabilita).
+        :param logger: Logger del componente que usa el escritor.
+        """
+        if fsync_policy not in self.FSYNC_POLICIES:
+            raise ValueError(f"Política de fsync inválida: {fsync_policy}")
+
+        self.path = os.path.abspath(path)
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotate_daily = rotate_daily
+        self.index_stride = index_stride
+        self.index_path = index_path(self.path)
+        self.logger = logger
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._pending_index = []        # (posición en el búfer, timestamp) de los registros a indexar
+        self._file = None
+        self._index_file = None
+        self._file_size = 0
+        self._file_date = None
+        self._last_fsync = time.monotonic()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        self.records = 0
+        self.flushes = 0
+        self.fsyncs = 0
+        self.rotations = 0
+        self.errors = 0
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._open()
+        if self.flush_interval and self.fsync_policy != "each":
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def for_path(cls, path, **options):
+        """
+        Devuelve el escritor compartido de un archivo, creándolo con `options` si no existe.
+        """
+        key = os.path.abspath(path)
+        with cls._registry_lock:
+            writer = cls._registry.get(key)
+            if writer is None or writer.closed:
+                writer = cls._registry[key] = cls(path, **options)
+            return writer
+
+    @classmethod
+    def from_config(cls, config_manager, path, logger=None):
+        """
+        Devuelve el escritor compartido de un archivo usando la sección `logging.json_writer`.
+
+        :param config_manager: Instancia de ConfigManager.
+        :param path: Ruta del archivo JSON-lines.
+        :param logger: Logger del componente que usa el escritor.
+        """
+        return cls.for_path(
+            path,
+            flush_bytes=config_manager.get("logging.json_writer.flush_bytes", 65536),
+            flush_interval=config_manager.get("logging.json_writer.flush_interval", 1.0),
+            fsync_policy=config_manager.get("logging.json_writer.fsync", "interval"),
+            fsync_interval=config_manager.get("logging.json_writer.fsync_interval", 5.0),
+            max_bytes=int(config_manager.get("logging.json_writer.max_size_mb", 5) * 1024 * 1024),
+            backup_count=config_manager.get("logging.json_writer.backup_count", 5),
+            rotate_daily=config_manager.get("logging.json_writer.rotate_daily", False),
+            index_stride=config_manager.get("logging.json_writer.index_stride", 32),
+            logger=logger
+        )
+
+    @classmethod
+    def close_all(cls):
+        """
+        Descarga y cierra todos los escritores compartidos.
+        """
+        with cls._registry_lock:
+            writers = list(cls._registry.values())
+            cls._registry.clear()
+        for writer in writers:
+            writer.close()
+
+    @property
+    def closed(self):
+        return self._file is None
+
+    def _open(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._file_size = self._file.tell()
+        self._file_date = date.fromtimestamp(os.path.getmtime(self.path)) if self._file_size else date.today()
+        if self.index_stride:
+            self._index_file = open(self.index_path, "ab")
+
+    def _close_files(self):
+        self._file.close()
+        self._file = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+
+    def _move(self, source, target):
+        """
+        Renombra un archivo de datos junto con su índice.
+        """
+        os.replace(source, target)
+        if os.path.exists(index_path(source)):
+            os.replace(index_path(source), index_path(target))
+
+    def _rotate(self, suffix=None):
+        """
+        Cierra el archivo actual, lo renombra y abre uno nuevo. Se llama con el candado tomado.
+
+        :param suffix: Sufijo de fecha para la rotación diaria; None para la rotación por tamaño.
+        """
+        self._close_files()
+        if suffix is not None:
+            target = f"{self.path}.{suffix}"
+            index = 1
+            while os.path.exists(target):
+                target = f"{self.path}.{suffix}.{index}"
+                index += 1
+            self._move(self.path, target)
+        elif self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    self._move(source, f"{self.path}.{index + 1}")
+            self._move(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+        self.rotations += 1
+        self._open()
+
+    def _flush_locked(self, force_fsync=False):
+        """
+        Escribe el búfer en el archivo con una sola llamada. Se llama con el candado tomado.
+        """
+        if self._buffer:
+            if self.rotate_daily and date.today() != self._file_date and self._file_size:
+                self._rotate(self._file_date.isoformat())
+            if self.max_bytes and self._file_size and self._file_size + self._buffered_bytes > self.max_bytes:
+                self._rotate()
+
+            data = "".join(self._buffer)
+            self._buffer = []
+            self._buffered_bytes = 0
+            self._file.write(data)
+            self._file.flush()
+            if self._pending_index:
+                entries = []
+                for position, timestamp in self._pending_index:
+                    epoch = to_epoch(timestamp)
+                    if epoch is not None:
+                        entries.append(INDEX_ENTRY.pack(epoch, self._file_size + position))
+                self._pending_index = []
+                self._index_file.write(b"".join(entries))
+                self._index_file.flush()
+            # json.dumps escapa todo lo que no es ASCII: caracteres y bytes coinciden
+            self._file_size += len(data)
+            self.flushes += 1
+
+        now = time.monotonic()
+        if force_fsync or self.fsync_policy == "each" or (
+                self.fsync_policy == "interval" and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+            self.fsyncs += 1
+
+    def write(self, record):
+        """
+        Agrega un registro al búfer.
+
+        :param record: Objeto serializable a JSON.
+        """
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                raise ValueError(f"El escritor de {self.path} está cerrado.")
+            if self.index_stride and self.records % self.index_stride == 0 and isinstance(record, dict) \
+                    and "timestamp" in record:
+                self._pending_index.append((self._buffered_bytes, record["timestamp"]))
+            self._buffer.append(line)
+            self._buffered_bytes += len(line)
+            self.records += 1
+            if self._buffered_bytes >= self.flush_bytes or self.fsync_policy == "each":
+                self._flush_locked()
+
+    def flush(self, fsync=False):
+        """
+        Escribe los registros pendientes en el archivo.
+
+        :param fsync: Si es True fuerza `os.fsync` sin importar la política.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._flush_locked(force_fsync=fsync)
+
+    def truncate(self):
+        """
+        Descarta los registros pendientes y vacía el archivo.
+        """
+        with self._lock:
+            self._buffer = []
+            self._buffered_bytes = 0
+            self._pending_index = []
+            if self._file is not None:
+                self._file.truncate(0)
+                self._file.seek(0)
+                self._file_size = 0
+            if self._index_file is not None:
+                self._index_file.truncate(0)
+
+    def _run(self):
+        """
+        Hilo de descarga periódica.
+        """
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.errors += 1
+                if self.logger:
+                    self.logger.error(f"Error descargando registros en {self.path}: {e}")
+
+    def close(self):
+        """
+        Descarga el búfer, sincroniza el archivo y lo cierra.
+        """
+        self._stop_event.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._file is None:
+                return
+            self._flush_locked(force_fsync=self.fsync_policy != "none")
+            self._close_files()
+
+    def get_stats(self):
+        """
+        Devuelve los contadores del escritor.
+        """
+        return {
+            "path": self.path,
+            "records": self.records,
+            "pending_bytes": self._buffered_bytes,
+            "flushes": self.flushes,
+            "fsyncs": self.fsyncs,
+            "rotations": self.rotations,
+            "errors": self.errors,
+        }
+
+
+atexit.register(JSONLinesWriter.close_all)
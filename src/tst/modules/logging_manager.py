@@ -5,8 +5,14 @@
 
 import sys
 import os
+import atexit
+import collections
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime
 
 
@@ -29,11 +35,173 @@ class CustomFormatter(logging.Formatter):
             s = f"{t}.{int(record.msecs):03d}"
             return s
 
+class DropOldestQueue:
+    """
+    Cola acotada para registros de logging que nunca bloquea al productor.
+
+    Los registros DEBUG/INFO y los WARNING o superiores van en colas separadas, numerados
+    para entregarlos en el orden original; así cada descarte es O(1). Con la cola llena se
+    descarta el registro DEBUG/INFO más antiguo para hacer espacio. Si no hay ninguno, un
+    registro DEBUG/INFO nuevo se descarta y un WARNING o superior reemplaza al WARNING más
+    antiguo: `maxsize` es un límite estricto y los errores solo se pierden si la cola
+    completa está llena de ellos. La marca de fin del QueueListener (None) nunca se descarta.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._low = collections.deque()         # (secuencia, registro) DEBUG/INFO
+        self._high = collections.deque()        # (secuencia, registro) WARNING+ y la marca de fin
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self.dropped = collections.Counter()    # Nivel -> registros descartados
+
+    def put_nowait(self, record):
+        with self._condition:
+            low_priority = record is not None and record.levelno <= logging.INFO
+            if record is not None and len(self._low) + len(self._high) >= self.maxsize:
+                if self._low:
+                    self.dropped[self._low.popleft()[1].levelname] += 1
+                elif low_priority:
+                    self.dropped[record.levelname] += 1
+                    return
+                elif self._high[0][1] is not None:
+                    self.dropped[self._high.popleft()[1].levelname] += 1
+            self._sequence += 1
+            (self._low if low_priority else self._high).append((self._sequence, record))
+            self._condition.notify()
+
+    put = put_nowait
+
+    def _has_records(self):
+        return bool(self._low or self._high)
+
+    def get(self, block=True, timeout=None):
+        with self._condition:
+            if not block:
+                if not self._has_records():
+                    raise queue.Empty
+            elif not self._condition.wait_for(self._has_records, timeout):
+                raise queue.Empty
+            # El registro más antiguo de las dos colas
+            if not self._high or (self._low and self._low[0][0] < self._high[0][0]):
+                return self._low.popleft()[1]
+            return self._high.popleft()[1]
+
+    def qsize(self):
+        return len(self._low) + len(self._high)
+
+
+class _StructuredMessage:
+    """
+    Mensaje estructurado que solo se formatea cuando un handler lo necesita.
+    Los valores que son funciones (p. ej. `payload=lambda: json.dumps(msg)`) se evalúan en ese momento.
+    """
+
+    __slots__ = ("event", "fields", "fmt")
+
+    def __init__(self, event, fields, fmt):
+        self.event = event
+        self.fields = fields
+        self.fmt = fmt
+
+    def __str__(self):
+        fields = {key: (value() if callable(value) else value) for key, value in self.fields.items()}
+        if self.fmt == "json":
+            return json.dumps({"event": self.event, **fields}, default=str, separators=(",", ":"))
+        parts = [self.event]
+        for key, value in fields.items():
+            text = str(value)
+            if not text or " " in text or "=" in text:
+                text = json.dumps(text)
+            parts.append(f"{key}={text}")
+        return " ".join(parts)
+
+
+class StructuredLogger:
+    """
+    Registro estructurado para rutas críticas (callbacks MQTT, lazos de sensores).
+
+    - Si el nivel está deshabilitado la llamada regresa sin construir ningún texto.
+    - `sample=N` registra 1 de cada N llamadas del mismo punto (`event` o `site`); el
+      registro incluye `sampled=N` para poder reconstruir los conteos.
+    - `every=s` registra como máximo una vez cada `s` segundos por punto; el siguiente
+      registro emitido incluye `suppressed=k`.
+    - El mensaje se emite como `evento clave=valor ...` o como JSON compacto.
+    - Con `detail=True` se ignoran el muestreo y el límite de tasa (diagnóstico bajo demanda).
+    """
+
+    def __init__(self, logger, fmt="kv", detail=False):
+        """
+        :param logger: Logger estándar que emite los registros.
+        :param fmt: Formato de salida ("kv" o "json").
+        :param detail: Si es True se registran todas las llamadas.
+        """
+        self.logger = logger
+        self.fmt = fmt
+        self.detail = detail
+        self._counters = {}         # Punto -> llamadas vistas (muestreo)
+        self._last_emit = {}        # Punto -> (instante de la última emisión, suprimidos)
+
+    def log(self, level, event, site=None, sample=None, every=None, **fields):
+        """
+        Registra un evento estructurado.
+
+        :param level: Nivel de logging.
+        :param event: Nombre corto del evento (p. ej. "mqtt.publish").
+        :param site: Identificador del punto de llamada para muestreo/límite (por defecto `event`).
+        :param sample: Registrar 1 de cada `sample` llamadas.
+        :param every: Intervalo mínimo en segundos entre registros del mismo punto.
+        :param fields: Campos del registro; los valores pueden ser funciones para evaluación diferida.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        site = site or event
+
+        if not self.detail:
+            if sample and sample > 1:
+                count = self._counters.get(site, 0)
+                self._counters[site] = count + 1
+                if count % sample:
+                    return
+                fields["sampled"] = sample
+            if every:
+                now = time.monotonic()
+                last, suppressed = self._last_emit.get(site, (None, 0))
+                if last is not None and now - last < every:
+                    self._last_emit[site] = (last, suppressed + 1)
+                    return
+                self._last_emit[site] = (now, 0)
+                if suppressed:
+                    fields["suppressed"] = suppressed
+
+        self.logger.log(level, _StructuredMessage(event, fields, self.fmt))
+
+    def debug(self, event, **kwargs):
+        self.log(logging.DEBUG, event, **kwargs)
+
+    def info(self, event, **kwargs):
+        self.log(logging.INFO, event, **kwargs)
+
+    def warning(self, event, **kwargs):
+        self.log(logging.WARNING, event, **kwargs)
+
+    def error(self, event, **kwargs):
+        self.log(logging.ERROR, event, **kwargs)
+
+
 class LoggingManager:
     """
     Clase para configurar loggers centralizados y rotativos para diferentes módulos del sistema.
+
+    Con `logging.async_mode` los loggers solo agregan el registro a una cola acotada
+    (QueueHandler) y un único hilo (QueueListener) es dueño de los handlers de archivo
+    y consola, por lo que las rutas críticas no esperan escrituras en la tarjeta SD.
     """
 
+    _async_lock = threading.Lock()
+    _async_queue = None
+    _async_listener = None
+
     def __init__(self, config_manager):
         """
         Inicializa el manejador de logging con configuraciones centralizadas.
@@ -58,7 +226,32 @@ class LoggingManager:
         # Evitar configurar múltiples veces el mismo logger
         if logger.hasHandlers():
             return logger
-        
+
+        if self.config_manager.get('logging.async_mode', False):
+            logger.addHandler(QueueHandler(self._get_async_queue()))
+            return logger
+
+        for handler in self._build_handlers():
+            logger.addHandler(handler)
+        return logger
+
+    def setup_structured_logger(self, module_name):
+        """
+        Configura un logger para el módulo y lo envuelve en un StructuredLogger para rutas críticas.
+
+        :param module_name: Nombre del módulo (__name__).
+        :return: Instancia de StructuredLogger.
+        """
+        return StructuredLogger(
+            self.setup_logger(module_name),
+            fmt=self.config_manager.get('logging.structured_format', 'kv'),
+            detail=self.config_manager.get('logging.structured_detail', False)
+        )
+
+    def _build_handlers(self):
+        """
+        Crea los handlers de archivo rotativo, consola y errores.
+        """
         # Formato del log
         log_format = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
         date_format = "%Y-%m-%d %H:%M:%S"
@@ -74,18 +267,56 @@ class LoggingManager:
 
         file_handler = RotatingFileHandler(log_file, maxBytes=max_log_size, backupCount=backup_count)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
 
         # Configurar salida de consola
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
 
         # Configurar archivo para errores
         error_log_file = os.path.expanduser(self.config_manager.get('logging.error_log_file', 'logs/error.log'))
         error_handler = logging.FileHandler(error_log_file)
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(formatter)
-        logger.addHandler(error_handler)
 
-        return logger
\ No newline at end of file
+        return [file_handler, console_handler, error_handler]
+
+    def _get_async_queue(self):
+        """
+        Crea (una sola vez por proceso) la cola compartida y el QueueListener dueño de los handlers.
+        """
+        with LoggingManager._async_lock:
+            if LoggingManager._async_queue is None:
+                log_queue = DropOldestQueue(self.config_manager.get('logging.queue_size', 10000))
+                listener = QueueListener(log_queue, *self._build_handlers(), respect_handler_level=True)
+                listener.start()
+                LoggingManager._async_queue = log_queue
+                LoggingManager._async_listener = listener
+                atexit.register(LoggingManager.shutdown)
+            return LoggingManager._async_queue
+
+    @classmethod
+    def get_queue_stats(cls):
+        """
+        Devuelve la profundidad de la cola asíncrona y los registros descartados por nivel.
+        """
+        if cls._async_queue is None:
+            return {"async": False}
+        return {
+            "async": True,
+            "queue_depth": cls._async_queue.qsize(),
+            "dropped": dict(cls._async_queue.dropped),
+            "dropped_total": sum(cls._async_queue.dropped.values()),
+        }
+
+    @classmethod
+    def shutdown(cls):
+        """
+        Escribe los registros pendientes y detiene el hilo de logging asíncrono.
+        """
+        with cls._async_lock:
+            if cls._async_listener is not None:
+                cls._async_listener.stop()
+                for handler in cls._async_listener.handlers:
+                    handler.close()
+                cls._async_listener = None
+                cls._async_queue = None
\ No newline at end of file
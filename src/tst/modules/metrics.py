@@ -0,0 +1,428 @@
+# metrics.py - Registro de métricas (contadores, medidores e histogramas) con exportación Prometheus y resumen MQTT.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Shard:
+    """
+    Acumuladores de un hilo. Solo el hilo dueño escribe; los lectores suman todos los shards.
+    """
+
+    __slots__ = ("counts", "count", "total", "max", "owner")
+
+    def __init__(self, buckets=0, owner=None):
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.owner = owner
+
+    def merged(self, other):
+        """
+        Devuelve un shard nuevo con la suma de este y `other` (ninguno de los dos se modifica).
+        """
+        result = _Shard(len(self.counts))
+        result.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        result.count = self.count + other.count
+        result.total = self.total + other.total
+        result.max = max(self.max, other.max)
+        return result
+
+
+class _Metric:
+    """
+    Base de las métricas: cada hilo escribe en su propio shard, por lo que el camino
+    caliente (inc/observe) no toma ningún candado. El candado solo se usa la primera vez
+    que un hilo escribe en la métrica y al leerla.
+
+    Los shards de hilos terminados se suman a `_retired` y se eliminan de la lista, de modo
+    que los hilos de vida corta (p. ej. un hilo por mensaje) no la hacen crecer sin límite.
+    """
+
+    kind = None
+
+    def __init__(self, name, help_text="", labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = dict(labels or {})
+        self._local = threading.local()
+        self._shards = []
+        self._retired = None            # Suma de los shards de hilos terminados
+        self._lock = threading.Lock()
+
+    def _new_shard(self, owner=None):
+        return _Shard(owner=owner)
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = self._new_shard(threading.current_thread())
+            with self._lock:
+                self._prune_locked()
+                self._shards.append(shard)
+        return shard
+
+    def _prune_locked(self):
+        """
+        Suma los shards de hilos terminados a `_retired` y los elimina. Requiere `_lock`.
+        El hilo dueño ya no escribe en ellos, así que la suma es definitiva.
+        """
+        live = []
+        retired = self._retired
+        for shard in self._shards:
+            if shard.owner.is_alive():
+                live.append(shard)
+            else:
+                retired = shard if retired is None else retired.merged(shard)
+        if len(live) != len(self._shards):
+            # Se reemplazan las referencias (no se modifican en sitio) para los lectores en curso
+            self._retired = retired
+            self._shards = live
+
+    def _all_shards(self):
+        """
+        Devuelve los shards a sumar en una lectura: los de hilos vivos y el acumulado de los terminados.
+        """
+        with self._lock:
+            self._prune_locked()
+            return self._shards + [self._retired] if self._retired is not None else list(self._shards)
+
+
+class Counter(_Metric):
+    """
+    Contador monotónico.
+    """
+
+    kind = "counter"
+
+    def inc(self, amount=1):
+        self._shard().count += amount
+
+    def value(self):
+        return sum(shard.count for shard in self._all_shards())
+
+
+class Gauge:
+    """
+    Medidor de un valor instantáneo. Con `set_function` el valor se calcula al exportar
+    (p. ej. la profundidad de una cola) sin costo en el camino caliente.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text="", labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = dict(labels or {})
+        self._value = 0.0
+        self._function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        self._function = function
+
+    def value(self):
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception:
+                return float("nan")
+        return self._value
+
+
+class _Timer:
+    """
+    Mide la duración de un bloque `with` en milisegundos.
+    """
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe((time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class Histogram(_Metric):
+    """
+    Histograma de cubetas logarítmicas (estilo HDR).
+
+    Cada potencia de 2 entre `lowest` y `highest` se divide en `sub_buckets` cubetas, de
+    modo que el error relativo de los percentiles es constante (~4 % con 16 sub-cubetas)
+    y la memoria es fija sin importar cuántas observaciones se registren.
+    """
+
+    kind = "histogram"
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, name, help_text="", labels=None, lowest=0.001, highest=3600000.0, sub_buckets=16):
+        """
+        :param lowest: Valor mínimo distinguible (por defecto 1 µs si la unidad es ms).
+        :param highest: Valor máximo registrado; los mayores caen en la última cubeta.
+        :param sub_buckets: Cubetas por potencia de 2.
+        """
+        super().__init__(name, help_text, labels)
+        self.lowest = lowest
+        self.sub_buckets = sub_buckets
+        self.buckets = int(math.ceil(math.log2(highest / lowest) * sub_buckets)) + 2
+        self._scale = sub_buckets / math.log(2)
+
+    def _new_shard(self, owner=None):
+        return _Shard(self.buckets, owner)
+
+    def _index(self, value):
+        if value <= self.lowest:
+            return 0
+        return min(int(math.log(value / self.lowest) * self._scale) + 1, self.buckets - 1)
+
+    def _bucket_value(self, index):
+        """
+        Valor representativo de una cubeta (media geométrica de sus límites).
+        """
+        if index == 0:
+            return self.lowest
+        return self.lowest * 2 ** ((index - 0.5) / self.sub_buckets)
+
+    def observe(self, value):
+        shard = self._shard()
+        shard.counts[self._index(value)] += 1
+        shard.count += 1
+        shard.total += value
+        if value > shard.max:
+            shard.max = value
+
+    def time(self):
+        """
+        Context manager que registra la duración del bloque en milisegundos.
+        """
+        return _Timer(self)
+
+    def snapshot(self):
+        """
+        Devuelve conteo, suma, máximo y percentiles combinando todos los hilos.
+        """
+        shards = self._all_shards()
+        counts = [0] * self.buckets
+        count = total = 0
+        maximum = 0.0
+        for shard in shards:
+            for index, value in enumerate(shard.counts):
+                if value:
+                    counts[index] += value
+            count += shard.count
+            total += shard.total
+            maximum = max(maximum, shard.max)
+
+        result = {"count": count, "sum": total, "max": maximum}
+        targets = [(quantile, quantile * count) for quantile in self.QUANTILES]
+        cumulative = 0
+        position = 0
+        for index, value in enumerate(counts):
+            if not value:
+                continue
+            cumulative += value
+            while position < len(targets) and cumulative >= targets[position][1]:
+                result[f"p{int(targets[position][0] * 100)}"] = min(self._bucket_value(index), maximum)
+                position += 1
+        for quantile, _ in targets[position:]:
+            result[f"p{int(quantile * 100)}"] = 0.0 if not count else maximum
+        return result
+
+
+def _format_labels(labels, extra=None):
+    items = dict(labels)
+    if extra:
+        items.update(extra)
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"')) for key, value in items.items())
+    return "{" + body + "}"
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas de un proceso. `MetricsRegistry.default()` devuelve la instancia
+    compartida que usan los módulos (MQTTHandler, planificadores, controladores de relés).
+    """
+
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._server_thread = None
+        self._reporter_stop = threading.Event()
+        self._reporter_thread = None
+
+    @classmethod
+    def default(cls):
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    def _get(self, factory, name, help_text, labels, **options):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = factory(name, help_text, labels, **options)
+        if not isinstance(metric, factory):
+            raise ValueError(f"La métrica {name} ya existe con otro tipo.")
+        return metric
+
+    def counter(self, name, help_text="", labels=None):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", labels=None):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text="", labels=None, **options):
+        return self._get(Histogram, name, help_text, labels, **options)
+
+    def summary(self):
+        """
+        Devuelve un diccionario compacto con el valor de cada métrica (para MQTT o logs).
+        """
+        result = {}
+        for (name, _), metric in sorted(self._metrics.items(), key=lambda item: item[0]):
+            key = name + _format_labels(metric.labels)
+            if isinstance(metric, Histogram):
+                snapshot = metric.snapshot()
+                result[key] = {field: round(value, 3) if isinstance(value, float) else value
+                               for field, value in snapshot.items() if field != "sum"}
+            else:
+                result[key] = round(metric.value(), 3)
+        return result
+
+    def render_prometheus(self):
+        """
+        Genera el formato de texto de Prometheus. Los histogramas se exportan como `summary`.
+        """
+        lines = []
+        described = set()
+        for (name, _), metric in sorted(self._metrics.items(), key=lambda item: item[0]):
+            if name not in described:
+                described.add(name)
+                kind = "summary" if isinstance(metric, Histogram) else metric.kind
+                if metric.help:
+                    lines.append(f"# HELP {name} {metric.help}")
+                lines.append(f"# TYPE {name} {kind}")
+            if isinstance(metric, Histogram):
+                snapshot = metric.snapshot()
+                for quantile in Histogram.QUANTILES:
+                    labels = _format_labels(metric.labels, {"quantile": quantile})
+                    lines.append(f"{name}{labels} {snapshot[f'p{int(quantile * 100)}']}")
+                lines.append(f"{name}_sum{_format_labels(metric.labels)} {snapshot['sum']}")
+                lines.append(f"{name}_count{_format_labels(metric.labels)} {snapshot['count']}")
+            else:
+                lines.append(f"{name}{_format_labels(metric.labels)} {metric.value()}")
+        return "\n".join(lines) + "\n"
+
+    def start_http_server(self, port=9108, host="127.0.0.1"):
+        """
+        Sirve `/metrics` en formato Prometheus desde un hilo propio.
+        """
+        if self._server is not None:
+            return
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass    # Las consultas periódicas no deben llenar los logs
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._server_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._server_thread.start()
+
+    def start_mqtt_reporter(self, mqtt_handler, topic, interval=60):
+        """
+        Publica `summary()` en un tópico MQTT cada `interval` segundos.
+        """
+        if self._reporter_thread and self._reporter_thread.is_alive():
+            return
+        self._reporter_stop.clear()
+
+        def run():
+            while not self._reporter_stop.wait(interval):
+                try:
+                    if mqtt_handler.is_connected():
+                        mqtt_handler.publish(topic, {"timestamp": time.time(), "metrics": self.summary()})
+                except Exception:
+                    pass
+        self._reporter_thread = threading.Thread(target=run, daemon=True)
+        self._reporter_thread.start()
+
+    def start_exporters(self, config_manager, mqtt_handler=None):
+        """
+        Inicia los exportadores según la sección `metrics` de la configuración.
+
+        Si el puerto HTTP no está disponible se registra el error y se continúa sin el
+        servidor: las métricas nunca deben impedir que el proceso arranque.
+
+        :param config_manager: Instancia de ConfigManager.
+        :param mqtt_handler: Instancia opcional de MQTTHandler para el resumen periódico.
+        """
+        from modules.logging_manager import LoggingManager
+
+        if not config_manager.get("metrics.enabled", True):
+            return
+        if config_manager.get("metrics.http_enabled", True):
+            port = config_manager.get("metrics.port", 9108)
+            host = config_manager.get("metrics.host", "127.0.0.1")
+            try:
+                self.start_http_server(port, host)
+            except OSError as e:
+                LoggingManager(config_manager).setup_logger("[METRICS]").error(
+                    f"No se pudo iniciar el servidor de métricas en {host}:{port}: {e}. Se continúa sin exportación HTTP.")
+        if mqtt_handler is not None and config_manager.get("metrics.summary_interval", 60):
+            self.start_mqtt_reporter(mqtt_handler, config_manager.get("metrics.summary_topic", "metrics/summary"),
+                                     config_manager.get("metrics.summary_interval", 60))
+
+    def stop_exporters(self):
+        self._reporter_stop.set()
+        if self._reporter_thread:
+            self._reporter_thread.join(timeout=1)
+            self._reporter_thread = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -11,29 +11,111 @@ import json
 import os
 import sys
 import logging
+import threading
 from modules.logging_manager import LoggingManager
 from modules.config_manager import ConfigManager
+from modules.publish_pipeline import PublishPipeline
+from modules.mqtt_outbox import MQTTOutbox
+from modules.wire_codec import encode_payload, decode_payload, CodecError
+from modules.metrics import MetricsRegistry
+from modules.trace_context import TRACE_KEY, hop
+from modules.broker_pool import BrokerPool, Backoff
+from modules.topic_router import TopicRouter, INLINE
+
 class MQTTHandler:
     def __init__(self, config_manager):
         self.config_manager = config_manager
         self.config = self.config_manager.get("mqtt", {})
+        self.logger = LoggingManager(self.config_manager).setup_logger("[MQTT_HANDLER]")
+        self.hot_log = LoggingManager(self.config_manager).setup_structured_logger("[MQTT_HANDLER]")
         self.broker_addresses = self._normalize_brokers()
         self.client_id = self.config.get("client_id", "DefaultClient")
         self.port = self.config.get("port", 1883)
-        self.keepalive = self.config.get("keepalive", 60)
+        self.keepalive = self.config.get("keepalive", self.config.get("keep_alive", 60))
         self.topics = self.config.get("topics", {})
         self.auto_reconnect = self.config.get("auto_reconnect", True)  
-        self.logger = LoggingManager(self.config_manager).setup_logger("[MQTT_HANDLER]")
+        self.log_sample = self.config.get("log_sample", 100)     # Registrar 1 de cada N mensajes en rutas críticas
 
         if not self.broker_addresses:
             self.logger.critical("[MQTT] No se configuraron brokers en el archivo de configuración.")
             raise ValueError("No se configuraron brokers en el archivo de configuración.")
 
+        # Conmutación por falla: brokers ordenados por RTT medido y conexión de reserva al segundo más rápido
+        failover_config = self.config.get("failover", {})
+        self.pool = BrokerPool.from_config(self.config, self.broker_addresses)
+        self.standby_enabled = failover_config.get("standby", True) and len(self.broker_addresses) > 1
+        self.probe_interval = failover_config.get("probe_interval", 5.0)
+        self.backoff = Backoff(failover_config.get("backoff_min", 0.5), failover_config.get("backoff_max", 30.0))
+        self.primary_id = self.client_id
+        self.standby_id = f"{self.client_id}-standby"
+        self.current_broker = None
+        self.standby = None
+        self.standby_broker = None
+        self._disconnected_at = None
+        self._wake = threading.Event()
+        self._supervisor = None
+
         # Inicializa el cliente MQTT
-        self.client = mqtt.Client(client_id=self.client_id)
-        self.client.on_connect = self.on_connect
-        self.client.on_disconnect = self.on_disconnect
-        self.client.on_message = self.on_message
+        self.client = self._new_client(self.primary_id)
+
+        # Bandeja de salida persistente para los mensajes que no se pudieron publicar
+        outbox_config = self.config.get("outbox", {})
+        self.outbox = None
+        self._replay_thread = None
+        self._replay_lock = threading.Lock()
+        self._replaying = False
+        self._closing = False
+        self.replay_ack_timeout = outbox_config.get("ack_timeout", 5.0)
+        if outbox_config.get("enabled", True):
+            self.outbox = MQTTOutbox(
+                outbox_config.get("path", "~/logs/mqtt_outbox.db"),
+                max_bytes=outbox_config.get("max_size_mb", 50) * 1024 * 1024,
+                eviction=outbox_config.get("eviction", "drop_oldest"),
+                replay_rate=outbox_config.get("replay_rate", 50),
+                logger=self.logger
+            )
+            if len(self.outbox):
+                self.logger.info(f"[OUTBOX] {len(self.outbox)} mensajes pendientes de una ejecución anterior.")
+
+        # Tabla de despacho de los mensajes recibidos (los manejadores lentos usan el pool de trabajadores)
+        self.router = TopicRouter.from_config(self.config_manager, self.logger)
+
+        # Tópicos que se publican en el formato binario compacto (los suscriptores aceptan ambos formatos)
+        self.binary_topics = set(self.config.get("codec", {}).get("binary_topics", []))
+
+        # Rastreo de extremo a extremo: salto `pub:<tópico>` en los tópicos de eventos de material
+        self.tracing = self.config_manager.get("tracing.enabled", True)
+        self.traced_topics = set(self.config_manager.get("tracing.topics", [
+            "material/entrada", "material/deteccion", "material/procesado", "material/pesaje"
+        ]))
+
+        # Métricas de publicación y recepción
+        metrics = MetricsRegistry.default()
+        self.publish_time = metrics.histogram("mqtt_publish_ms", "Serialización y envío de un paquete MQTT (ms)")
+        self.published_messages = metrics.counter("mqtt_messages_published_total", "Mensajes MQTT publicados")
+        self.dropped_messages = metrics.counter("mqtt_messages_dropped_total", "Mensajes descartados por la cola llena")
+        self.received_messages = metrics.counter("mqtt_messages_received_total", "Mensajes MQTT recibidos")
+        self.failover_time = metrics.histogram("mqtt_failover_ms", "Desde la pérdida del broker hasta volver a publicar (ms)")
+        self.failovers = metrics.counter("mqtt_failovers_total", "Cambios de broker por pérdida de conexión")
+
+        # Cola de publicación asíncrona: los lazos de sensores nunca esperan a la red
+        publish_config = self.config.get("publish", {})
+        self.async_publish = publish_config.get("async", True)
+        self.publisher = PublishPipeline(
+            self._send_batch,
+            queue_size=publish_config.get("queue_size", 1000),
+            batch_window=publish_config.get("batch_window", 0.02),
+            max_batch=publish_config.get("max_batch", 50),
+            batch_topics=publish_config.get("batch_topics", ["data/json"]),
+            qos0_policy=publish_config.get("qos0_policy", "drop_oldest"),
+            qos1_policy=publish_config.get("qos1_policy", "block"),
+            block_timeout=publish_config.get("block_timeout", 1.0),
+            logger=self.logger,
+            latency_histogram=metrics.histogram("mqtt_queue_latency_ms", "Espera en la cola de publicación (ms)")
+        )
+        metrics.gauge("mqtt_publish_queue_depth", "Mensajes en la cola de publicación").set_function(self.publisher.queue_depth)
+        if self.async_publish:
+            self.publisher.start()
 
         self.logger.info(f"Brokers configurados: {self.broker_addresses}")
         self.logger.info(f"Tópicos configurados: {self.topics}")
@@ -43,121 +125,473 @@ class MQTTHandler:
         """
         Valida y normaliza los brokers configurados.
         """
-        mqtt_config = self.config.get("mqtt", {})
-        if not mqtt_config:
+        if not self.config:
             raise ValueError("[MQTT] La configuración MQTT no está definida en config.yaml.")
 
-        broker_addresses = mqtt_config.get("broker_addresses")
+        broker_addresses = self.config.get("broker_addresses")
         if not broker_addresses:
             raise ValueError(f"[MQTT] broker_addresses no configurados en mqtt. Archivo de configuración: {self.config_manager.config_path}")
 
         if isinstance(broker_addresses, str):
-            logger.warning("[MQTT] broker_addresses era un string. Se convirtió a una lista.")
+            self.logger.warning("[MQTT] broker_addresses era un string. Se convirtió a una lista.")
             broker_addresses = [broker_addresses]
 
         if not isinstance(broker_addresses, list):
             raise ValueError(f"[MQTT] broker_addresses debe ser una lista. Tipo encontrado: {type(broker_addresses)} en {self.config_manager.config_path}")
 
         self.brokers = broker_addresses
-        logger.info(f"[MQTT] Brokers configurados: {self.brokers}")
+        self.logger.info(f"[MQTT] Brokers configurados: {self.brokers}")
+        return broker_addresses
 
+    def _new_client(self, client_id):
+        """
+        Crea un cliente paho con los callbacks del manejador.
+        """
+        client = mqtt.Client(client_id=client_id)
+        client.on_connect = self.on_connect
+        client.on_disconnect = self.on_disconnect
+        client.on_message = self.on_message
+        return client
 
     def connect_and_subscribe(self):
         """
-        Conecta al primer broker disponible y suscribe a los tópicos configurados.
+        Mide el RTT de todos los brokers en paralelo, conecta al sano más rápido y suscribe a
+        los tópicos configurados (al recibir el CONNACK). Con `mqtt.failover.standby` abre una
+        conexión de reserva al siguiente broker, e inicia el hilo supervisor que cambia de
+        broker al perder la conexión.
+        """
+        self.pool.measure()
+        self._connect_primary()
+        if self.standby_enabled:
+            self._connect_standby()
+        self._start_supervisor()
+
+    def _connect_primary(self, order=None):
+        """
+        Conecta el cliente principal al primer broker de `order` que acepte la conexión.
+
+        :param order: Brokers en orden de intento (por defecto, `pool.rank()`).
+        :return: El broker conectado.
         """
-        for broker in self.broker_addresses:
+        self.client.loop_stop()     # Detiene la reconexión interna de paho al broker anterior
+        for broker in order or self.pool.rank():
             try:
                 self.logger.info(f"Intentando conectar al broker {broker}:{self.port}...")
                 self.client.connect(broker, self.port, self.keepalive)
                 self.client.loop_start()
-                self._subscribe_to_topics()
+                self.current_broker = broker
                 self.logger.info(f"Conexión exitosa al broker {broker}.")
-                return
+                return broker
             except Exception as e:
                 self.logger.warning(f"No se pudo conectar al broker {broker}:{self.port}. Error: {e}")
 
         self.logger.critical("No se pudo conectar a ninguno de los brokers disponibles.")
         raise ConnectionError("No se pudo conectar a ningún broker MQTT.")
 
+    def standby_candidates(self):
+        """
+        Brokers aptos para la conexión de reserva: distintos del actual y que respondieron al sondeo.
+        """
+        return [broker for broker in self.pool.rank(exclude={self.current_broker}) if not self.pool.is_down(broker)]
+
+    def _connect_standby(self):
+        """
+        Abre la conexión de reserva (sin suscripciones, solo keepalive) al siguiente broker más rápido.
+        """
+        if self.standby is not None:
+            self._dispose(self.standby)
+            self.standby = self.standby_broker = None
+        for broker in self.standby_candidates():
+            client = self._new_client(self.standby_id)
+            try:
+                client.connect(broker, self.port, self.keepalive)
+                client.loop_start()
+                self.standby, self.standby_broker = client, broker
+                self.logger.info(f"[MQTT] Conexión de reserva abierta con el broker {broker}.")
+                return True
+            except Exception as e:
+                self.logger.warning(f"[MQTT] No se pudo abrir la conexión de reserva con {broker}:{self.port}. Error: {e}")
+        return False
+
+    @staticmethod
+    def _dispose(client):
+        """
+        Cierra un cliente que ya no se usa. Su callback de desconexión se ignora.
+        """
+        try:
+            client.disconnect()
+            client.loop_stop()
+        except Exception:
+            pass
+
+    def swap_to_standby(self):
+        """
+        Convierte la conexión de reserva en la principal. Los callbacks asignados desde fuera
+        al cliente anterior (p. ej. `on_message`) se copian al nuevo.
+
+        :return: El cliente anterior (aún sin cerrar), o None si no hay reserva conectada.
+        """
+        if self.standby is None or not self.standby.is_connected():
+            return None
+        previous = self.client
+        self.standby.on_message = previous.on_message
+        self.client, self.standby = self.standby, None
+        self.current_broker, self.standby_broker = self.standby_broker, None
+        self.primary_id, self.standby_id = self.standby_id, self.primary_id
+        return previous
+
+    def record_failover(self, started, previous_broker):
+        """
+        Registra la duración de un cambio de broker.
+
+        :param started: Instante (time.monotonic) en que se detectó la pérdida del broker.
+        :param previous_broker: Broker que se perdió.
+        """
+        elapsed = (time.monotonic() - started) * 1000
+        self.failover_time.observe(elapsed)
+        self.failovers.inc()
+        self._disconnected_at = None
+        self.logger.warning(f"[MQTT] Cambio de broker {previous_broker} → {self.current_broker} en {elapsed:.0f} ms.")
+
+    def _start_supervisor(self):
+        if not self.auto_reconnect or (self._supervisor and self._supervisor.is_alive()):
+            return
+        self._supervisor = threading.Thread(target=self._supervise, daemon=True)
+        self._supervisor.start()
+
+    def _supervise(self):
+        """
+        Hilo supervisor: cada `failover.probe_interval` segundos (o al perder la conexión) mide
+        los brokers, cambia de broker si el actual se perdió o dejó de responder al sondeo y
+        repone la conexión de reserva. Los reintentos fallidos esperan con `Backoff`.
+        """
+        delay = self.probe_interval or None
+        while not self._closing:
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._closing:
+                break
+            if self.probe_interval:
+                self.pool.measure()
+
+            lost = self._disconnected_at is not None or not self.client.is_connected()
+            if not lost and self.pool.is_down(self.current_broker):
+                self.logger.warning(f"[MQTT] El broker {self.current_broker} no responde al sondeo. Cambiando de broker...")
+                self._disconnected_at = time.monotonic()
+                lost = True
+            if lost and not self._fail_over():
+                delay = self.backoff.next()
+                continue
+            self.backoff.reset()
+
+            if self.standby_enabled and (self.standby is None or not self.standby.is_connected()):
+                self._connect_standby()
+            delay = self.probe_interval or None
+
+    def _fail_over(self):
+        """
+        Cambia al broker de reserva si está conectado; si no, conecta al broker sano más rápido.
+
+        :return: True si se recuperó la conexión.
+        """
+        started = self._disconnected_at or time.monotonic()
+        previous_broker = self.current_broker
+        previous = self.swap_to_standby()
+        if previous is not None:
+            self._subscribe_to_topics()
+            self._start_replay()
+            self.record_failover(started, previous_broker)
+            self._dispose(previous)     # Puede esperar a que termine el hilo de paho del cliente anterior
+            return True
+        try:
+            self._connect_primary(self.pool.rank(exclude={previous_broker}) + [previous_broker])
+        except ConnectionError:
+            return False
+        self.record_failover(started, previous_broker)
+        return True
+
     def _subscribe_to_topics(self):
         """
-        Suscribe al cliente MQTT a los tópicos configurados.
+        Suscribe al cliente MQTT a los filtros de las rutas registradas o, si no hay rutas, a
+        los tópicos configurados.
         """
-        if not self.topics:
+        subscriptions = self.router.subscriptions() or [(topic_path, 0) for topic_path in self.topics.values()]
+        if not subscriptions:
             self.logger.warning("No hay tópicos configurados para suscripción.")
             return
 
-        for topic_name, topic_path in self.topics.items():
+        for topic_path, qos in subscriptions:
             try:
-                self.client.subscribe(topic_path)
+                self.client.subscribe(topic_path, qos)
                 self.logger.info(f"Suscrito al tópico: {topic_path}")
             except Exception as e:
                 self.logger.error(f"Error al suscribirse al tópico {topic_path}: {e}")
 
+    def route(self, topic_filter, handler, mode=INLINE, qos=0):
+        """
+        Registra un manejador `handler(topic, message)` para un filtro de tópico (admite `+` y `#`).
+
+        :param mode: "inline" (en el hilo de red; no debe bloquear) o "pool" (pool de
+            trabajadores con orden por tópico; para relés, I2C o disco).
+        :return: La ruta creada.
+        """
+        route = self.router.add(topic_filter, handler, mode, qos)
+        if self.client.is_connected():
+            self.client.subscribe(topic_filter, qos)
+        return route
+
     def publish(self, topic, message, qos=0):
         """
-        Publica un mensaje en un tópico MQTT con un ID único para rastreo.
+        Publica un mensaje en un tópico MQTT. Se conserva el `id` del mensaje (es el id de la
+        traza del evento); solo los mensajes sin `id` reciben uno nuevo.
+
+        Con `mqtt.publish.async` (por defecto) el mensaje solo se agrega a la cola de
+        publicación y el envío ocurre en el hilo emisor.
+
+        :return: False si el mensaje fue descartado por la cola llena.
         """
+        if isinstance(message, dict):
+            message = dict(message)     # Copia: el llamador puede seguir modificando su diccionario
+
+        if self.async_publish:
+            if not self.publisher.enqueue(topic, message, qos):
+                self.dropped_messages.inc()
+                self.hot_log.warning("mqtt.publish.dropped", every=5, topic=topic, qos=qos,
+                                     dropped=lambda: self.publisher.dropped)
+                return False
+            return True
+
         try:
-            # Agregar un ID único al mensaje
+            self._send_batch(topic, [message], qos)
+            return True
+        except Exception as e:
+            self.logger.error(f"[MQTT] Error al publicar mensaje en {topic}: {e}")
+            return False
+
+    def _send_batch(self, topic, messages, qos):
+        """
+        Serializa y publica uno o varios mensajes de un mismo tópico.
+        Varios mensajes se publican como un arreglo (JSON o lote binario) en un solo paquete.
+        Los tópicos en `mqtt.codec.binary_topics` usan el formato binario de `wire_codec`.
+        """
+        with self.publish_time.time():
+            self._send_prepared(topic, messages, qos)
+        self.published_messages.inc(len(messages))
+
+    def _send_prepared(self, topic, messages, qos):
+        # Mensajes ya codificados (p. ej. JSONManager.generate_json(binary=True)) se publican tal cual
+        if any(isinstance(message, (bytes, bytearray)) for message in messages):
+            for message in messages:
+                self._deliver(topic, message if isinstance(message, (bytes, bytearray)) else json.dumps(message), qos)
+            return
+
+        # Conservar el id del evento (id de la traza) y asignar uno solo a los mensajes que no lo tienen
+        traced = self.tracing and topic in self.traced_topics
+        prepared = []
+        for message in messages:
             if isinstance(message, dict):
-                message["id"] = str(uuid.uuid4())
+                if "id" not in message:
+                    message["id"] = str(uuid.uuid4())
+                if traced:
+                    # Lista nueva: el llamador puede conservar la suya
+                    message[TRACE_KEY] = message.get(TRACE_KEY, []) + [hop(f"pub:{topic}")]
             else:
                 message = {"message": message, "id": str(uuid.uuid4())}
+            prepared.append(message)
 
-            # Publicar el mensaje
-            if not isinstance(message, str):
-                message = json.dumps(message)  # Convertir a JSON válido
-            self.client.publish(topic, message, qos=qos)
-            self.logger.info(f"[MQTT] Mensaje publicado en {topic}: {message}")
-        except Exception as e:
-            self.logger.error(f"[MQTT] Error al publicar mensaje en {topic}: {e}")
+        body = prepared[0] if len(prepared) == 1 else prepared
+        payload = encode_payload(body, binary=topic in self.binary_topics)
+        self._deliver(topic, payload, qos)
+        self.hot_log.debug("mqtt.publish", sample=self.log_sample, topic=topic, messages=len(prepared), bytes=len(payload))
+
+    def _deliver(self, topic, payload, qos):
+        """
+        Publica un paquete serializado o lo guarda en la bandeja de salida si no hay conexión.
+        Mientras la bandeja tenga mensajes pendientes los nuevos se encolan detrás para conservar el orden.
+        """
+        if self.outbox is not None and (len(self.outbox) or not self.client.is_connected()):
+            self._store(topic, payload, qos)
+            return
+
+        info = self.client.publish(topic, payload, qos=qos)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            if self.outbox is None:
+                raise ConnectionError(f"Publicación rechazada por el cliente MQTT (rc={info.rc}).")
+            self._store(topic, payload, qos)
+
+    def _store(self, topic, payload, qos):
+        """
+        Guarda un paquete en la bandeja de salida e inicia el reenvío si hay conexión.
+        """
+        if self.outbox.append(topic, payload, qos) is None:
+            self.logger.warning(f"[OUTBOX] Bandeja llena. Mensaje descartado en {topic}.")
+        if self.client.is_connected():
+            self._start_replay()
+
+    def _replay_send(self, topic, payload, qos):
+        """
+        Publica un mensaje de la bandeja. Con QoS > 0 espera la confirmación del broker.
+        """
+        if not self.client.is_connected():
+            return False
+        info = self.client.publish(topic, payload, qos=qos)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            return False
+        if qos > 0:
+            info.wait_for_publish(self.replay_ack_timeout)
+            return info.is_published()
+        return True
+
+    def _start_replay(self):
+        """
+        Inicia el hilo de reenvío de la bandeja de salida si no está activo.
+        """
+        if self.outbox is None or not len(self.outbox) or self._closing:
+            return
+        with self._replay_lock:
+            if self._replaying:
+                return
+            self._replaying = True
+            self._replay_thread = threading.Thread(target=self._replay, daemon=True)
+            self._replay_thread.start()
+
+    def _replay(self):
+        """
+        Hilo de reenvío. Solo el rezago presente al iniciar se limita a `replay_rate`; lo que
+        `_deliver` encola detrás mientras tanto sale sin límite.
+
+        La decisión de terminar se toma con `_replay_lock`, el mismo candado que revisa
+        `_start_replay`: un mensaje agregado después de la última lectura vacía lo ve este
+        hilo (y sigue) o lo ve `_start_replay` con el hilo ya marcado como terminado.
+        """
+        throttle_until = self.outbox.last_seq()
+        should_continue = lambda: not self._closing and self.client.is_connected()
+        while True:
+            sent = self.outbox.replay(self._replay_send, should_continue=should_continue, throttle_until=throttle_until)
+            with self._replay_lock:
+                if not len(self.outbox) or not should_continue():
+                    self._replaying = False
+                    return
+            if not sent:
+                time.sleep(0.5)     # El envío falla con conexión (cola de paho llena, sin ACK): no girar en vacío
+
+    def get_outbox_stats(self):
+        """
+        Devuelve los contadores de la bandeja de salida (pendientes, tamaño y tasa de reenvío).
+        """
+        return self.outbox.get_stats() if self.outbox else {}
+
+    def flush(self, timeout=5.0):
+        """
+        Espera a que se envíen los mensajes en la cola de publicación.
+        """
+        return self.publisher.flush(timeout)
+
+    def get_publish_stats(self):
+        """
+        Devuelve los contadores de la cola de publicación (profundidad, tasa y latencia).
+        """
+        return self.publisher.get_stats()
+
+    def stop_publisher(self, timeout=5.0):
+        """
+        Envía los mensajes pendientes y detiene el hilo emisor.
+        """
+        self.publisher.stop(timeout)
+        self.logger.info(f"[MQTT] Cola de publicación detenida. Estadísticas: {self.publisher.get_stats()}")
 
     def on_connect(self, client, userdata, flags, rc):
+        if client is not self.client:
+            if rc == 0:
+                self.logger.info("[MQTT] Conexión de reserva lista.")
+            return
         if rc == 0:
             self.logger.info("Conexión exitosa al broker MQTT.")
+            self._subscribe_to_topics()
+            self._start_replay()
         else:
             self.logger.error(f"Fallo al conectar al broker. Código: {rc}")
 
     def on_disconnect(self, client, userdata, rc):
         """
-        Maneja desconexiones del broker MQTT.
+        Maneja desconexiones del broker MQTT. No reconecta desde el hilo de paho: avisa al
+        hilo supervisor, que cambia a la conexión de reserva sin esperar ningún tiempo de espera.
         """
+        if self._closing or client is not self.client:
+            return      # Clientes de reserva o ya reemplazados: el supervisor los repone
         self.logger.warning("[MQTT] Desconectado del broker MQTT.")
+        if self._disconnected_at is None:
+            self._disconnected_at = time.monotonic()
         if self.auto_reconnect:
-            try:
-                self.logger.info("[MQTT] Intentando reconexión automática...")
-                self.connect_and_subscribe()
-            except Exception as e:
-                self.logger.error(f"[MQTT] Error en reconexión automática: {e}")
+            self._wake.set()
 
     def on_message(self, client, userdata, msg):
         """
-        Maneja mensajes recibidos en los tópicos suscritos.
+        Maneja mensajes recibidos en los tópicos suscritos: decodifica una sola vez y despacha
+        a las rutas registradas con `route`.
         """
         try:
-            payload = msg.payload.decode()
-            message = json.loads(payload)  # Usar json.loads en lugar de eval
-
-            # Extraer ID único
-            message_id = message.get("id", "Sin ID")
-            self.logger.info(f"[MQTT] Mensaje recibido en {msg.topic}: {message}. ID: {message_id}")
-
-            # Invocar callback personalizado
-            if userdata and hasattr(userdata, "on_message_received"):
-                userdata.on_message_received(message_id, msg.topic, message)
-        except json.JSONDecodeError as e:
-            self.logger.error(f"[MQTT] Error decodificando JSON: {e}")
+            decoded = decode_payload(msg.payload)  # JSON o formato binario
+
+            # Los mensajes agrupados por la cola de publicación llegan como un arreglo
+            for message in (decoded if isinstance(decoded, list) else [decoded]):
+                self.received_messages.inc()
+                # Extraer ID único
+                message_id = message.get("id", "Sin ID")
+                self.hot_log.debug("mqtt.received", sample=self.log_sample, topic=msg.topic, id=message_id,
+                                   payload=lambda: json.dumps(message, default=str))
+
+                if self.router.routes:
+                    self.router.dispatch(msg.topic, message)
+                # Invocar callback personalizado
+                elif userdata and hasattr(userdata, "on_message_received"):
+                    userdata.on_message_received(message_id, msg.topic, message)
+        except (json.JSONDecodeError, CodecError) as e:
+            self.logger.error(f"[MQTT] Error decodificando mensaje: {e}")
         except Exception as e:
             self.logger.error(f"[MQTT] Error procesando mensaje en {msg.topic}: {e}")
 
+    def disconnect(self, timeout=5.0):
+        """
+        Envía los mensajes pendientes de la cola de publicación y se desconecta del broker.
+        """
+        self.auto_reconnect = False
+        self.stop_publisher(timeout)
+        self._closing = True
+        self._wake.set()
+        if self._supervisor:
+            self._supervisor.join(timeout)
+        if self._replay_thread:
+            self._replay_thread.join(timeout)
+        self.router.stop(timeout)
+        if self.standby is not None:
+            self._dispose(self.standby)
+        try:
+            self.client.loop_stop()
+            self.client.disconnect()
+            self.logger.info("[MQTT] Desconectado del broker MQTT.")
+        except Exception as e:
+            self.logger.error(f"[MQTT] Error al desconectar: {e}")
+        if self.outbox:
+            self.logger.info(f"[OUTBOX] Bandeja cerrada. Estadísticas: {self.outbox.get_stats()}")
+            self.outbox.close()
+
     def is_connected(self):
         """
         Verifica si el cliente MQTT está conectado.
         """
         return self.client.is_connected()
 
+    def get_broker_stats(self):
+        """
+        Devuelve el broker actual, el de reserva y el RTT y la pérdida medidos de cada broker.
+        """
+        return {
+            "current": self.current_broker,
+            "standby": self.standby_broker if self.standby is not None and self.standby.is_connected() else None,
+            "brokers": self.pool.get_stats()
+        }
+
     def reconnect(self):
         """
         Intenta reconectar al broker MQTT.
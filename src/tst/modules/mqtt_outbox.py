@@ -0,0 +1,222 @@
+# mqtt_outbox.py - Bandeja de salida persistente (SQLite en modo WAL) para mensajes MQTT no enviados.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import os
+import sqlite3
+import threading
+import time
+
+
+class MQTTOutbox:
+    """
+    Almacena en disco los mensajes que no se pudieron publicar y los reenvía en orden.
+
+    Cada mensaje recibe un número de secuencia creciente (clave primaria de SQLite), por lo
+    que el reenvío respeta el orden original. La base de datos usa modo WAL con
+    `synchronous=FULL`: cada inserción es una escritura secuencial al WAL sincronizada a disco
+    al confirmarse, por lo que un mensaje aceptado sobrevive a un corte de energía. El costo
+    del fsync solo se paga sin conexión o mientras se vacía el rezago, que es cuando la bandeja
+    recibe mensajes.
+    El tamaño total de los mensajes se limita a `max_bytes`; al excederlo se descartan los
+    mensajes más antiguos (`drop_oldest`) o se rechazan los nuevos (`drop_new`).
+
+    `replay_rate` limita solo el reenvío del rezago acumulado durante la desconexión
+    (`throttle_until`); los mensajes que llegan detrás mientras se reenvía se publicarían
+    sin límite con conexión, así que se envían sin esperar y la bandeja termina por vaciarse.
+    """
+
+    EVICTION_POLICIES = ("drop_oldest", "drop_new")
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, eviction="drop_oldest", replay_rate=50, logger=None):
+        """
+        Abre (o crea) la bandeja de salida.
+
+        :param path: Ruta del archivo SQLite.
+        :param max_bytes: Tamaño máximo en bytes de los mensajes almacenados.
+        :param eviction: Política al exceder `max_bytes` ("drop_oldest" o "drop_new").
+        :param replay_rate: Mensajes por segundo máximos al reenviar el rezago.
+        :param logger: Logger del componente que usa la bandeja.
+        """
+        if eviction not in self.EVICTION_POLICIES:
+            raise ValueError(f"Política de descarte inválida: {eviction}")
+
+        self.path = os.path.expanduser(path)
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self.replay_rate = replay_rate
+        self.logger = logger
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")     # NORMAL puede perder las últimas inserciones en un corte de energía
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "topic TEXT NOT NULL, "
+            "payload BLOB NOT NULL, "
+            "qos INTEGER NOT NULL, "
+            "created REAL NOT NULL)"
+        )
+        self._count, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM outbox").fetchone()
+
+        self.stored = 0
+        self.evicted = 0
+        self.replayed = 0
+        self.last_replay_rate = 0.0
+
+    def append(self, topic, payload, qos=0):
+        """
+        Guarda un mensaje serializado al final de la bandeja.
+
+        :return: Número de secuencia asignado, o None si el mensaje fue rechazado.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode("utf-8")
+        size = len(payload)
+
+        with self._lock:
+            if self._bytes + size > self.max_bytes:
+                if self.eviction == "drop_new" or size > self.max_bytes:
+                    self.evicted += 1
+                    return None
+                self._evict(self._bytes + size - self.max_bytes)
+
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (topic, payload, qos, created) VALUES (?, ?, ?, ?)",
+                (topic, payload, qos, time.time()))
+            self._count += 1
+            self._bytes += size
+            self.stored += 1
+            return cursor.lastrowid
+
+    def _evict(self, needed_bytes):
+        """
+        Elimina los mensajes más antiguos hasta liberar `needed_bytes`.
+        """
+        freed = 0
+        last_seq = None
+        removed = 0
+        for seq, size in self._conn.execute("SELECT seq, LENGTH(payload) FROM outbox ORDER BY seq"):
+            if freed >= needed_bytes:
+                break
+            freed += size
+            last_seq = seq
+            removed += 1
+        if last_seq is None:
+            return
+        self._conn.execute("DELETE FROM outbox WHERE seq <= ?", (last_seq,))
+        self._count -= removed
+        self._bytes -= freed
+        self.evicted += removed
+        if self.logger:
+            self.logger.debug(f"[OUTBOX] Límite de {self.max_bytes} bytes alcanzado. {removed} mensajes antiguos descartados.")
+
+    def peek(self, limit=100):
+        """
+        Devuelve los mensajes más antiguos sin eliminarlos.
+
+        :return: Lista de tuplas (seq, topic, payload, qos).
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, topic, payload, qos FROM outbox ORDER BY seq LIMIT ?", (limit,)).fetchall()
+
+    def last_seq(self):
+        """
+        Devuelve la secuencia del mensaje más reciente (0 si la bandeja está vacía).
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM outbox").fetchone()[0]
+
+    def ack(self, seq):
+        """
+        Elimina un mensaje ya publicado.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT LENGTH(payload) FROM outbox WHERE seq = ?", (seq,)).fetchone()
+            if row is None:
+                return
+            self._conn.execute("DELETE FROM outbox WHERE seq = ?", (seq,))
+            self._count -= 1
+            self._bytes -= row[0]
+
+    def replay(self, send, should_continue=None, batch_size=100, throttle_until=None):
+        """
+        Reenvía en orden los mensajes almacenados respetando `replay_rate`.
+
+        :param send: Función `send(topic, payload, qos)` que devuelve True si el mensaje se publicó.
+        :param should_continue: Función opcional que devuelve False para interrumpir el reenvío.
+        :param batch_size: Mensajes leídos de disco por consulta.
+        :param throttle_until: Última secuencia sujeta a `replay_rate` (None: todas). Los mensajes
+            posteriores se encolaron con conexión detrás del rezago y se envían sin límite.
+        :return: Número de mensajes reenviados.
+        """
+        interval = 1.0 / self.replay_rate if self.replay_rate else 0.0
+        sent = 0
+        start = time.monotonic()
+        next_send = start
+
+        while True:
+            rows = self.peek(batch_size)
+            if not rows:
+                break
+            for seq, topic, payload, qos in rows:
+                if should_continue and not should_continue():
+                    return self._finish_replay(sent, start)
+                throttled = throttle_until is None or seq <= throttle_until
+                delay = next_send - time.monotonic()
+                if throttled and delay > 0:
+                    time.sleep(delay)
+                if not send(topic, payload, qos):
+                    return self._finish_replay(sent, start)
+                self.ack(seq)
+                sent += 1
+                next_send = max(next_send + interval, time.monotonic())
+
+        return self._finish_replay(sent, start)
+
+    def _finish_replay(self, sent, start):
+        elapsed = time.monotonic() - start
+        self.replayed += sent
+        if sent:
+            self.last_replay_rate = sent / elapsed if elapsed > 0 else float(sent)
+            if self.logger:
+                self.logger.info(f"[OUTBOX] {sent} mensajes reenviados ({self.last_replay_rate:.1f} msg/s). Pendientes: {self._count}")
+        return sent
+
+    def __len__(self):
+        return self._count
+
+    def size_bytes(self):
+        """
+        Devuelve el tamaño total en bytes de los mensajes almacenados.
+        """
+        return self._bytes
+
+    def get_stats(self):
+        """
+        Devuelve los contadores de la bandeja de salida.
+        """
+        return {
+            "pending": self._count,
+            "size_bytes": self._bytes,
+            "stored": self.stored,
+            "evicted": self.evicted,
+            "replayed": self.replayed,
+            "replay_rate": round(self.last_replay_rate, 2),
+        }
+
+    def close(self):
+        """
+        Cierra la base de datos.
+        """
+        with self._lock:
+            self._conn.close()
@@ -3,14 +3,22 @@
 # Copyright (c) 2024
 # Proyecto: Smart Recycling Bin
 
+import asyncio
 import os
 import time
-import subprocess
 from threading import Thread
+from modules.health_probe import HealthProber, LinkStats, ProbeTarget
+from modules.metrics import MetricsRegistry
 
 class NetworkManager:
     """
     Maneja la conexión de red para conmutar entre Ethernet y Wi-Fi automáticamente.
+
+    Cada `network.probe.interval` segundos se sondean en paralelo, desde cada interfaz,
+    los brokers MQTT, la puerta de enlace y `ping_host` (ver HealthProber). Las rondas
+    alimentan estadísticas EWMA de RTT y pérdida por interfaz, y la conmutación se decide
+    con ellas: se abandona la interfaz activa cuando se degrada y la otra está sana, y se
+    regresa a la preferida tras `recover_rounds` rondas sanas seguidas.
     """
 
     def __init__(self, config_manager, mqtt_handler=None):
@@ -27,7 +35,7 @@ class NetworkManager:
         self.enable_network_monitoring = self.config_manager.get("system.enable_network_monitoring", True)
         self.current_interface = "ethernet"  # Ethernet por defecto
         self.ping_host = self.config_manager.get("network.ping_host", "192.168.1.147")
-        self.check_interval = self.config_manager.get("network.check_interval", 10)
+        self.check_interval = self.config_manager.get("network.probe.interval", 0.5)
         self.network_status = {"ethernet": False, "wifi": False}
         self.monitoring_thread = None
         self.keep_monitoring = False
@@ -35,23 +43,110 @@ class NetworkManager:
         # Configurar logger centralizado
         self.logger = LoggingManager(config_manager).setup_logger("[NETWORK_MANAGER]")
 
+        # Sondeo paralelo por interfaz y criterios de conmutación
+        self.preferred_interface = self.config_manager.get("network.probe.preferred_interface", "ethernet")
+        self.loss_threshold = self.config_manager.get("network.probe.loss_threshold", 0.5)
+        self.rtt_threshold_ms = self.config_manager.get("network.probe.rtt_threshold_ms", 200)
+        self.fail_rounds = self.config_manager.get("network.probe.fail_rounds", 2)
+        self.recover_rounds = self.config_manager.get("network.probe.recover_rounds", 10)
+        self.prober = HealthProber(self._probe_interfaces(), self._probe_targets(),
+                                   timeout=self.config_manager.get("network.probe.timeout", 0.3))
+        alpha = self.config_manager.get("network.probe.ewma_alpha", 0.3)
+        self.link_stats = {interface: LinkStats(alpha) for interface in self.prober.interfaces}
+        self._healthy_rounds = 0
+
+        metrics = MetricsRegistry.default()
+        for interface, stats in self.link_stats.items():
+            metrics.gauge("network_rtt_ms", "RTT EWMA de los sondeos TCP", {"interface": interface}).set_function(
+                lambda stats=stats: stats.rtt_ms if stats.rtt_ms is not None else float("nan"))
+            metrics.gauge("network_loss_ratio", "Pérdida EWMA de los sondeos TCP", {"interface": interface}).set_function(
+                lambda stats=stats: stats.loss)
+
         if not self.enable_network_monitoring:
             self.logger.warning("El monitoreo de red está deshabilitado en la configuración.")
 
-    def is_connected(self, host=None):
+    def _probe_interfaces(self):
+        """
+        Interfaces a sondear según las secciones `network.ethernet` y `network.wifi`.
+        """
+        interfaces = {}
+        for name in ("ethernet", "wifi"):
+            settings = self.config_manager.get(f"network.{name}", None)
+            if not settings:
+                continue
+            interfaces[name] = {
+                "device": settings.get("interface"),
+                "ip": settings.get("ip") if self.config_manager.get("network.probe.bind_source", True) else None,
+                "gateway": settings.get("gateway"),
+                "gateway_port": self.config_manager.get("network.probe.gateway_port", 53),
+            }
+        return interfaces or {"default": {}}
+
+    def _probe_targets(self):
+        """
+        Objetivos comunes: brokers MQTT, `ping_host` y los de `network.probe.targets`.
+        """
+        mqtt_port = self.config_manager.get("mqtt.port", 1883)
+        targets = [ProbeTarget(f"broker:{broker}", broker, mqtt_port)
+                   for broker in self.config_manager.get("mqtt.broker_addresses", []) or []]
+        if self.ping_host:
+            targets.append(ProbeTarget("ping_host", self.ping_host, self.config_manager.get("network.probe.ping_port", 53)))
+        for target in self.config_manager.get("network.probe.targets", []) or []:
+            targets.append(ProbeTarget(target.get("name", target["host"]), target["host"], target.get("port", 80)))
+        return targets
+
+    def is_connected(self, host=None, port=None):
+        """
+        Verifica si un host responde con una conexión TCP no bloqueante (sin crear procesos).
+        """
+        target = ProbeTarget("host", host or self.ping_host, port or self.config_manager.get("network.probe.ping_port", 53))
+        return HealthProber({"default": {}}, [target], self.prober.timeout).probe_all()["default"][0] is not None
+
+    def get_link_stats(self):
         """
-        Verifica si hay conexión a Internet haciendo ping a un host.
+        Devuelve las estadísticas EWMA (RTT, pérdida) de cada interfaz.
         """
-        host = host or self.ping_host
-        try:
-            subprocess.check_call(
-                ["ping", "-c", "1", "-W", "2", host],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-            return True
-        except subprocess.CalledProcessError:
+        return {interface: stats.as_dict() for interface, stats in self.link_stats.items()}
+
+    def _is_healthy(self, interface):
+        stats = self.link_stats.get(interface)
+        if stats is None or stats.rounds == 0:
             return False
+        if stats.consecutive_failures >= self.fail_rounds or stats.loss > self.loss_threshold:
+            return False
+        return stats.rtt_ms is not None and stats.rtt_ms <= self.rtt_threshold_ms
+
+    def _evaluate(self, results):
+        """
+        Actualiza las estadísticas con una ronda de sondeos y decide la conmutación.
+        """
+        for interface, rtts in results.items():
+            self.link_stats[interface].update(rtts)
+        if not {"ethernet", "wifi"} <= set(self.link_stats):
+            return      # Sin interfaz alternativa no hay conmutación
+
+        current = self.current_interface
+        other = "wifi" if current == "ethernet" else "ethernet"
+        if not self._is_healthy(current):
+            self._healthy_rounds = 0
+            if self._is_healthy(other):
+                self.logger.warning(f"Enlace {current} degradado {self.link_stats[current].as_dict()}. "
+                                    f"Conmutando a {other} {self.link_stats[other].as_dict()}.")
+                self._switch(other)
+        elif current != self.preferred_interface:
+            # Regresar a la interfaz preferida solo tras varias rondas sanas seguidas (histéresis)
+            self._healthy_rounds = self._healthy_rounds + 1 if self._is_healthy(self.preferred_interface) else 0
+            if self._healthy_rounds >= self.recover_rounds:
+                self._healthy_rounds = 0
+                self.logger.info(f"Enlace {self.preferred_interface} recuperado. Regresando a la interfaz preferida.")
+                self._switch(self.preferred_interface)
+
+    def _switch(self, interface):
+        MetricsRegistry.default().counter("network_failovers_total", "Conmutaciones de interfaz", {"to": interface}).inc()
+        if interface == "wifi":
+            self.switch_to_wifi()
+        else:
+            self.switch_to_ethernet()
 
     def switch_to_wifi(self):
         """
@@ -90,13 +185,31 @@ class NetworkManager:
         self.logger.info("Iniciando monitoreo de red...")
         self.keep_monitoring = True
         while self.keep_monitoring:
-            if self.current_interface == "ethernet" and not self.is_connected():
-                self.logger.warning("Conexión Ethernet perdida. Intentando cambiar a Wi-Fi...")
-                self.switch_to_wifi()
-            elif self.current_interface == "wifi" and not self.is_connected():
-                self.logger.warning("Conexión Wi-Fi perdida. Intentando cambiar a Ethernet...")
-                self.switch_to_ethernet()
-            time.sleep(self.check_interval)
+            started = time.monotonic()
+            self.check_connection()
+            time.sleep(max(0.0, self.check_interval - (time.monotonic() - started)))
+
+    def check_connection(self):
+        """
+        Ejecuta una ronda de sondeos y conmuta de interfaz si corresponde (bloquea como máximo `network.probe.timeout`).
+        """
+        self._evaluate(self.prober.probe_all())
+
+    async def monitor_async(self, runtime):
+        """
+        Monitoreo de red como tarea de AsyncRuntime: los sondeos se esperan desde el bucle, sin hilos.
+
+        :param runtime: Instancia de AsyncRuntime.
+        """
+        if not self.enable_network_monitoring:
+            self.logger.warning("El monitoreo de red está deshabilitado.")
+            return
+        self.logger.info("Iniciando monitoreo de red (asyncio)...")
+        self.keep_monitoring = True
+        while self.keep_monitoring:
+            started = time.monotonic()
+            self._evaluate(await self.prober.probe_all_async())
+            await asyncio.sleep(max(0.0, self.check_interval - (time.monotonic() - started)))
 
     def start_monitoring(self):
         """
@@ -0,0 +1,252 @@
+# publish_pipeline.py - Cola de publicación asíncrona con agrupación y control de contrapresión para MQTT.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import collections
+import threading
+import time
+
+
+class PublishPipeline:
+    """
+    Cola acotada de publicaciones atendida por un hilo emisor dedicado.
+
+    El hilo que llama a `enqueue` (lazos de sensores, callbacks) solo copia el mensaje a la
+    cola; la serialización, la publicación en la red y el registro se hacen en el emisor.
+    Los mensajes del mismo tópico que llegan dentro de `batch_window` se pueden agrupar en
+    un solo arreglo JSON (solo para los tópicos en `batch_topics`).
+
+    Cuando la cola está llena se aplica una política según el QoS del mensaje:
+    - QoS 0: `drop_oldest` descarta el mensaje QoS 0 más antiguo de la cola; `drop_new` descarta el nuevo.
+    - QoS 1/2: `block` espera hasta `block_timeout` segundos por espacio; si no lo hay, descarta
+      el mensaje QoS 0 más antiguo o, si no existe, el mensaje nuevo.
+    """
+
+    POLICIES_QOS0 = ("drop_oldest", "drop_new")
+    POLICIES_QOS1 = ("block", "drop_oldest", "drop_new")
+
+    def __init__(self, send, queue_size=1000, batch_window=0.02, max_batch=50, batch_topics=None,
+                 qos0_policy="drop_oldest", qos1_policy="block", block_timeout=1.0, logger=None, latency_histogram=None):
+        """
+        Inicializa la cola de publicación.
+
+        :param send: Función `send(topic, messages, qos)` que publica una lista de mensajes
+                     (una lista de un elemento si el mensaje no se agrupa).
+        :param queue_size: Número máximo de mensajes en espera.
+        :param batch_window: Ventana en segundos para agrupar mensajes del mismo tópico.
+        :param max_batch: Número máximo de mensajes por lote.
+        :param batch_topics: Tópicos cuyos mensajes se pueden agrupar en arreglos.
+        :param qos0_policy: Política para mensajes QoS 0 con la cola llena.
+        :param qos1_policy: Política para mensajes QoS 1/2 con la cola llena.
+        :param block_timeout: Tiempo máximo de espera en segundos de la política `block`.
+        :param logger: Logger del componente que usa la cola.
+        :param latency_histogram: Histograma opcional (modules.metrics) para la espera de cada mensaje en la cola.
+        """
+        if qos0_policy not in self.POLICIES_QOS0:
+            raise ValueError(f"Política QoS 0 inválida: {qos0_policy}")
+        if qos1_policy not in self.POLICIES_QOS1:
+            raise ValueError(f"Política QoS 1 inválida: {qos1_policy}")
+
+        self.send = send
+        self.queue_size = queue_size
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.batch_topics = set(batch_topics or [])
+        self.qos0_policy = qos0_policy
+        self.qos1_policy = qos1_policy
+        self.block_timeout = block_timeout
+        self.logger = logger
+        self.latency_histogram = latency_histogram
+
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._running = False
+        self._in_flight = 0
+        self._thread = None
+
+        self.enqueued = 0
+        self.published = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_latency_ms = 0.0
+        self._latency_total_ms = 0.0
+        self._window_start = time.monotonic()
+        self._window_published = 0
+        self._rate = 0.0
+
+    def _evict_oldest_qos0(self):
+        """
+        Descarta el mensaje QoS 0 más antiguo de la cola. Devuelve False si no hay ninguno.
+        """
+        for index, entry in enumerate(self._queue):
+            if entry[2] == 0:
+                del self._queue[index]
+                self.dropped += 1
+                return True
+        return False
+
+    def enqueue(self, topic, message, qos=0):
+        """
+        Agrega un mensaje a la cola sin esperar a la red.
+
+        :param topic: Tópico MQTT.
+        :param message: Mensaje (diccionario, cadena u objeto serializable).
+        :param qos: Nivel de QoS.
+        :return: True si el mensaje quedó en la cola, False si fue descartado.
+        """
+        entry = (topic, message, qos, time.monotonic())
+        with self._condition:
+            if len(self._queue) >= self.queue_size:
+                policy = self.qos0_policy if qos == 0 else self.qos1_policy
+                if policy == "block":
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._queue) >= self.queue_size and self._running:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    policy = "drop_oldest"
+                if len(self._queue) >= self.queue_size:
+                    if policy == "drop_new" or not self._evict_oldest_qos0():
+                        self.dropped += 1
+                        return False
+
+            self._queue.append(entry)
+            self.enqueued += 1
+            self._condition.notify_all()
+        return True
+
+    def _take_batch(self):
+        """
+        Espera el siguiente mensaje y agrupa los del mismo tópico y QoS que lleguen dentro de la ventana.
+        """
+        with self._condition:
+            while self._running and not self._queue:
+                self._condition.wait()
+            if not self._queue:
+                return None
+
+            first = self._queue.popleft()
+            batch = [first]
+            topic, _, qos, _ = first
+            if topic in self.batch_topics and self.batch_window > 0:
+                deadline = time.monotonic() + self.batch_window
+                while len(batch) < self.max_batch:
+                    match = next((entry for entry in self._queue if entry[0] == topic and entry[2] == qos), None)
+                    if match is not None:
+                        self._queue.remove(match)
+                        batch.append(match)
+                        continue
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._running:
+                        break
+                    self._condition.wait(remaining)
+
+            self._in_flight = len(batch)
+            self._condition.notify_all()    # Hay espacio para los productores bloqueados
+            return batch
+
+    def _record(self, batch):
+        """
+        Actualiza los contadores de publicación y latencia de un lote enviado.
+        """
+        now = time.monotonic()
+        for entry in batch:
+            latency_ms = (now - entry[3]) * 1000
+            self._latency_total_ms += latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+            if self.latency_histogram is not None:
+                self.latency_histogram.observe(latency_ms)
+        self.published += len(batch)
+        self.batches += 1
+        self._window_published += len(batch)
+
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self._rate = self._window_published / elapsed
+            self._window_start = now
+            self._window_published = 0
+
+    def _run(self):
+        """
+        Hilo emisor.
+        """
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            topic, _, qos, _ = batch[0]
+            try:
+                self.send(topic, [entry[1] for entry in batch], qos)
+                self._record(batch)
+            except Exception as e:
+                self.errors += 1
+                if self.logger:
+                    self.logger.error(f"[MQTT] Error publicando lote de {len(batch)} mensajes en {topic}: {e}")
+            finally:
+                with self._condition:
+                    self._in_flight = 0
+                    self._condition.notify_all()
+
+    def start(self):
+        """
+        Inicia el hilo emisor.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def flush(self, timeout=5.0):
+        """
+        Espera a que la cola se vacíe.
+
+        :return: True si todos los mensajes se enviaron antes del tiempo límite.
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._queue or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stop(self, timeout=5.0):
+        """
+        Envía los mensajes pendientes (hasta `timeout` segundos) y detiene el hilo emisor.
+        """
+        self.flush(timeout)
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def queue_depth(self):
+        """
+        Devuelve el número de mensajes en espera.
+        """
+        return len(self._queue)
+
+    def get_stats(self):
+        """
+        Devuelve los contadores de la cola de publicación.
+        """
+        elapsed = time.monotonic() - self._window_start
+        rate = self._window_published / elapsed if elapsed >= 1.0 else self._rate
+        return {
+            "queue_depth": self.queue_depth(),
+            "enqueued": self.enqueued,
+            "published": self.published,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "publish_rate": round(rate, 2),
+            "avg_latency_ms": round(self._latency_total_ms / self.published, 2) if self.published else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 2),
+        }
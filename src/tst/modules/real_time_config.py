@@ -3,23 +3,33 @@
 # Copyright (c) 2024
 # Proyecto: Smart Recycling Bin
 
+import copy
 import os
+import threading
 import time
-from threading import Thread
 import yaml
+from modules.file_watcher import FileWatcher
 
 class RealTimeConfigManager:
     """
     Clase para gestionar y monitorear cambios en el archivo de configuración.
+
+    La configuración vigente es un diccionario que nunca se modifica en sitio: cada recarga
+    (o cambio con `set_value`/`delete_key`) construye un diccionario nuevo, lo valida y lo
+    publica con un solo reemplazo de referencia. Los lectores que obtienen `get_config()`
+    conservan una vista consistente aunque el archivo cambie mientras la usan. Las recargas
+    del vigilante y los cambios locales se serializan con `_write_lock`.
     """
 
-    def __init__(self, config_manager, mqtt_handler=None, reload_interval=5):
+    def __init__(self, config_manager, mqtt_handler=None, reload_interval=5, debounce=0.2, use_inotify=True):
         """
         Inicializa el gestor de configuración.
 
         :param config_manager: Instancia de ConfigManager para manejar configuraciones centralizadas.
         :param mqtt_handler: Instancia opcional de MQTTHandler para publicar cambios.
-        :param reload_interval: Intervalo en segundos para verificar cambios en el archivo.
+        :param reload_interval: Intervalo en segundos del sondeo cuando inotify no está disponible.
+        :param debounce: Segundos sin eventos antes de recargar (agrupa las ráfagas de guardado de los editores).
+        :param use_inotify: Si es False se usa siempre el sondeo del archivo.
         """
         from modules.logging_manager import LoggingManager
 
@@ -29,31 +39,98 @@ class RealTimeConfigManager:
         self.reload_interval = reload_interval
         self.last_modified_time = None
         self.config_data = {}
-        self._stop_monitoring = False
+        self.reload_count = 0
+        self._subscribers = {}          # Sección -> lista de callbacks
+        self._write_lock = threading.RLock()   # Reentrante: un callback puede llamar a set_value
 
         # Configurar logger específico para RealTimeConfig
         self.logger = LoggingManager(config_manager).setup_logger("[REALTIME_CONFIG]")
 
+        self.watcher = FileWatcher(
+            self.config_path, self._on_file_changed, debounce=debounce,
+            poll_interval=reload_interval, use_inotify=use_inotify, logger=self.logger
+        )
+
         # Cargar configuración inicial
         self.load_config()
 
-    def load_config(self):
+    def _parse(self):
         """
-        Carga la configuración desde el archivo YAML.
+        Lee y valida el archivo YAML sin tocar la configuración vigente.
+
+        :return: Diccionario con la configuración nueva, o None si el archivo no es válido.
         """
+        if not os.path.exists(self.config_path):
+            self.logger.error(f"El archivo de configuración no existe: {self.config_path}")
+            return None
         try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, "r") as file:
-                    self.config_data = yaml.safe_load(file)
-                    self.last_modified_time = os.path.getmtime(self.config_path)
-                    self.logger.info("Configuración cargada con éxito.")
-            else:
-                self.logger.error(f"El archivo de configuración no existe: {self.config_path}")
+            with open(self.config_path, "r") as file:
+                data = yaml.safe_load(file)
         except yaml.YAMLError as e:
             self.logger.error(f"Error al leer el archivo YAML: {e}")
+            return None
+
+        if not isinstance(data, dict) or not data:
+            self.logger.error("La configuración debe ser un diccionario no vacío. Se conserva la configuración anterior.")
+            return None
+
+        # Misma validación de secciones que ConfigManager antes de reemplazar la configuración vigente
+        errors = self.config_manager.section_errors(data)
+        if errors:
+            self.logger.error(f"Configuración inválida: {' '.join(errors)} Se conserva la configuración anterior.")
+            return None
+        return data
+
+    def _publish(self, new_data):
+        """
+        Publica una configuración nueva con un solo reemplazo de referencia y notifica
+        a los suscriptores de las secciones que cambiaron.
+        """
+        old_data = self.config_data
+        self.config_data = new_data
+        self.last_modified_time = os.path.getmtime(self.config_path) if os.path.exists(self.config_path) else None
+        self.config_manager.replace_config(copy.deepcopy(new_data))
+        self.reload_count += 1
+
+        changed = [section for section in set(old_data) | set(new_data) if old_data.get(section) != new_data.get(section)]
+        for section in changed:
+            for callback in self._subscribers.get(section, []) + self._subscribers.get("*", []):
+                try:
+                    callback(section, new_data.get(section), old_data.get(section))
+                except Exception as e:
+                    self.logger.error(f"Error en el callback de la sección {section}: {e}")
+        return changed
+
+    def load_config(self):
+        """
+        Carga la configuración desde el archivo YAML.
+        """
+        try:
+            # Lectura y reemplazo bajo el mismo candado que set_value/delete_key
+            with self._write_lock:
+                new_data = self._parse()
+                changed = self._publish(new_data) if new_data is not None else None
+            if changed is not None:
+                self.logger.info(f"Configuración cargada con éxito. Secciones modificadas: {sorted(changed)}")
         except Exception as e:
             self.logger.error(f"Error cargando configuración: {e}")
 
+    def _on_file_changed(self):
+        """
+        Callback del vigilante: recarga fuera del hilo principal.
+        """
+        self.logger.info("Cambio detectado en el archivo de configuración. Recargando...")
+        self.load_config()
+
+    def subscribe(self, section, callback):
+        """
+        Registra un callback que se ejecuta cuando cambia una sección de la configuración.
+
+        :param section: Sección de primer nivel (p. ej. "mux") o "*" para cualquier sección.
+        :param callback: Función `callback(section, new_value, old_value)`.
+        """
+        self._subscribers.setdefault(section, []).append(callback)
+
     def save_config(self):
         """
         Guarda la configuración actualizada en el archivo YAML.
@@ -80,54 +157,44 @@ class RealTimeConfigManager:
         :param section: Sección del archivo YAML.
         :param key: Clave a eliminar.
         """
-        if section in self.config_data and key in self.config_data[section]:
-            del self.config_data[section][key]
-            self.save_config()
-            self.logger.info(f"Clave {key} eliminada de la sección {section}.")
-        else:
-            self.logger.warning(f"No se encontró la clave {key} en la sección {section}.")
-
-    def monitor_config(self):
-        """
-        Monitorea el archivo de configuración y recarga cambios si es necesario.
-        """
-        self.logger.info("Iniciando monitoreo del archivo de configuración.")
-        while not self._stop_monitoring:
-            try:
-                if os.path.exists(self.config_path):
-                    current_modified_time = os.path.getmtime(self.config_path)
-                    if current_modified_time != self.last_modified_time:
-                        self.logger.info("Cambio detectado en el archivo de configuración. Recargando...")
-                        self.load_config()
-                else:
-                    self.logger.error(f"El archivo de configuración no existe: {self.config_path}")
-            except Exception as e:
-                self.logger.error(f"Error monitoreando configuración: {e}")
-            time.sleep(self.reload_interval)
+        with self._write_lock:
+            if section in self.config_data and key in self.config_data[section]:
+                new_data = copy.deepcopy(self.config_data)
+                del new_data[section][key]
+                self._publish(new_data)
+                self.save_config()
+                self.logger.info(f"Clave {key} eliminada de la sección {section}.")
+            else:
+                self.logger.warning(f"No se encontró la clave {key} en la sección {section}.")
 
     def get_config(self):
         """
-        Devuelve los datos de configuración actuales.
+        Devuelve los datos de configuración actuales. No deben modificarse en sitio.
         """
         return self.config_data
 
-    def start_monitoring(self):
+    def start_monitoring(self, loop=None):
         """
         Inicia el monitoreo del archivo de configuración en un hilo separado.
+
+        :param loop: Bucle de asyncio opcional; el vigilante se atiende desde él en lugar de un hilo propio.
         """
-        self._stop_monitoring = False
-        self.monitor_thread = Thread(target=self.monitor_config, daemon=True)
-        self.monitor_thread.start()
+        self.logger.info("Iniciando monitoreo del archivo de configuración.")
+        self.watcher.start(loop)
 
     def stop_monitoring(self):
         """
         Detiene el monitoreo del archivo de configuración.
         """
-        self._stop_monitoring = True
-        if hasattr(self, 'monitor_thread') and self.monitor_thread.is_alive():
-            self.monitor_thread.join()
+        self.watcher.stop()
         self.logger.info("Monitoreo del archivo de configuración detenido.")
 
+    def is_monitoring(self):
+        """
+        Verifica si el monitoreo del archivo está activo.
+        """
+        return self.watcher.is_running()
+
     def set_value(self, section, key, value):
         """
         Actualiza un valor en la configuración y guarda el archivo YAML.
@@ -136,7 +203,8 @@ class RealTimeConfigManager:
         :param key: Clave dentro de la sección.
         :param value: Valor a establecer.
         """
-        if section not in self.config_data:
-            self.config_data[section] = {}
-        self.config_data[section][key] = value
-        self.save_config()
+        with self._write_lock:
+            new_data = copy.deepcopy(self.config_data)
+            new_data.setdefault(section, {})[key] = value
+            self._publish(new_data)
+            self.save_config()
@@ -0,0 +1,321 @@
+# topic_router.py - Enrutador de mensajes MQTT: filtros con comodines en un trie y pool de trabajadores con orden por tópico.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+"""
+Tabla de despacho de mensajes MQTT.
+
+Cada ruta asocia un filtro de tópico (con `+` y `#`) a un manejador `handler(topic, message)`
+que recibe el mensaje ya decodificado. Los filtros se compilan en un trie por niveles, por
+lo que buscar las rutas de un tópico cuesta lo mismo sin importar cuántas rutas haya, y el
+resultado se guarda en caché por tópico.
+
+Modos de ejecución de una ruta:
+
+- `inline`: en el hilo que recibe el mensaje (hilo de paho o bucle de asyncio). Solo para
+  manejadores que no bloquean (programar una válvula, registrar un log).
+- `pool`: en un pool acotado de trabajadores. Los mensajes de un mismo tópico para una
+  misma ruta se ejecutan en orden de llegada y nunca en paralelo; tópicos distintos se
+  ejecutan en paralelo. Para manejadores que bloquean (relés, I2C, escritura a disco).
+"""
+
+import threading
+import time
+from collections import deque
+
+from modules.metrics import MetricsRegistry
+
+INLINE = "inline"
+POOL = "pool"
+
+
+class _Node:
+    __slots__ = ("children", "routes", "multi")
+
+    def __init__(self):
+        self.children = {}      # Nivel literal o "+" → nodo
+        self.routes = []        # Rutas cuyo filtro termina en este nodo
+        self.multi = []         # Rutas con "#" en este nivel
+
+
+class TopicTrie:
+    """
+    Filtros de tópico MQTT compilados en un trie por niveles.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._cache = {}
+
+    @staticmethod
+    def validate(topic_filter):
+        """
+        Verifica que un filtro respete las reglas de comodines de MQTT.
+        """
+        levels = topic_filter.split("/")
+        for index, level in enumerate(levels):
+            if level == "#" and index != len(levels) - 1:
+                raise ValueError(f"[ROUTER] '#' debe ser el último nivel del filtro: {topic_filter}")
+            if level not in ("+", "#") and ("+" in level or "#" in level):
+                raise ValueError(f"[ROUTER] Comodín mal ubicado en el filtro: {topic_filter}")
+        return levels
+
+    def add(self, topic_filter, route):
+        node = self._root
+        levels = self.validate(topic_filter)
+        for level in levels:
+            if level == "#":
+                node.multi.append(route)
+                break
+            node = node.children.setdefault(level, _Node())
+        else:
+            node.routes.append(route)
+        self._cache.clear()
+
+    def match(self, topic):
+        """
+        Devuelve las rutas cuyo filtro coincide con el tópico, en orden de registro.
+        """
+        cached = self._cache.get(topic)
+        if cached is not None:
+            return cached
+
+        levels = topic.split("/")
+        found = []
+        nodes = [self._root]
+        for depth, level in enumerate(levels):
+            following = []
+            for node in nodes:
+                # Los comodines del primer nivel no coinciden con tópicos del sistema ($SYS/...)
+                wildcard = not (depth == 0 and level.startswith("$"))
+                if wildcard:
+                    found.extend(node.multi)
+                    if "+" in node.children:
+                        following.append(node.children["+"])
+                if level in node.children:
+                    following.append(node.children[level])
+            nodes = following
+            if not nodes:
+                break
+        for node in nodes:
+            found.extend(node.routes)
+            found.extend(node.multi)    # "a/#" también coincide con "a"
+
+        result = sorted(set(found), key=lambda route: route.index)
+        if len(self._cache) < 1024:
+            self._cache[topic] = result
+        return result
+
+
+class Route:
+    """
+    Ruta registrada: filtro, manejador y modo de ejecución.
+    """
+
+    __slots__ = ("index", "topic_filter", "handler", "mode", "qos", "timer")
+
+    def __init__(self, index, topic_filter, handler, mode, qos, timer):
+        self.index = index
+        self.topic_filter = topic_filter
+        self.handler = handler
+        self.mode = mode
+        self.qos = qos
+        self.timer = timer
+
+    def __repr__(self):
+        return f"Route({self.topic_filter!r}, {getattr(self.handler, '__name__', self.handler)!r}, {self.mode})"
+
+
+class OrderedWorkerPool:
+    """
+    Pool acotado de hilos que ejecuta en orden las tareas con la misma clave.
+
+    Cada clave tiene su propia fila; una clave está como máximo una vez en la cola de
+    claves listas, de modo que un solo trabajador procesa sus tareas a la vez.
+    """
+
+    def __init__(self, workers=2, queue_size=256, overflow="drop_new", block_timeout=0.5, logger=None):
+        """
+        :param workers: Número de hilos.
+        :param queue_size: Tareas máximas en espera (todas las claves).
+        :param overflow: Con la cola llena: "drop_new" descarta la tarea; "block" espera hasta `block_timeout`.
+        """
+        self.workers = workers
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.logger = logger
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._keys = deque()        # Claves con tareas pendientes y sin trabajador asignado
+        self._pending = {}          # Clave → deque de tareas (existe mientras la clave tenga trabajo)
+        self._depth = 0
+        self._threads = []
+        self._running = False
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"router-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, function, *args):
+        """
+        Encola `function(*args)` detrás de las tareas pendientes con la misma clave.
+
+        :return: False si la tarea se descartó por la cola llena.
+        """
+        timeout = self.block_timeout if self.overflow == "block" else 0
+        if not self._slots.acquire(timeout=timeout):
+            return False
+        with self._lock:
+            self._depth += 1
+            queue = self._pending.get(key)
+            if queue is None:
+                self._pending[key] = deque([(function, args)])
+                self._keys.append(key)
+                self._ready.notify()
+            else:
+                queue.append((function, args))
+        return True
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._keys and self._running:
+                    self._ready.wait()
+                if not self._keys:
+                    return
+                key = self._keys.popleft()
+                function, args = self._pending[key].popleft()
+            try:
+                function(*args)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"[ROUTER] Error en la tarea {key}: {e}")
+            finally:
+                self._slots.release()
+                with self._lock:
+                    self._depth -= 1
+                    if self._pending[key]:
+                        self._keys.append(key)      # Siguiente tarea de la clave, detrás de las demás claves
+                        self._ready.notify()
+                    else:
+                        del self._pending[key]
+
+    def queue_depth(self):
+        return self._depth
+
+    def stop(self, timeout=5.0):
+        """
+        Procesa las tareas pendientes y detiene los hilos.
+        """
+        with self._lock:
+            self._running = False
+            self._ready.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+
+class TopicRouter:
+    """
+    Despacha cada mensaje decodificado a las rutas cuyo filtro coincide con su tópico.
+    """
+
+    def __init__(self, workers=2, queue_size=256, overflow="drop_new", block_timeout=0.5, logger=None, registry=None):
+        self.logger = logger
+        self.trie = TopicTrie()
+        self.routes = []
+        self.pool = OrderedWorkerPool(workers, queue_size, overflow, block_timeout, logger)
+        self.registry = registry or MetricsRegistry.default()
+        self.dropped = self.registry.counter("mqtt_router_dropped_total", "Mensajes descartados por el pool de manejadores lleno")
+        self.registry.gauge("mqtt_router_queue_depth", "Mensajes en espera en el pool de manejadores").set_function(self.pool.queue_depth)
+
+    @classmethod
+    def from_config(cls, config_manager, logger=None):
+        """
+        Crea el enrutador a partir de la sección `mqtt.router` de la configuración.
+        """
+        return cls(workers=config_manager.get("mqtt.router.workers", 2),
+                   queue_size=config_manager.get("mqtt.router.queue_size", 256),
+                   overflow=config_manager.get("mqtt.router.overflow", "drop_new"),
+                   block_timeout=config_manager.get("mqtt.router.block_timeout", 0.5),
+                   logger=logger)
+
+    def add(self, topic_filter, handler, mode=INLINE, qos=0):
+        """
+        Registra una ruta.
+
+        :param topic_filter: Filtro de tópico MQTT (admite `+` y `#`).
+        :param handler: Función `handler(topic, message)`. En modo `pool` debe ser síncrona.
+        :param mode: "inline" o "pool".
+        :param qos: QoS de la suscripción.
+        :return: La ruta creada.
+        """
+        if mode not in (INLINE, POOL):
+            raise ValueError(f"[ROUTER] Modo de ejecución inválido: {mode}")
+        timer = self.registry.histogram("mqtt_handler_ms", "Duración de los manejadores de mensajes (ms)",
+                                        {"filter": topic_filter})
+        route = Route(len(self.routes), topic_filter, handler, mode, qos, timer)
+        self.trie.add(topic_filter, route)
+        self.routes.append(route)
+        if mode == POOL:
+            self.pool.start()
+        return route
+
+    def subscriptions(self):
+        """
+        Devuelve los filtros a suscribir con su QoS máximo, sin repetir.
+        """
+        filters = {}
+        for route in self.routes:
+            filters[route.topic_filter] = max(route.qos, filters.get(route.topic_filter, 0))
+        return list(filters.items())
+
+    def match(self, topic):
+        return self.trie.match(topic)
+
+    def dispatch(self, topic, message, spawn=None):
+        """
+        Ejecuta o encola las rutas de un mensaje.
+
+        :param topic: Tópico recibido.
+        :param message: Mensaje ya decodificado.
+        :param spawn: Función opcional que recibe las corrutinas devueltas por manejadores
+            `inline` asíncronos (p. ej. `AsyncRuntime.spawn`).
+        :return: Número de rutas que recibieron o encolaron el mensaje.
+        """
+        delivered = 0
+        for route in self.trie.match(topic):
+            if route.mode == POOL:
+                if self.pool.submit((route.index, topic), self._run, route, topic, message):
+                    delivered += 1
+                else:
+                    self.dropped.inc()
+                    if self.logger:
+                        self.logger.warning(f"[ROUTER] Pool de manejadores lleno. Mensaje descartado en {topic}.")
+                continue
+            delivered += 1
+            try:
+                result = self._run(route, topic, message)
+                if spawn is not None and hasattr(result, "__await__"):
+                    spawn(result, f"mqtt:{topic}")
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"[ROUTER] Error procesando mensaje en {topic}: {e}")
+        return delivered
+
+    @staticmethod
+    def _run(route, topic, message):
+        with route.timer.time():
+            return route.handler(topic, message)
+
+    def stop(self, timeout=5.0):
+        self.pool.stop(timeout)
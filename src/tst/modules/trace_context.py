@@ -0,0 +1,168 @@
+# trace_context.py - Contexto de rastreo de eventos entre las Raspberry Pi y colector de latencias por etapa.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+"""
+Rastreo de extremo a extremo de un material a lo largo de la cinta.
+
+El `id` del evento es el identificador de la traza: se conserva en cada tópico
+(`material/entrada` → `material/deteccion` → `material/procesado` → `material/pesaje`).
+El campo `trace` acumula los saltos como listas `[etapa, host, wall, monotonic]`:
+
+- `wall` (segundos epoch) permite comparar saltos entre Raspberry Pi distintas; su
+  exactitud depende de la sincronización NTP entre ellas.
+- `monotonic` (time.monotonic) solo es comparable dentro del mismo host y no se ve
+  afectado por ajustes del reloj, por lo que se prefiere cuando dos saltos consecutivos
+  ocurren en la misma Raspberry Pi.
+
+MQTTHandler agrega un salto `pub:<tópico>` al enviar cada mensaje de los tópicos
+rastreados; las aplicaciones agregan los saltos propios (`pi2.valve`, `pi3.weighed`, ...)
+y copian el contexto al mensaje siguiente con `continue_trace`.
+"""
+
+import os
+import socket
+import time
+from datetime import datetime
+
+from modules.jsonl_writer import JSONLinesWriter
+from modules.metrics import MetricsRegistry, Histogram
+
+TRACE_KEY = "trace"
+HOST = socket.gethostname()
+
+# Posición de cada campo dentro de un salto
+STAGE, HOP_HOST, WALL, MONOTONIC = range(4)
+
+
+def hop(stage, host=None):
+    """
+    Crea un salto con la hora actual.
+
+    :param stage: Nombre de la etapa (p. ej. "pi2.valve").
+    :param host: Host que registra el salto (por defecto, el actual).
+    """
+    return [stage, host or HOST, round(time.time(), 6), round(time.monotonic(), 6)]
+
+
+def add_hop(message, stage, host=None):
+    """
+    Agrega un salto al contexto de rastreo de un mensaje.
+
+    :param message: Diccionario del mensaje; se modifica en el lugar.
+    :return: El mismo mensaje.
+    """
+    if isinstance(message, dict):
+        message.setdefault(TRACE_KEY, []).append(hop(stage, host))
+    return message
+
+
+def continue_trace(source, message, stage=None):
+    """
+    Copia el id y los saltos de `source` a un mensaje nuevo (p. ej. el que se publica en el
+    siguiente tópico) y, opcionalmente, agrega el salto de la etapa actual.
+
+    :param source: Mensaje recibido.
+    :param message: Mensaje que se va a publicar; se modifica en el lugar.
+    :return: El mensaje actualizado.
+    """
+    if isinstance(source, dict):
+        if "id" in source:
+            message["id"] = source["id"]
+        if source.get(TRACE_KEY):
+            message[TRACE_KEY] = [list(item) for item in source[TRACE_KEY]]
+    if stage:
+        add_hop(message, stage)
+    return message
+
+
+def stage_latencies(hops):
+    """
+    Calcula la latencia entre saltos consecutivos.
+
+    :param hops: Lista de saltos `[etapa, host, wall, monotonic]`.
+    :return: Lista de tuplas (etapa_origen, etapa_destino, milisegundos).
+    """
+    result = []
+    for previous, current in zip(hops, hops[1:]):
+        if previous[HOP_HOST] == current[HOP_HOST]:
+            elapsed = current[MONOTONIC] - previous[MONOTONIC]
+        else:
+            elapsed = current[WALL] - previous[WALL]
+        result.append((previous[STAGE], current[STAGE], elapsed * 1000))
+    return result
+
+
+class TraceCollector:
+    """
+    Calcula las latencias por etapa de las trazas completas y las registra.
+
+    Cada traza observada alimenta los histogramas `trace_stage_ms{stage="a>b"}` y
+    `trace_end_to_end_ms` del registro de métricas, y se agrega al archivo JSON-lines
+    `tracing.collector_file` para el reporte (`scripts/trace_report.py`).
+    """
+
+    def __init__(self, config_manager, registry=None):
+        """
+        :param config_manager: Instancia de ConfigManager.
+        :param registry: Registro de métricas (por defecto, el compartido).
+        """
+        self.registry = registry or MetricsRegistry.default()
+        self.end_to_end = self.registry.histogram("trace_end_to_end_ms", "Latencia del primer al último salto de una traza")
+        path = config_manager.get("tracing.collector_file", "logs/traces.jsonl")
+        self.writer = None
+        if path:
+            path = os.path.expanduser(path)
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.writer = JSONLinesWriter.from_config(config_manager, path)
+
+    def observe(self, message):
+        """
+        Registra la traza de un mensaje.
+
+        :param message: Mensaje con campo `trace`.
+        :return: Diccionario {"a>b": ms} con las latencias por etapa o None si no hay traza.
+        """
+        hops = message.get(TRACE_KEY) if isinstance(message, dict) else None
+        if not hops or len(hops) < 2:
+            return None
+
+        stages = {}
+        for origin, target, elapsed in stage_latencies(hops):
+            name = f"{origin}>{target}"
+            stages[name] = round(elapsed, 3)
+            self.registry.histogram("trace_stage_ms", "Latencia entre saltos consecutivos", {"stage": name}).observe(elapsed)
+        total = (hops[-1][WALL] - hops[0][WALL]) * 1000
+        self.end_to_end.observe(total)
+
+        if self.writer is not None:
+            self.writer.write({
+                "timestamp": datetime.fromtimestamp(hops[-1][WALL]).isoformat(),
+                "id": message.get("id"),
+                "total_ms": round(total, 3),
+                "stages": stages,
+                "hops": hops
+            })
+        return stages
+
+
+def summarize(records):
+    """
+    Agrega registros del colector en histogramas por etapa.
+
+    :param records: Iterable de registros escritos por TraceCollector.
+    :return: Tupla (histogramas por etapa en orden de aparición, histograma de extremo a extremo).
+    """
+    stages = {}
+    end_to_end = Histogram("trace_end_to_end_ms")
+    for record in records:
+        for name, elapsed in record.get("stages", {}).items():
+            histogram = stages.get(name)
+            if histogram is None:
+                histogram = stages[name] = Histogram("trace_stage_ms", labels={"stage": name})
+            histogram.observe(elapsed)
+        if "total_ms" in record:
+            end_to_end.observe(record["total_ms"])
+    return stages, end_to_end
@@ -0,0 +1,361 @@
+# wire_codec.py - Codificación binaria compacta y versionada para los mensajes entre las Raspberry Pi.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+"""
+Formato binario de los mensajes MQTT (versión 1).
+
+Todo mensaje binario comienza con el encabezado `>BBB` (MAGIC, VERSION, tipo). Los mensajes
+JSON comienzan con '{' o '[', por lo que `decode_payload` distingue ambos formatos sin
+negociación previa: cada tópico puede publicarse en binario o en JSON y los suscriptores
+de las tres Raspberry Pi usan el mismo decodificador.
+
+- TYPE_EVENT (1): eventos de material (`material/entrada`, `material/deteccion`, `material/pesaje`).
+    flags(u8) | id(16 bytes) | [timestamp f64] | [material] | [weight f32] | [confidence f32]
+- TYPE_SPECTRUM (2): mediciones espectrales (`data/json`).
+    flags(u8) | id(16 bytes) | [timestamp f64] | [material] | [confidence f32]
+    | sensor_id(str) | channel(u8) | spectral_data
+- TYPE_BATCH (3): arreglo de mensajes agrupados por la cola de publicación.
+    count(u16) | (longitud u16 | mensaje)*
+
+Eventos y espectros con contexto de rastreo (`trace`, ver trace_context) llevan FLAG_TRACE
+y agregan al final `count(u8) | (etapa(str) | host(str) | wall f64 | monotonic f64)*`. Al ir
+al final, un decodificador anterior simplemente ignora esos bytes.
+
+El id se transmite como los 16 bytes del UUID, el timestamp ISO como segundos epoch (f64)
+y los valores espectrales como float32. Los materiales conocidos ocupan un byte. Un
+mensaje que no encaja en ningún formato (campos extra, id que no es UUID) se codifica en JSON.
+
+La codificación no altera los datos: un id que no está en la forma canónica con guiones, un
+timestamp con zona horaria (o en otra forma ISO) o un peso/confianza que no sobrevive a
+float32 también se envían en JSON en lugar de reescribirse.
+"""
+
+import json
+import struct
+import uuid
+from datetime import datetime
+
+MAGIC = 0xCB
+VERSION = 1
+
+TYPE_EVENT = 1
+TYPE_SPECTRUM = 2
+TYPE_BATCH = 3
+
+HEADER = struct.Struct(">BBB")
+_U8 = struct.Struct(">B")
+_U16 = struct.Struct(">H")
+_F32 = struct.Struct(">f")
+_F64 = struct.Struct(">d")
+_FLOAT_ARRAYS = {}          # Cantidad -> struct.Struct de float32 (se reutilizan entre mensajes)
+
+FLAG_TIMESTAMP = 0x01
+FLAG_MATERIAL = 0x02
+FLAG_WEIGHT = 0x04
+FLAG_CONFIDENCE = 0x08
+FLAG_SPECTRAL_DICT = 0x10
+FLAG_TRACE = 0x20
+
+MATERIALS = ["UNKNOWN", "PET", "HDPE", "LDPE", "PP", "PS", "PVC", "Desconocido"]
+MATERIAL_CODES = {name: code for code, name in enumerate(MATERIALS)}
+MATERIAL_TEXT = 0xFF        # El material se envía como cadena
+
+EVENT_FIELDS = {"id", "timestamp", "material", "weight", "confidence", "trace"}
+SPECTRUM_FIELDS = {"id", "timestamp", "sensor_id", "channel", "spectral_data", "detected_material", "confidence", "trace"}
+
+
+class CodecError(ValueError):
+    """
+    El mensaje no se puede representar o decodificar en el formato binario.
+    """
+
+
+def _float_array(count):
+    layout = _FLOAT_ARRAYS.get(count)
+    if layout is None:
+        layout = _FLOAT_ARRAYS[count] = struct.Struct(f">{count}f")
+    return layout
+
+
+def _pack_str(value):
+    data = str(value).encode("utf-8")
+    if len(data) > 255:
+        raise CodecError("Cadena demasiado larga para el formato binario.")
+    return _U8.pack(len(data)) + data
+
+
+def _unpack_str(payload, offset):
+    length = payload[offset]
+    offset += 1
+    return payload[offset:offset + length].decode("utf-8"), offset + length
+
+
+def _pack_f32(value, field):
+    """
+    Codifica un número en float32 solo si el decodificador recupera exactamente el mismo valor.
+    """
+    raw = _F32.pack(value)
+    if _unpack_f32(raw) != value:
+        raise CodecError(f"El campo {field} no se representa sin pérdida en float32.")
+    return raw
+
+
+def _unpack_f32(raw, offset=0):
+    """
+    Decodifica un float32 como el decimal más corto con la misma representación (12.3 y no 12.300000190734863).
+    """
+    value = _F32.unpack_from(raw, offset)[0]
+    raw = raw[offset:offset + 4]
+    for digits in (6, 7, 8, 9):
+        candidate = float(f"{value:.{digits}g}")
+        if _F32.pack(candidate) == raw:
+            return candidate
+    return value
+
+
+def _pack_material(material):
+    code = MATERIAL_CODES.get(material)
+    if code is not None:
+        return _U8.pack(code)
+    return _U8.pack(MATERIAL_TEXT) + _pack_str(material)
+
+
+def _unpack_material(payload, offset):
+    code = payload[offset]
+    offset += 1
+    if code == MATERIAL_TEXT:
+        return _unpack_str(payload, offset)
+    return MATERIALS[code], offset
+
+
+def _pack_common(message, flags, material_key):
+    """
+    Codifica id, timestamp y material, comunes a eventos y espectros.
+    """
+    try:
+        identifier = uuid.UUID(message["id"])
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise CodecError("El id del mensaje no es un UUID.")
+    if str(identifier) != message["id"]:
+        raise CodecError("El id del mensaje no está en la forma canónica del UUID.")
+    body = identifier.bytes
+
+    if "timestamp" in message:
+        try:
+            epoch = datetime.fromisoformat(message["timestamp"]).timestamp()
+        except (TypeError, ValueError):
+            raise CodecError("El timestamp no está en formato ISO.")
+        # Solo timestamps locales sin zona que el decodificador reconstruye igual
+        if datetime.fromtimestamp(epoch).isoformat() != message["timestamp"]:
+            raise CodecError("El timestamp no se reconstruye sin pérdida (zona horaria o formato ISO distinto).")
+        body += _F64.pack(epoch)
+        flags |= FLAG_TIMESTAMP
+    if material_key in message:
+        body += _pack_material(message[material_key])
+        flags |= FLAG_MATERIAL
+    return flags, body
+
+
+def _unpack_common(payload, offset, flags, material_key):
+    message = {"id": str(uuid.UUID(bytes=bytes(payload[offset:offset + 16])))}
+    offset += 16
+    if flags & FLAG_TIMESTAMP:
+        message["timestamp"] = datetime.fromtimestamp(_F64.unpack_from(payload, offset)[0]).isoformat()
+        offset += 8
+    if flags & FLAG_MATERIAL:
+        message[material_key], offset = _unpack_material(payload, offset)
+    return message, offset
+
+
+def _pack_trace(message, flags):
+    """
+    Codifica los saltos del contexto de rastreo (se agregan al final del mensaje).
+    """
+    hops = message.get("trace")
+    if not hops:
+        return flags, b""
+    if len(hops) > 255:
+        raise CodecError("Demasiados saltos en el contexto de rastreo.")
+    body = _U8.pack(len(hops))
+    for stage, host, wall, monotonic in hops:
+        body += _pack_str(stage) + _pack_str(host) + _F64.pack(wall) + _F64.pack(monotonic)
+    return flags | FLAG_TRACE, body
+
+
+def _unpack_trace(payload, offset, flags, message):
+    if not flags & FLAG_TRACE:
+        return offset
+    count = payload[offset]
+    offset += 1
+    hops = []
+    for _ in range(count):
+        stage, offset = _unpack_str(payload, offset)
+        host, offset = _unpack_str(payload, offset)
+        hops.append([stage, host, _F64.unpack_from(payload, offset)[0], _F64.unpack_from(payload, offset + 8)[0]])
+        offset += 16
+    message["trace"] = hops
+    return offset
+
+
+def _encode_event(message):
+    flags, body = _pack_common(message, 0, "material")
+    if "weight" in message:
+        body += _pack_f32(message["weight"], "weight")
+        flags |= FLAG_WEIGHT
+    if "confidence" in message:
+        body += _pack_f32(message["confidence"], "confidence")
+        flags |= FLAG_CONFIDENCE
+    flags, trace = _pack_trace(message, flags)
+    return HEADER.pack(MAGIC, VERSION, TYPE_EVENT) + _U8.pack(flags) + body + trace
+
+
+def _decode_event(payload, offset):
+    flags = payload[offset]
+    message, offset = _unpack_common(payload, offset + 1, flags, "material")
+    if flags & FLAG_WEIGHT:
+        message["weight"] = _unpack_f32(payload, offset)
+        offset += 4
+    if flags & FLAG_CONFIDENCE:
+        message["confidence"] = _unpack_f32(payload, offset)
+        offset += 4
+    offset = _unpack_trace(payload, offset, flags, message)
+    return message, offset
+
+
+def _encode_spectrum(message):
+    flags, body = _pack_common(message, 0, "detected_material")
+    if "confidence" in message:
+        body += _pack_f32(message["confidence"], "confidence")
+        flags |= FLAG_CONFIDENCE
+
+    body += _pack_str(message["sensor_id"]) + _U8.pack(message["channel"])
+    spectral_data = message["spectral_data"]
+    if isinstance(spectral_data, dict):
+        flags |= FLAG_SPECTRAL_DICT
+        keys, values = list(spectral_data.keys()), list(spectral_data.values())
+        body += _U8.pack(len(keys)) + b"".join(_pack_str(key) for key in keys)
+    else:
+        values = list(spectral_data)
+        body += _U8.pack(len(values))
+    body += _float_array(len(values)).pack(*values)
+    flags, trace = _pack_trace(message, flags)
+    return HEADER.pack(MAGIC, VERSION, TYPE_SPECTRUM) + _U8.pack(flags) + body + trace
+
+
+def _decode_spectrum(payload, offset):
+    flags = payload[offset]
+    message, offset = _unpack_common(payload, offset + 1, flags, "detected_material")
+    if flags & FLAG_CONFIDENCE:
+        message["confidence"] = _unpack_f32(payload, offset)
+        offset += 4
+
+    message["sensor_id"], offset = _unpack_str(payload, offset)
+    message["channel"] = payload[offset]
+    count = payload[offset + 1]
+    offset += 2
+    keys = None
+    if flags & FLAG_SPECTRAL_DICT:
+        keys = []
+        for _ in range(count):
+            key, offset = _unpack_str(payload, offset)
+            keys.append(key)
+    values = list(_float_array(count).unpack_from(payload, offset))
+    offset += 4 * count
+    message["spectral_data"] = dict(zip(keys, values)) if keys is not None else values
+    offset = _unpack_trace(payload, offset, flags, message)
+    return message, offset
+
+
+def _encode_message(message):
+    """
+    Codifica un mensaje individual según sus campos.
+    """
+    if not isinstance(message, dict):
+        raise CodecError("Solo se codifican diccionarios en binario.")
+    fields = set(message)
+    if fields <= EVENT_FIELDS:
+        return _encode_event(message)
+    if fields <= SPECTRUM_FIELDS and {"sensor_id", "channel", "spectral_data"} <= fields:
+        return _encode_spectrum(message)
+    raise CodecError(f"Campos sin formato binario: {sorted(fields - EVENT_FIELDS - SPECTRUM_FIELDS)}")
+
+
+def encode(message):
+    """
+    Codifica un mensaje (o una lista de mensajes) en el formato binario.
+
+    :raises CodecError: Si algún mensaje no tiene representación binaria.
+    :return: bytes.
+    """
+    if isinstance(message, list):
+        parts = [_encode_message(item) for item in message]
+        body = b"".join(_U16.pack(len(part)) + part for part in parts)
+        return HEADER.pack(MAGIC, VERSION, TYPE_BATCH) + _U16.pack(len(parts)) + body
+    return _encode_message(message)
+
+
+def encode_payload(message, binary=True):
+    """
+    Serializa un mensaje en binario si es posible y en JSON en caso contrario.
+
+    :param message: Diccionario o lista de diccionarios.
+    :param binary: Si es False se usa JSON directamente.
+    :return: bytes (binario) o str (JSON).
+    """
+    if binary:
+        try:
+            return encode(message)
+        except (CodecError, KeyError, TypeError, struct.error):
+            pass
+    return json.dumps(message)
+
+
+def is_binary(payload):
+    """
+    Indica si un payload está en el formato binario.
+    """
+    return isinstance(payload, (bytes, bytearray, memoryview)) and len(payload) >= HEADER.size and payload[0] == MAGIC
+
+
+def _decode_at(payload, offset):
+    magic, version, msg_type = HEADER.unpack_from(payload, offset)
+    if magic != MAGIC:
+        raise CodecError("Encabezado binario inválido.")
+    if version != VERSION:
+        raise CodecError(f"Versión de formato no soportada: {version}")
+    offset += HEADER.size
+
+    if msg_type == TYPE_EVENT:
+        return _decode_event(payload, offset)
+    if msg_type == TYPE_SPECTRUM:
+        return _decode_spectrum(payload, offset)
+    if msg_type == TYPE_BATCH:
+        count = _U16.unpack_from(payload, offset)[0]
+        offset += 2
+        messages = []
+        for _ in range(count):
+            length = _U16.unpack_from(payload, offset)[0]
+            offset += 2
+            item, _ = _decode_at(payload, offset)
+            messages.append(item)
+            offset += length
+        return messages, offset
+    raise CodecError(f"Tipo de mensaje desconocido: {msg_type}")
+
+
+def decode_payload(payload):
+    """
+    Decodifica un payload MQTT en binario o JSON. Es el decodificador común de las tres Raspberry Pi.
+
+    :param payload: bytes o str recibidos.
+    :return: Diccionario o lista de diccionarios.
+    """
+    if is_binary(payload):
+        message, _ = _decode_at(bytes(payload), 0)
+        return message
+    if isinstance(payload, (bytes, bytearray)):
+        payload = payload.decode("utf-8")
+    return json.loads(payload)
+
@@ -0,0 +1,286 @@
+# actuation_scheduler.py - Planificador no bloqueante de pulsos para los relés de las válvulas.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+
+class _Pulse:
+    """
+    Pulso planificado (o en curso) de un relé. Los pulsos solapados se fusionan en uno solo.
+    """
+    __slots__ = ("relay", "start", "end", "energized", "received_at", "event_ids", "on_entry", "off_entry")
+
+    def __init__(self, relay, start, end, received_at, event_id):
+        self.relay = relay
+        self.start = start
+        self.end = end
+        self.energized = False
+        self.received_at = received_at
+        self.event_ids = [event_id] if event_id else []
+        self.on_entry = None
+        self.off_entry = None
+
+
+class ActuationScheduler:
+    """
+    Planificador de activaciones de relés con un hilo propio y un heap de vencimientos.
+
+    `activate_relay` solo registra el pulso y regresa de inmediato, por lo que el hilo que
+    recibe los mensajes MQTT nunca queda bloqueado mientras una válvula está abierta.
+    - Los pulsos solapados sobre el mismo relé se fusionan (el relé no se apaga y se
+      vuelve a encender entre materiales consecutivos).
+    - Las acciones que vencen dentro de `batch_window` se ejecutan juntas, ordenadas por
+      canal del MUX, y el canal solo se selecciona cuando cambia.
+    - Se mide la latencia desde la recepción del mensaje hasta que el relé se energiza.
+    """
+
+    ON = 0
+    OFF = 1
+
+    def __init__(self, set_state, select_channel=None, channel_of=None, batch_window=0.002, logger=None, metrics=None):
+        """
+        Inicializa el planificador.
+
+        :param set_state: Función `set_state(relay, on)` que energiza o apaga un relé.
+        :param select_channel: Función opcional `select_channel(channel)` que selecciona el canal del MUX.
+        :param channel_of: Función opcional `channel_of(relay)` que devuelve el canal del MUX del relé.
+        :param batch_window: Ventana en segundos para agrupar acciones que vencen casi al mismo tiempo.
+        :param logger: Logger a utilizar (por defecto el logger del módulo).
+        :param metrics: Registro opcional de métricas (modules.metrics.MetricsRegistry).
+        """
+        self.set_state = set_state
+        self.select_channel = select_channel
+        self.channel_of = channel_of or (lambda relay: None)
+        self.batch_window = batch_window
+        self.logger = logger or logging.getLogger("[ACTUATION_SCHEDULER]")
+
+        self._heap = []
+        self._sequence = itertools.count()
+        self._pulses = {}               # Relé -> lista de pulsos pendientes o en curso
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._active_channel = None
+
+        self.pulses_scheduled = 0
+        self.pulses_coalesced = 0
+        self.energize_count = 0
+        self.mux_selects = 0
+        self.errors = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self._latency_total_ms = 0.0
+
+        self._latency_histogram = self._lag_histogram = None
+        if metrics is not None:
+            self._latency_histogram = metrics.histogram("relay_actuation_latency_ms", "Recepción del evento a relé energizado (ms)")
+            self._lag_histogram = metrics.histogram("relay_actuation_lag_ms", "Retraso de cada acción respecto a su instante programado (ms)")
+
+    def _push(self, deadline, action, pulse):
+        """
+        Agrega una acción al heap y devuelve la entrada (mutable para poder cancelarla).
+        """
+        entry = [deadline, next(self._sequence), action, pulse, False]
+        heapq.heappush(self._heap, entry)
+        return entry
+
+    @staticmethod
+    def _cancel(entry):
+        if entry is not None:
+            entry[4] = True
+
+    def schedule_pulse(self, relay, duration, start_at=None, received_at=None, event_id=None):
+        """
+        Programa un pulso de un relé sin bloquear.
+
+        :param relay: Identificador del relé (índice o canal, según el controlador).
+        :param duration: Duración del pulso en segundos.
+        :param start_at: Instante monotónico de encendido (por defecto ahora).
+        :param received_at: Instante monotónico en que se recibió el mensaje que originó el pulso.
+        :param event_id: ID único del evento.
+        :return: True si el pulso se fusionó con uno existente.
+        """
+        now = time.monotonic()
+        start = max(start_at if start_at is not None else now, now)
+        end = start + duration
+        received_at = received_at if received_at is not None else now
+
+        with self._condition:
+            pulses = self._pulses.setdefault(relay, [])
+            overlapping = [pulse for pulse in pulses if start <= pulse.end and end >= pulse.start]
+            self.pulses_scheduled += 1
+
+            if not overlapping:
+                pulse = _Pulse(relay, start, end, received_at, event_id)
+                pulse.on_entry = self._push(start, self.ON, pulse)
+                pulse.off_entry = self._push(end, self.OFF, pulse)
+                pulses.append(pulse)
+                self._condition.notify()
+                return False
+
+            # Fusionar todos los pulsos solapados (y el nuevo) en el primero
+            pulse = overlapping[0]
+            merged_start = min([start] + [other.start for other in overlapping])
+            merged_end = max([end] + [other.end for other in overlapping])
+            for other in overlapping[1:]:
+                self._cancel(other.on_entry)
+                self._cancel(other.off_entry)
+                pulse.energized = pulse.energized or other.energized
+                pulse.received_at = min(pulse.received_at, other.received_at)
+                pulse.event_ids.extend(other.event_ids)
+                pulses.remove(other)
+                self.pulses_coalesced += 1
+            if event_id:
+                pulse.event_ids.append(event_id)
+
+            # Reprogramar las acciones del pulso fusionado: ON al inicio (si aún no está energizado) y OFF al final
+            self._cancel(pulse.on_entry)
+            self._cancel(pulse.off_entry)
+            pulse.start = merged_start
+            pulse.end = merged_end
+            pulse.on_entry = None
+            if not pulse.energized:
+                pulse.received_at = min(pulse.received_at, received_at)
+                pulse.on_entry = self._push(merged_start, self.ON, pulse)
+            pulse.off_entry = self._push(merged_end, self.OFF, pulse)
+            self.pulses_coalesced += 1
+            self._condition.notify()
+            return True
+
+    def _select(self, channel):
+        """
+        Selecciona el canal del MUX solo si es distinto al canal activo.
+        """
+        if self.select_channel is None or channel is None or channel == self._active_channel:
+            return
+        self.select_channel(channel)
+        self._active_channel = channel
+        self.mux_selects += 1
+
+    def _next_batch(self):
+        """
+        Espera la siguiente acción vencida y devuelve todas las que vencen dentro de la ventana.
+        """
+        with self._condition:
+            while self._running:
+                while self._heap and self._heap[0][4]:
+                    heapq.heappop(self._heap)
+                if self._heap and self._heap[0][0] <= time.monotonic():
+                    break
+                timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                self._condition.wait(timeout)
+            if not self._running:
+                return []
+
+            horizon = time.monotonic() + self.batch_window
+            batch = []
+            while self._heap and self._heap[0][0] <= horizon:
+                entry = heapq.heappop(self._heap)
+                if entry[4]:
+                    continue
+                pulse = entry[3]
+                if entry[2] == self.ON:
+                    pulse.energized = True
+                else:
+                    self._pulses.get(pulse.relay, []).remove(pulse)
+                batch.append(entry)
+            return batch
+
+    def _execute(self, batch):
+        """
+        Ejecuta un lote de acciones agrupado por canal del MUX.
+        """
+        batch.sort(key=lambda entry: (self._channel_key(entry[3].relay), entry[0], entry[1]))
+        for deadline, _, action, pulse, _ in batch:
+            try:
+                self._select(self.channel_of(pulse.relay))
+                self.set_state(pulse.relay, action == self.ON)
+            except Exception as e:
+                self.errors += 1
+                self._active_channel = None
+                self.logger.error(f"[RELAY] Error {'energizando' if action == self.ON else 'apagando'} relé {pulse.relay}: {e}")
+                continue
+
+            now = time.monotonic()
+            if self._lag_histogram is not None:
+                self._lag_histogram.observe(max(0.0, now - deadline) * 1000)
+            if action == self.ON:
+                latency_ms = (now - pulse.received_at) * 1000
+                if self._latency_histogram is not None:
+                    self._latency_histogram.observe(latency_ms)
+                self.energize_count += 1
+                self.last_latency_ms = latency_ms
+                self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+                self._latency_total_ms += latency_ms
+                self.logger.debug(f"[RELAY] Relé {pulse.relay} energizado ({latency_ms:.1f} ms desde la recepción). ID Evento: {pulse.event_ids}")
+            else:
+                self.logger.debug(f"[RELAY] Relé {pulse.relay} desactivado. ID Evento: {pulse.event_ids}")
+
+    def _channel_key(self, relay):
+        channel = self.channel_of(relay)
+        return -1 if channel is None else channel
+
+    def _run(self):
+        """
+        Hilo de actuación.
+        """
+        while self._running:
+            batch = self._next_batch()
+            if batch:
+                self._execute(batch)
+
+    def start(self):
+        """
+        Inicia el hilo de actuación.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Detiene el hilo y apaga los relés que hayan quedado energizados.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+        with self._condition:
+            energized = [pulse for pulses in self._pulses.values() for pulse in pulses if pulse.energized]
+            self._pulses.clear()
+            self._heap.clear()
+        for pulse in energized:
+            try:
+                self._select(self.channel_of(pulse.relay))
+                self.set_state(pulse.relay, False)
+            except Exception as e:
+                self.logger.error(f"[RELAY] Error apagando relé {pulse.relay} al detener: {e}")
+
+    def get_stats(self):
+        """
+        Devuelve las estadísticas de actuación.
+        """
+        with self._condition:
+            pending = sum(1 for entry in self._heap if not entry[4])
+        return {
+            "pulses_scheduled": self.pulses_scheduled,
+            "pulses_coalesced": self.pulses_coalesced,
+            "energize_count": self.energize_count,
+            "mux_selects": self.mux_selects,
+            "pending_actions": pending,
+            "errors": self.errors,
+            "last_latency_ms": round(self.last_latency_ms, 2),
+            "avg_latency_ms": round(self._latency_total_ms / self.energize_count, 2) if self.energize_count else 0.0,
+            "max_latency_ms": round(self.max_latency_ms, 2),
+        }
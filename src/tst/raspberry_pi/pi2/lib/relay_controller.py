@@ -5,9 +5,10 @@
 
 import qwiic_tca9548a
 import qwiic_relay
-import time
 from modules.logging_manager import LoggingManager
 from modules.config_manager import ConfigManager
+from modules.metrics import MetricsRegistry
+from raspberry_pi.pi2.lib.actuation_scheduler import ActuationScheduler
 
 class RelayControllerReal:
     def __init__(self, config_manager):
@@ -22,6 +23,16 @@ class RelayControllerReal:
         self.relays = {}
         self.initialize_relays()
 
+        # Planificador de actuación: las activaciones no bloquean el hilo de MQTT
+        self.scheduler = ActuationScheduler(
+            self._set_relay_state,
+            select_channel=lambda channel: self.mux.enable_channels(1 << channel),
+            channel_of=lambda mux_channel: mux_channel,
+            batch_window=config_manager.get("relays.batch_window", 0.002),
+            metrics=MetricsRegistry.default()
+        )
+        self.scheduler.start()
+
     def initialize_relays(self):
         """
         Inicializa cada relé basado en la configuración proporcionada.
@@ -44,19 +55,43 @@ class RelayControllerReal:
             self.relays[mux_channel] = relay_instance
             print(f"[RelayControllerReal] Relay {mux_channel} inicializado en dirección I2C {hex(i2c_address)}.")
 
-    def activate_relay(self, mux_channel, duration, event_id):
+    def _set_relay_state(self, mux_channel, on):
+        """
+        Energiza o apaga un relé. El canal del MUX ya fue seleccionado por el planificador.
+        """
+        relay = self.relays[mux_channel]
+        if on:
+            relay.turn_on()
+        else:
+            relay.turn_off()
+
+    def activate_relay(self, mux_channel, duration, event_id, start_at=None, received_at=None):
         """
-        Activa un relé por un tiempo específico.
+        Programa la activación de un relé por un tiempo específico sin bloquear.
         :param mux_channel: Canal MUX del relé a activar.
         :param duration: Duración en segundos.
         :param event_id: ID único del evento.
+        :param start_at: Instante (time.monotonic) de encendido. None para encender de inmediato.
+        :param received_at: Instante (time.monotonic) en que se recibió el mensaje, para medir la latencia.
         """
         relay = self.relays.get(mux_channel)
         if not relay:
             raise ValueError(f"Relé en canal {mux_channel} no encontrado.")
-        
-        print(f"[RelayControllerReal] Activando relay {mux_channel} por {duration} segundos. ID Evento: {event_id}")
-        relay.turn_on()
-        time.sleep(duration)
-        relay.turn_off()
-        print(f"[RelayControllerReal] Relay {mux_channel} desactivado. ID Evento: {event_id}")
+
+        coalesced = self.scheduler.schedule_pulse(mux_channel, duration, start_at=start_at,
+                                                  received_at=received_at, event_id=event_id)
+        action = "extendido" if coalesced else "programado"
+        print(f"[RelayControllerReal] Pulso del relay {mux_channel} {action} por {duration} segundos. ID Evento: {event_id}")
+
+    def get_stats(self):
+        """
+        Devuelve las estadísticas del planificador de actuación.
+        """
+        return self.scheduler.get_stats()
+
+    def shutdown(self):
+        """
+        Detiene el planificador y apaga los relés energizados.
+        """
+        self.scheduler.stop()
+        print(f"[RelayControllerReal] Planificador detenido. Estadísticas: {self.get_stats()}")
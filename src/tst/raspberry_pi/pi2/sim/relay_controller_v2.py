@@ -5,9 +5,10 @@
 
 import qwiic_tca9548a
 import qwiic_relay
-import time
 from modules.logging_manager import LoggingManager
 from modules.config_manager import ConfigManager
+from modules.metrics import MetricsRegistry
+from raspberry_pi.pi2.lib.actuation_scheduler import ActuationScheduler
 
 class RelayController:
     """
@@ -22,15 +23,15 @@ class RelayController:
         self.config_manager = config_manager
         self.relay_config = config_manager.get("mux.relays", [])
         self.enable_relays = enable_relays
+        self.scheduler = None
+
+        # Configurar logger centralizado
+        self.logger = LoggingManager(config_manager).setup_logger("[RELAY_CONTROLLER]")
 
         # Validar que relay_config sea una lista
         if not isinstance(self.relay_config, list):
             self.logger.error("[MUX] La configuración de relés debe ser una lista.")
             raise ValueError("[MUX] La configuración de relés debe ser una lista.")
-        self.relay_config = relay_config
-
-        # Configurar logger centralizado
-        self.logger = LoggingManager(config_manager).setup_logger("[RELAY_CONTROLLER]")
 
         if not self.enable_relays:
             self.logger.warning("La funcionalidad de los relés está deshabilitada.")
@@ -63,6 +64,17 @@ class RelayController:
             else:
                 self.logger.error(f"[RELAY] Error al conectar Relé {index} en canal MUX {mux_channel}, dirección {hex(i2c_address)}")
 
+        # Planificador de actuación: las activaciones no bloquean el hilo de MQTT
+        self.scheduler = ActuationScheduler(
+            self._set_relay_state,
+            select_channel=self._select_mux_channel,
+            channel_of=lambda relay_index: self.relays[relay_index]["mux_channel"],
+            batch_window=config_manager.get("relays.batch_window", 0.002),
+            logger=self.logger,
+            metrics=MetricsRegistry.default()
+        )
+        self.scheduler.start()
+
     def _select_mux_channel(self, channel):
         """
         Activa el canal especificado en el MUX.
@@ -77,13 +89,28 @@ class RelayController:
             raise ValueError(f"[MUX] Canal inválido: {channel}")
 
         self.mux.enable_channels(1 << channel)
-        self.logger.info(f"[MUX] Canal {channel} activado.")
+        self.logger.debug(f"[MUX] Canal {channel} activado.")
+
+    def _set_relay_state(self, relay_index, on):
+        """
+        Energiza o apaga un relé. El canal del MUX ya fue seleccionado por el planificador.
+        :param relay_index: Índice del relé.
+        :param on: True para energizar, False para apagar.
+        """
+        relay = self.relays[relay_index]["relay"]
+        if on:
+            relay.set_relay_on()
+        else:
+            relay.set_relay_off()
 
-    def activate_relay(self, relay_index, duration):
+    def activate_relay(self, relay_index, duration, start_at=None, received_at=None, event_id=None):
         """
-        Activa un relé específico durante un tiempo determinado.
+        Programa la activación de un relé durante un tiempo determinado sin bloquear.
         :param relay_index: Índice del relé.
         :param duration: Tiempo en segundos para activar el relé.
+        :param start_at: Instante (time.monotonic) de encendido. None para encender de inmediato.
+        :param received_at: Instante (time.monotonic) en que se recibió el mensaje, para medir la latencia.
+        :param event_id: ID único del evento.
         """
         if not self.enable_relays:
             self.logger.warning("La funcionalidad de los relés está deshabilitada. Activación omitida.")
@@ -93,12 +120,23 @@ class RelayController:
             self.logger.error(f"[RELAY] Índice de relé inválido: {relay_index}")
             raise IndexError(f"[RELAY] Índice de relé inválido: {relay_index}")
 
-        relay_info = self.relays[relay_index]
-        self._select_mux_channel(relay_info["mux_channel"])
-        relay = relay_info["relay"]
+        coalesced = self.scheduler.schedule_pulse(relay_index, duration, start_at=start_at,
+                                                  received_at=received_at, event_id=event_id)
+        if coalesced:
+            self.logger.info(f"[RELAY] Pulso del relé {relay_index} extendido {duration} segundos. ID Evento: {event_id}")
+        else:
+            self.logger.info(f"[RELAY] Activación del relé {relay_index} programada por {duration} segundos. ID Evento: {event_id}")
+
+    def get_stats(self):
+        """
+        Devuelve las estadísticas del planificador de actuación.
+        """
+        return self.scheduler.get_stats() if self.scheduler else {}
 
-        self.logger.info(f"[RELAY] Activando relé {relay_index} en dirección {hex(relay.address)} por {duration} segundos.")
-        relay.set_relay_on()
-        time.sleep(duration)
-        relay.set_relay_off()
-        self.logger.info(f"[RELAY] Relé {relay_index} desactivado.")
+    def shutdown(self):
+        """
+        Detiene el planificador y apaga los relés energizados.
+        """
+        if self.scheduler:
+            self.scheduler.stop()
+            self.logger.info(f"[RELAY] Planificador detenido. Estadísticas: {self.scheduler.get_stats()}")
@@ -3,6 +3,7 @@
 # Copyright (c) 2024
 # Proyecto: Smart Recycling Bin
 
+import asyncio
 import time
 import random
 import json
@@ -19,6 +20,37 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S"
 )
 
+def detect_once(detector, mqtt_handler, topic):
+    """
+    Genera una detección simulada y la publica en MQTT.
+    """
+    # Generar datos simulados de detección de residuos
+    waste_data = detector.generate_waste_data()
+
+    # Extraer un elemento detectado para simular la detección de la cámara
+    detected_materials = waste_data.get("detected_items", [])
+    if detected_materials:
+        detected_item = random.choice(detected_materials)
+        material = detected_item["Name"]
+        confidence = detected_item["Confidence"]
+    else:
+        material = "Unknown"
+        confidence = 0.0
+
+    # Crear mensaje para MQTT
+    detection_message = {
+        "id": str(uuid.uuid4()),
+        "status": "material_detected",
+        "material": material,
+        "confidence": confidence,
+        "weight": waste_data["total_weight"],  # Peso total de los materiales detectados
+        "timestamp": time.time()
+    }
+
+    # Publicar el mensaje en MQTT
+    mqtt_handler.publish(topic, detection_message)
+    logging.info(f"[CAMERA] Material detectado: {material} (Confianza: {confidence}%). Publicado en '{topic}'.")
+
 def simulate_camera_detection(mqtt_handler, topic, delay_range):
     """
     Simula la detección de materiales y publica mensajes en MQTT usando WasteTypeDetector.
@@ -30,32 +62,7 @@ def simulate_camera_detection(mqtt_handler, topic, delay_range):
 
     try:
         while True:
-            # Generar datos simulados de detección de residuos
-            waste_data = detector.generate_waste_data()
-
-            # Extraer un elemento detectado para simular la detección de la cámara
-            detected_materials = waste_data.get("detected_items", [])
-            if detected_materials:
-                detected_item = random.choice(detected_materials)
-                material = detected_item["Name"]
-                confidence = detected_item["Confidence"]
-            else:
-                material = "Unknown"
-                confidence = 0.0
-
-            # Crear mensaje para MQTT
-            detection_message = {
-                "id": str(uuid.uuid4()),
-                "status": "material_detected",
-                "material": material,
-                "confidence": confidence,
-                "weight": waste_data["total_weight"],  # Peso total de los materiales detectados
-                "timestamp": time.time()
-            }
-
-            # Publicar el mensaje en MQTT
-            mqtt_handler.publish(topic, detection_message)
-            logging.info(f"[CAMERA] Material detectado: {material} (Confianza: {confidence}%). Publicado en '{topic}'.")
+            detect_once(detector, mqtt_handler, topic)
 
             # Simular delay aleatorio entre detecciones
             wait_time = random.uniform(*delay_range)
@@ -66,4 +73,14 @@ def simulate_camera_detection(mqtt_handler, topic, delay_range):
         logging.info("[CAMERA] Simulación de cámara detenida por el usuario.")
     except Exception as e:
         logging.error(f"[CAMERA] Error durante la simulación de detección: {e}")
-        raise
\ No newline at end of file
+        raise
+
+async def simulate_camera_detection_async(mqtt_handler, topic, delay_range):
+    """
+    Versión para AsyncRuntime de `simulate_camera_detection`: espera entre detecciones sin
+    bloquear el bucle de eventos. Termina cuando se cancela la tarea.
+    """
+    detector = WasteTypeDetector()
+    while True:
+        detect_once(detector, mqtt_handler, topic)
+        await asyncio.sleep(random.uniform(*delay_range))
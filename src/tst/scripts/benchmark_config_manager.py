@@ -0,0 +1,86 @@
+# benchmark_config_manager.py - Mide búsquedas por segundo de ConfigManager antes y después de la instantánea aplanada.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# Agregar la ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.config_manager import ConfigManager
+
+KEYS = ["mux.activation_time_min", "mux.activation_time_max", "delays.sensor_to_valve_1", "mqtt.port"]
+MISSING_KEY = "mux.no_existe"
+
+
+def legacy_get(config_data, key_path, default=None):
+    """
+    Búsqueda original: divide la clave y recorre los diccionarios anidados en cada llamada.
+    """
+    value = config_data
+    try:
+        for key in key_path.split("."):
+            value = value[key]
+        return value
+    except (KeyError, TypeError):
+        logging.getLogger("[CONFIG_MANAGER]").warning(f"Clave faltante: {key_path}. Usando valor predeterminado: {default}")
+        return default
+
+
+def measure(lookup, keys, iterations):
+    """
+    Ejecuta `iterations` búsquedas rotando entre las claves y devuelve búsquedas por segundo.
+    """
+    count = len(keys)
+    start = time.perf_counter()
+    for index in range(iterations):
+        lookup(keys[index % count])
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    default_config = os.path.join(os.path.dirname(__file__), "..", "configs", "pi2_config.yaml")
+    parser = argparse.ArgumentParser(description="Benchmark de búsquedas en ConfigManager.")
+    parser.add_argument("--config", default=default_config, help="Archivo YAML de configuración.")
+    parser.add_argument("--iterations", type=int, default=200000, help="Búsquedas por medición.")
+    args = parser.parse_args()
+
+    # Trabajar sobre una copia: validate_config puede escribir claves faltantes
+    workdir = tempfile.mkdtemp()
+    config_path = os.path.join(workdir, "config.yaml")
+    shutil.copy(args.config, config_path)
+    logging.disable(logging.CRITICAL)   # El costo de los handlers no debe dominar la medición del hit
+
+    try:
+        config_manager = ConfigManager(config_path)
+        snapshot = config_manager.snapshot()
+        data = config_manager.config_data
+
+        results = [
+            ("legacy (split + recorrido)", measure(lambda key: legacy_get(data, key), KEYS, args.iterations)),
+            ("ConfigManager.get", measure(config_manager.get, KEYS, args.iterations)),
+            ("snapshot.get", measure(snapshot.get, KEYS, args.iterations)),
+        ]
+        logging.disable(logging.NOTSET)
+        logging.getLogger("[CONFIG_MANAGER]").setLevel(logging.CRITICAL + 1)
+        missing = [
+            ("legacy (clave faltante)", measure(lambda key: legacy_get(data, key), [MISSING_KEY], args.iterations)),
+            ("snapshot.get (clave faltante)", measure(snapshot.get, [MISSING_KEY], args.iterations)),
+        ]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = results[0][1]
+    for name, rate in results + missing:
+        print(f"[BENCHMARK] {name:<32}: {rate / 1e6:6.2f} M búsquedas/s ({rate / baseline:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
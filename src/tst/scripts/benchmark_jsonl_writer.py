@@ -0,0 +1,74 @@
+# benchmark_jsonl_writer.py - Compara el costo por registro de abrir/escribir/cerrar contra el escritor JSON-lines con búfer.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+
+# Agregar la ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.jsonl_writer import JSONLinesWriter
+
+
+def sample_record():
+    return {
+        "id": str(uuid.uuid4()),
+        "timestamp": "2024-11-20T10:15:30.123456",
+        "sensor_id": "AS7265x_1",
+        "channel": 1,
+        "spectral_data": [round(0.1 * value, 3) for value in range(18)],
+        "detected_material": "PET",
+        "confidence": 0.93
+    }
+
+
+def legacy_write(path, record):
+    """
+    Escritura original: makedirs + open/append/close por registro.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as file:
+        file.write(json.dumps(record) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escritura de registros JSON-lines.")
+    parser.add_argument("--records", type=int, default=20000, help="Registros por medición.")
+    args = parser.parse_args()
+
+    record = sample_record()
+    workdir = tempfile.mkdtemp()
+    try:
+        legacy_path = os.path.join(workdir, "legacy", "data.json")
+        start = time.perf_counter()
+        for _ in range(args.records):
+            legacy_write(legacy_path, record)
+        baseline = (time.perf_counter() - start) / args.records
+
+        results = [("legacy (open/append/close)", baseline)]
+        for policy in JSONLinesWriter.FSYNC_POLICIES:
+            if policy == "each":
+                continue    # Un fsync por registro mide la SD, no el escritor
+            writer = JSONLinesWriter(os.path.join(workdir, policy, "data.json"), fsync_policy=policy)
+            start = time.perf_counter()
+            for _ in range(args.records):
+                writer.write(record)
+            writer.close()
+            results.append((f"JSONLinesWriter (fsync={policy})", (time.perf_counter() - start) / args.records))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, cost in results:
+        print(f"[BENCHMARK] {name:<36}: {cost * 1e6:7.2f} us/registro ({baseline / cost:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# check_actuation_scheduler.py - Verifica la fusión de pulsos solapados del ActuationScheduler con un relé simulado.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import os
+import sys
+import threading
+import time
+
+# Agregar la ruta del planificador de la Raspberry Pi 2 al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'raspberry_pi', 'pi2', 'lib')))
+
+from actuation_scheduler import ActuationScheduler
+
+# Tolerancia para el retraso del hilo de actuación (s)
+TOLERANCE = 0.02
+
+
+class RecordingRelay:
+    """
+    Relé simulado que registra cada cambio de estado con su instante relativo al inicio.
+    """
+
+    def __init__(self):
+        self.base = time.monotonic()
+        self.changes = []
+        self._lock = threading.Lock()
+
+    def set_state(self, relay, on):
+        with self._lock:
+            self.changes.append((round(time.monotonic() - self.base, 3), "ON" if on else "OFF"))
+
+
+def run(label, schedule, expected, wait):
+    relay = RecordingRelay()
+    scheduler = ActuationScheduler(relay.set_state)
+    scheduler.start()
+    try:
+        schedule(scheduler, relay)
+        time.sleep(wait)
+    finally:
+        scheduler.stop()
+
+    ok = len(relay.changes) == len(expected) and all(
+        action == expected_action and abs(at - expected_at) <= TOLERANCE
+        for (at, action), (expected_at, expected_action) in zip(relay.changes, expected))
+    print(f"{label:<52} {relay.changes}")
+    if not ok:
+        raise SystemExit(f"[RELAY] {label}: se esperaba {expected}.")
+
+
+def main():
+    def three_pulses(scheduler, relay):
+        # 0.1–0.2 y 0.3–0.4 quedan unidos por 0.05–0.35: un solo pulso 0.05–0.4
+        scheduler.schedule_pulse(0, 0.1, start_at=relay.base + 0.1)
+        scheduler.schedule_pulse(0, 0.1, start_at=relay.base + 0.3)
+        scheduler.schedule_pulse(0, 0.3, start_at=relay.base + 0.05)
+
+    def extend_energized(scheduler, relay):
+        # Un pulso que llega con el relé ya energizado solo mueve el apagado
+        scheduler.schedule_pulse(0, 0.1)
+        time.sleep(0.05)
+        scheduler.schedule_pulse(0, 0.2)
+
+    def separate(scheduler, relay):
+        scheduler.schedule_pulse(0, 0.05, start_at=relay.base + 0.05)
+        scheduler.schedule_pulse(0, 0.05, start_at=relay.base + 0.2)
+
+    run("Fusión de tres pulsos solapados", three_pulses, [(0.05, "ON"), (0.4, "OFF")], 0.5)
+    run("Extensión de un pulso en curso", extend_energized, [(0.0, "ON"), (0.25, "OFF")], 0.35)
+    run("Pulsos sin solape", separate, [(0.05, "ON"), (0.1, "OFF"), (0.2, "ON"), (0.25, "OFF")], 0.35)
+    print("\n[RELAY] Verificación correcta.")
+
+
+if __name__ == "__main__":
+    main()
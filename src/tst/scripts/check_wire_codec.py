@@ -0,0 +1,96 @@
+# check_wire_codec.py - Verifica que los mensajes lleguen intactos al suscriptor, en binario o con el respaldo JSON.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import logging
+import os
+import sys
+import uuid
+
+# Agregar la ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.json_manager import JSONManager
+from modules.mqtt_handler import MQTTHandler
+from modules.wire_codec import decode_payload, encode_payload, is_binary
+
+
+class StaticConfig:
+    """
+    Configuración mínima en memoria con la interfaz `get("a.b", default)` de ConfigManager.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def get(self, key, default=None):
+        value = self.data
+        for part in key.split("."):
+            if not isinstance(value, dict) or part not in value:
+                return default
+            value = value[part]
+        return value
+
+
+class _Info:
+    rc = 0
+
+
+class RecordingClient:
+    """
+    Cliente MQTT simulado: guarda los payloads publicados tal como saldrían al broker.
+    """
+
+    def __init__(self):
+        self.payloads = []
+
+    def is_connected(self):
+        return True
+
+    def publish(self, topic, payload, qos=0):
+        self.payloads.append(payload)
+        return _Info()
+
+
+def publish_through_handler(message):
+    """
+    Publica un mensaje por MQTTHandler._send_prepared con un cliente simulado y devuelve lo que recibe el suscriptor.
+    """
+    handler = MQTTHandler.__new__(MQTTHandler)
+    handler.client = RecordingClient()
+    handler.outbox = None
+    handler._send_prepared("data/json", [message], 0)
+    assert len(handler.client.payloads) == 1, "Se esperaba un solo paquete."
+    return decode_payload(handler.client.payloads[0])
+
+
+def main():
+    logging.getLogger().setLevel(logging.WARNING)
+    identifier = str(uuid.uuid4())
+    cases = {
+        "evento binario": {"id": identifier, "timestamp": "2024-11-20T10:15:30.123456", "material": "PET", "weight": 123.45},
+        "id sin guiones": {"id": identifier.replace("-", ""), "material": "PET"},
+        "timestamp con zona": {"id": identifier, "timestamp": "2024-11-20T10:15:30+00:00"},
+        "confianza no exacta en float32": {"id": identifier, "confidence": 1 / 3},
+    }
+    for label, message in cases.items():
+        payload = encode_payload(message)
+        assert decode_payload(payload) == message, f"{label}: el mensaje cambió al decodificarse."
+        print(f"{label:<36} {'binario' if is_binary(payload) else 'JSON':<8} intacto")
+
+    # generate_json(binary=True) con un registro que cae al respaldo JSON: el suscriptor recibe el registro, no un envoltorio
+    manager = JSONManager(StaticConfig({"logging": {"level": "WARNING"}}))
+    for confidence in (0.5, 1 / 3):
+        payload = manager.generate_json("AS7265x_0", 0, {"410nm": 1.5, "435nm": 2.25}, "PET", confidence, binary=True)
+        assert isinstance(payload, bytes), "generate_json(binary=True) debe devolver bytes."
+        received = publish_through_handler(payload)
+        assert received == decode_payload(payload) and received["confidence"] == confidence, \
+            f"El registro con confianza {confidence} no llegó intacto: {received}"
+        print(f"{'generate_json confianza ' + repr(round(confidence, 4)):<36} {'binario' if is_binary(payload) else 'JSON':<8} intacto")
+
+    print("\n[CODEC] Verificación correcta.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# stub_lambda_server.py - Servidor local que imita la API Invoke de Lambda para probar GreengrassManager sin AWS.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLambdaServer:
+    """
+    Implementa `POST /2015-03-31/functions/<función>/invocations`.
+
+    - RequestResponse: responde 200 con `{"ok": true, "received": <payloads>}` tras `latency` segundos.
+    - Event: responde 202 de inmediato (la función se "ejecuta" después).
+
+    Registra cada invocación (función, tipo, payloads) y cuántas conexiones TCP se abrieron,
+    para verificar el agrupamiento y la reutilización de conexiones.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0):
+        self.latency = latency
+        self.invocations = []
+        self.connections = 0
+        self.max_concurrent = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"   # Keep-alive: el cliente puede reutilizar la conexión
+
+            def setup(self):
+                super().setup()
+                # Encabezados y cuerpo van en escrituras separadas: sin TCP_NODELAY cada respuesta
+                # esperaría el ACK retrasado del cliente (~40 ms) y mediría la pila TCP, no al cliente
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with server._lock:
+                    server.connections += 1
+
+            def do_POST(self):
+                parts = self.path.split("/")
+                if len(parts) < 5 or parts[2] != "functions" or parts[4] != "invocations":
+                    self.send_error(404)
+                    return
+                function = parts[3]
+                invocation_type = self.headers.get("X-Amz-Invocation-Type", "RequestResponse")
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    payload = json.loads(body) if body else None
+                except ValueError:
+                    self._reply(400, {"Type": "User", "message": "El payload no es JSON válido."})
+                    return
+                count = len(payload["batch"]) if isinstance(payload, dict) and "batch" in payload else 1
+
+                with server._lock:
+                    server._active += 1
+                    server.max_concurrent = max(server.max_concurrent, server._active)
+                    server.invocations.append({"function": function, "type": invocation_type,
+                                               "count": count, "payload": payload})
+                try:
+                    if invocation_type == "Event":
+                        self._reply(202, None)
+                        return
+                    time.sleep(server.latency)     # Simula el trabajo de la función
+                    self._reply(200, {"ok": True, "received": count})
+                finally:
+                    with server._lock:
+                        server._active -= 1
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode("utf-8") if body is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.endpoint_url = f"http://{host}:{self._server.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def payloads_received(self):
+        with self._lock:
+            return sum(invocation["count"] for invocation in self.invocations)
+
+    def reset(self):
+        with self._lock:
+            self.invocations = []
+            self.connections = 0
+            self.max_concurrent = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API Invoke de Lambda.")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos de trabajo simulado por invocación RequestResponse.")
+    args = parser.parse_args()
+
+    server = StubLambdaServer(port=args.port, latency=args.latency).start()
+    print(f"[STUB_LAMBDA] Escuchando en {server.endpoint_url} (greengrass.endpoint_url). Ctrl+C para salir.")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"[STUB_LAMBDA] Invocaciones: {len(server.invocations)} | Payloads: {server.payloads_received()} | "
+                  f"Conexiones: {server.connections}")
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
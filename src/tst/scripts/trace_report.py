@@ -0,0 +1,50 @@
+# trace_report.py - Resume las latencias por etapa de las trazas de extremo a extremo registradas en Raspberry Pi 3.
+# Desarrollado por Héctor F. Rivera Santiago
+# Copyright (c) 2024
+# Proyecto: Smart Recycling Bin
+
+import argparse
+import os
+import sys
+
+# Agregar la ruta del proyecto al PYTHONPATH
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from modules.jsonl_reader import JSONLinesReader
+from modules.trace_context import summarize
+
+
+def format_row(name, snapshot):
+    return (f"{name:<48} {snapshot['count']:>7} {snapshot['p50']:>10.1f} {snapshot['p95']:>10.1f} "
+            f"{snapshot['p99']:>10.1f} {snapshot['max']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reporte de latencias por etapa (detección → válvula → pesaje).")
+    parser.add_argument("--file", default="logs/traces.jsonl", help="Archivo JSON-lines del colector de trazas.")
+    parser.add_argument("--start", help="Inicio de la ventana (ISO, p. ej. 2024-11-20T08:00).")
+    parser.add_argument("--end", help="Fin de la ventana (ISO).")
+    args = parser.parse_args()
+
+    reader = JSONLinesReader(os.path.expanduser(args.file))
+    stages, end_to_end = summarize(reader.iter_records(args.start, args.end))
+    total = end_to_end.snapshot()
+    if not total["count"]:
+        print("[TRACE] No hay trazas en la ventana solicitada.")
+        return
+
+    print(f"{'Etapa':<48} {'Trazas':>7} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'máx ms':>10}")
+    snapshots = {name: histogram.snapshot() for name, histogram in stages.items()}
+    for name, snapshot in snapshots.items():
+        print(format_row(name, snapshot))
+    print("-" * 100)
+    print(format_row("extremo a extremo", total))
+
+    # La etapa con mayor tiempo total es la que más limita el rendimiento de la cinta
+    bottleneck = max(stages.items(), key=lambda item: item[1].snapshot()["sum"])[0]
+    share = snapshots[bottleneck]["sum"] / total["sum"] * 100 if total["sum"] else 0
+    print(f"\n[TRACE] Etapa más costosa: {bottleneck} ({share:.0f} % del tiempo total, p95 {snapshots[bottleneck]['p95']:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()